@@ -0,0 +1,94 @@
+"""Benchmarks the compare lookups against the Comparables index.
+
+Usage:
+    python benchmarks/bench_comparables.py [--sizes 10000 20000 40000 80000] [--legacy]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synapsis import Synapsis  # noqa: E402
+from synapse_downloader.core import SynapseItem, Comparables  # noqa: E402
+
+FILES_PER_FOLDER = 100
+
+
+def build_items(file_count):
+    root = SynapseItem(Synapsis.ConcreteTypes.PROJECT_ENTITY,
+                       id='syn1',
+                       name='Project',
+                       synapse_root_path='',
+                       local_root_path='/tmp/bench')
+    items = [root]
+    folders = []
+    next_id = 2
+    for folder_index in range(max(1, file_count // FILES_PER_FOLDER)):
+        folder = SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                             id='syn{0}'.format(next_id),
+                             parent_id=root.id,
+                             name='Folder{0}'.format(folder_index),
+                             synapse_root_path=root.synapse_path,
+                             local_root_path=root.local.abs_path)
+        next_id += 1
+        items.append(folder)
+        folders.append(folder)
+        for file_index in range(FILES_PER_FOLDER):
+            items.append(SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                                     id='syn{0}'.format(next_id),
+                                     parent_id=folder.id,
+                                     name='File{0}.txt'.format(file_index),
+                                     synapse_root_path=folder.synapse_path,
+                                     local_root_path=folder.local.abs_path))
+            next_id += 1
+    return items, [root] + folders
+
+
+def run_indexed(items, containers):
+    comparables = Comparables()
+    for item in items:
+        comparables.add(item)
+    for container in containers:
+        for child in comparables.select_by_local_dirname(container.local.abs_path):
+            comparables.find_by_local_path(child.local.abs_path)
+            comparables.get(child.parent_id)
+
+
+def run_legacy(items, containers):
+    comparables = []
+    for item in items:
+        if item not in comparables:
+            comparables.append(item)
+    for container in containers:
+        children = Synapsis.utils.select(comparables, lambda c: c.local.dirname == container.local.abs_path)
+        for child in children:
+            Synapsis.utils.find(comparables, lambda c: c.local.abs_path == child.local.abs_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Comparables index.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 20000, 40000, 80000])
+    parser.add_argument('--legacy', default=False, action='store_true',
+                        help='Also time the previous list based lookups (slow for large sizes).')
+    args = parser.parse_args()
+
+    print('{0:>10} {1:>12} {2:>14} {3:>12}'.format('items', 'indexed (s)', 'us per item', 'legacy (s)'))
+    for size in args.sizes:
+        items, containers = build_items(size)
+        start = time.perf_counter()
+        run_indexed(items, containers)
+        indexed = time.perf_counter() - start
+
+        legacy = ''
+        if args.legacy:
+            start = time.perf_counter()
+            run_legacy(items, containers)
+            legacy = '{0:.3f}'.format(time.perf_counter() - start)
+
+        print('{0:>10} {1:>12.3f} {2:>14.2f} {3:>12}'.format(len(items), indexed, indexed / len(items) * 1e6, legacy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Benchmarks Downloader.execute end to end against a local mock Synapse (see mock_synapse.py).
+
+Serves a synthetic project from a child process and runs each mode against it, one after the other, in the same
+download directory. Reports the files/s, MB/s (downloaded, or hashed for compares), the API calls made, the files
+downloaded and the peak RSS of this process after each mode. listed/s is the rate folders and files were
+listed (discovered) at until the listing finished. Use --json to save the results and compare them
+between releases.
+
+Profiles (see mock_synapse.PROFILES): tiny (1M files of 1 KB), huge (100 files of 256 MB), deep (10 levels of
+folders) and small (1000 files of 10 KB). --depth, --folders, --files and --size override the profile.
+
+Usage:
+    python benchmarks/bench_downloader.py [--profile small] [--depth 1] [--folders 10] [--files 100] [--size 10240]
+                                          [--latency 0.02] [--bandwidth-mbps 0] [--modes download compare]
+                                          [--dir PATH] [--json PATH] [--log-level WARNING] [--show-progress]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from mock_synapse import PROFILES, SyntheticProject, MockSynapse  # noqa: E402
+from synapse_downloader.core import Utils  # noqa: E402
+from synapse_downloader.commands.download import Downloader  # noqa: E402
+
+MODES = {
+    'download': {'download': True},
+    'compare': {'download': False, 'compare': True},
+    'stream-compare': {'download': False, 'compare': True, 'stream_compare': True}
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (Utils.MB if sys.platform == 'darwin' else Utils.KB)
+
+
+def run_mode(mock, project, mode, download_dir):
+    calls_before = mock.calls()
+    downloader = Downloader(project.project_id, download_dir, **MODES[mode])
+    start = time.perf_counter()
+    asyncio.run(downloader.execute())
+    seconds = time.perf_counter() - start
+    calls_after = mock.calls()
+
+    calls = {name: count - calls_before.get(name, 0) for name, count in calls_after.items()}
+    counters = downloader.metrics.counters
+    size = counters['bytes_downloaded'] if mode == 'download' else counters['bytes_hashed']
+    # Streaming compares list as they compare so there is no separate listing time.
+    listing_seconds = downloader.metrics.gauges.get('listing_seconds') or seconds
+    return {
+        'mode': mode,
+        'seconds': round(seconds, 2),
+        'files': project.file_count,
+        'files_per_second': round(project.file_count / seconds, 1),
+        'mb_per_second': round(size / Utils.MB / seconds, 1),
+        'listing_seconds': round(listing_seconds, 2),
+        'listed_per_second': round(counters['entities_listed'] / listing_seconds, 1) if listing_seconds else 0,
+        'api_calls': sum(count for name, count in calls.items() if name != 'data'),
+        'downloads': calls.get('data', 0),
+        'calls': calls,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'errors': len(downloader.errors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the downloader against a local mock Synapse.')
+    parser.add_argument('--profile', default='small', choices=sorted(PROFILES))
+    parser.add_argument('--depth', type=int, help='Levels of folders.')
+    parser.add_argument('--folders', type=int, help='Folders in each folder.')
+    parser.add_argument('--files', type=int, help='Files in each folder on the last level.')
+    parser.add_argument('--size', type=int, help='Size of each file in bytes.')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds each request waits before responding.')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0,
+                        help='MB/s each download request is limited to. 0 for no limit.')
+    parser.add_argument('--modes', nargs='+', default=['download', 'compare'], choices=list(MODES))
+    parser.add_argument('--dir', default=None, help='Directory to download to. Defaults to a temp dir.')
+    parser.add_argument('--json', default=None, help='Save the results to a JSON file.')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--show-progress', action='store_true', help='Print the folder and file progress lines.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()), format='%(message)s')
+    if not args.show_progress:
+        # Keeps the progress lines out of the results table.
+        Utils.print_inplace = staticmethod(lambda msg: None)
+    settings = dict(PROFILES[args.profile])
+    for name in ['depth', 'folders', 'files', 'size']:
+        if getattr(args, name) is not None:
+            settings[name] = getattr(args, name)
+    project = SyntheticProject(**settings)
+    bandwidth = int(args.bandwidth_mbps * Utils.MB) if args.bandwidth_mbps else None
+    mock = MockSynapse(project, latency=args.latency, bandwidth=bandwidth).start().configure()
+
+    print('Project: {0} files, {1}, latency: {2}s, bandwidth: {3}'.format(
+        project.file_count, Utils.pretty_size(project.total_bytes), args.latency,
+        '{0} MB/s'.format(args.bandwidth_mbps) if bandwidth else 'unlimited'))
+    print('{0:>15} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10} {6:>10} {7:>12} {8:>7}'.format(
+        'mode', 'seconds', 'files/s', 'MB/s', 'listed/s', 'API calls', 'downloads', 'peak RSS MB', 'errors'))
+
+    download_dir = tempfile.mkdtemp(dir=args.dir)
+    results = []
+    try:
+        for mode in args.modes:
+            result = run_mode(mock, project, mode, download_dir)
+            results.append(result)
+            print('{mode:>15} {seconds:>10.2f} {files_per_second:>10.1f} {mb_per_second:>10.1f} '
+                  '{listed_per_second:>10.1f} {api_calls:>10} {downloads:>10} {peak_rss_mb:>12.1f} '
+                  '{errors:>7}'.format(**result))
+    finally:
+        mock.stop()
+        shutil.rmtree(download_dir)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': dict(settings, latency=args.latency, bandwidth_mbps=args.bandwidth_mbps),
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
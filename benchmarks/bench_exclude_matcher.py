@@ -0,0 +1,97 @@
+"""Benchmarks checking items against exclude patterns with the ExcludeMatcher.
+
+Each run uses an equal mix of Synapse IDs, exact names and globs. --legacy also times the previous check, which
+compared five values for each item against the list of excludes (exact matches only, so the globs never match).
+
+Usage:
+    python benchmarks/bench_exclude_matcher.py [--items 100000] [--patterns 10 100 1000 5000] [--legacy]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synapsis import Synapsis  # noqa: E402
+from synapse_downloader.core import SynapseItem, ExcludeMatcher  # noqa: E402
+
+FILES_PER_FOLDER = 100
+
+
+def build_items(item_count):
+    items = []
+    for index in range(item_count):
+        folder = 'Folder{0}'.format(index // FILES_PER_FOLDER)
+        items.append(SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                                 id='syn{0}'.format(index + 10),
+                                 parent_id='syn2',
+                                 name='file{0}.{1}'.format(index, ['txt', 'csv', 'bam', 'tmp'][index % 4]),
+                                 synapse_root_path='Project/' + folder,
+                                 local_root_path='/tmp/bench/' + folder))
+    return items
+
+
+def build_patterns(pattern_count):
+    patterns = []
+    for index in range(pattern_count):
+        kind = index % 3
+        if kind == 0:
+            patterns.append('syn{0}'.format(index * 7 + 10))
+        elif kind == 1:
+            patterns.append('file{0}.txt'.format(index * 13))
+        elif index % 2:
+            patterns.append('*.ext{0}'.format(index))
+        else:
+            patterns.append('Project/Folder{0}/*_{1}.bam'.format(index, index))
+    return patterns
+
+
+def legacy_can_skip(excludes, synapse_item):
+    skip_values = [
+        synapse_item.id,
+        synapse_item.name,
+        synapse_item.synapse_path,
+        synapse_item.local.abs_path,
+        synapse_item.local.name
+    ]
+    for skip_value in skip_values:
+        if skip_value in excludes:
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ExcludeMatcher.')
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--patterns', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--legacy', default=False, action='store_true',
+                        help='Also time the previous list based check (slow for many patterns).')
+    args = parser.parse_args()
+
+    items = build_items(args.items)
+    for item in items:
+        # Cache the local paths so only the matching is timed.
+        item.local.abs_path
+    print('{0:>10} {1:>12} {2:>14} {3:>10} {4:>12}'.format('patterns', 'matcher (s)', 'us per item', 'excluded',
+                                                            'legacy (s)'))
+    for pattern_count in args.patterns:
+        patterns = build_patterns(pattern_count)
+        start = time.perf_counter()
+        matcher = ExcludeMatcher(patterns)
+        excluded = sum(1 for item in items if matcher.is_excluded(item))
+        seconds = time.perf_counter() - start
+
+        legacy = ''
+        if args.legacy:
+            start = time.perf_counter()
+            for item in items:
+                legacy_can_skip(patterns, item)
+            legacy = '{0:.3f}'.format(time.perf_counter() - start)
+
+        print('{0:>10} {1:>12.3f} {2:>14.2f} {3:>10} {4:>12}'.format(
+            pattern_count, seconds, seconds / len(items) * 1e6, excluded, legacy))
+
+
+if __name__ == '__main__':
+    main()
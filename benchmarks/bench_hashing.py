@@ -0,0 +1,104 @@
+"""Benchmarks hashing local files with the HashService against Synapsis.Chain.Utils.md5sum.
+
+Writes a many-small and a few-huge set of files to a temporary directory and hashes each set with every engine.
+The files are read from the page cache after the first run unless the caches are dropped between runs.
+
+Usage:
+    python benchmarks/bench_hashing.py [--small-files 20000] [--small-size 16384] [--huge-files 4]
+                                       [--huge-size 536870912] [--workers 8] [--dir PATH]
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synapsis import Synapsis  # noqa: E402
+from synapse_downloader.core import HashService, Utils  # noqa: E402
+
+
+def write_files(root, name, count, size):
+    dir_path = os.path.join(root, name)
+    os.makedirs(dir_path)
+    paths = []
+    block = os.urandom(min(size, Utils.MB))
+    for index in range(count):
+        path = os.path.join(dir_path, 'file{0}.bin'.format(index))
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                f.write(block[:remaining])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+async def run_md5sum(paths, workers):
+    # The current path: one md5sum per file in the loop's default executor.
+    semaphore = asyncio.Semaphore(workers)
+
+    async def _md5(path):
+        async with semaphore:
+            return await Synapsis.Chain.Utils.md5sum(path)
+
+    return await asyncio.gather(*[_md5(path) for path in paths])
+
+
+async def run_service(paths, workers, use_processes):
+    service = HashService(workers=workers, use_processes=use_processes, drop_cache=False)
+    try:
+        results = await asyncio.gather(*[service.md5(path) for path in paths])
+        return results, service.stats()
+    finally:
+        service.shutdown()
+
+
+def time_it(func):
+    start = time.perf_counter()
+    result = asyncio.run(func())
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hashing local files.')
+    parser.add_argument('--small-files', type=int, default=20000)
+    parser.add_argument('--small-size', type=int, default=16 * 1024)
+    parser.add_argument('--huge-files', type=int, default=4)
+    parser.add_argument('--huge-size', type=int, default=512 * Utils.MB)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--dir', default=None, help='Directory to write the files to. Defaults to a temp dir.')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        mixes = [
+            ('many-small', write_files(root, 'small', args.small_files, args.small_size)),
+            ('few-huge', write_files(root, 'huge', args.huge_files, args.huge_size))
+        ]
+        print('{0:>12} {1:>18} {2:>10} {3:>12} {4:>10}'.format('mix', 'engine', 'seconds', 'MB/s', 'files/s'))
+        for name, paths in mixes:
+            total_bytes = sum(os.path.getsize(path) for path in paths)
+            # Warm the page cache so every engine reads the same way.
+            asyncio.run(run_md5sum(paths, args.workers))
+
+            expected, seconds = time_it(lambda: run_md5sum(paths, args.workers))
+            rows = [('md5sum', seconds)]
+            for engine, use_processes in [('service-threads', False), ('service-processes', True)]:
+                (results, _), seconds = time_it(lambda: run_service(paths, args.workers, use_processes))
+                if results != expected:
+                    raise Exception('{0} MD5s do not match.'.format(engine))
+                rows.append((engine, seconds))
+
+            for engine, seconds in rows:
+                print('{0:>12} {1:>18} {2:>10.3f} {3:>12.1f} {4:>10.1f}'.format(
+                    name, engine, seconds, total_bytes / Utils.MB / seconds, len(paths) / seconds))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
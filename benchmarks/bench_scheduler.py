@@ -0,0 +1,123 @@
+"""Simulates downloads with each TransferScheduler policy on synthetic size distributions.
+
+Files are discovered in listing order into a bounded transfer queue that a pool of workers pulls from using the
+policy's priority. Each transfer waits for a fixed per-file overhead then shares the total bandwidth with the other
+transfers. Files large enough to be downloaded in ranges get the bandwidth of multiple streams.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--workers 20] [--queue-size 1000] [--stream-mbps 40]
+                                         [--total-mbps 400] [--overhead 0.05] [--scale 1.0]
+"""
+import os
+import sys
+import math
+import heapq
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synapse_downloader.core import TransferScheduler, Utils, Env  # noqa: E402
+
+GB = Utils.MB * 1024
+
+
+def distributions(scale, rng):
+    def count(n):
+        return max(1, int(n * scale))
+
+    def shuffled(sizes):
+        rng.shuffle(sizes)
+        return sizes
+
+    return {
+        'skewed (giants random)': shuffled([50 * GB] * 4 + [10 * Utils.KB] * count(100000)),
+        'skewed (giants last)': [10 * Utils.KB] * count(100000) + [50 * GB] * 4,
+        'lognormal': [int(rng.lognormvariate(math.log(5 * Utils.MB), 2)) + 1 for _ in range(count(20000))],
+        'uniform': [rng.randint(Utils.KB, 200 * Utils.MB) for _ in range(count(20000))],
+        'mixed': shuffled([rng.randint(1 * GB, 20 * GB) for _ in range(count(20))] +
+                          [rng.randint(Utils.KB, 100 * Utils.KB) for _ in range(count(50000))] +
+                          [rng.randint(10 * Utils.MB, 500 * Utils.MB) for _ in range(count(500))])
+    }
+
+
+def simulate(sizes, policy, workers, queue_size, stream_bps, total_bps, overhead, chunk_size, chunk_workers):
+    """Runs the simulation.
+
+    Returns:
+        Tuple of the total time and the time the download ran with idle workers at the end.
+    """
+    scheduler = TransferScheduler(policy, large_file_size=chunk_size)
+    discovered = iter(sizes)
+    queue = []
+
+    def fill_queue():
+        while len(queue) < queue_size:
+            size = next(discovered, None)
+            if size is None:
+                return
+            heapq.heappush(queue, (scheduler.priority_for_size(size), size))
+
+    # Each active transfer is [overhead remaining, bytes remaining, max rate].
+    active = []
+    now = 0.0
+    all_started_at = None
+    fill_queue()
+    while queue or active:
+        while queue and len(active) < workers:
+            _, size = heapq.heappop(queue)
+            streams = min(chunk_workers, math.ceil(size / chunk_size)) if size > chunk_size else 1
+            active.append([overhead, float(size), stream_bps * streams])
+            fill_queue()
+        if not queue and all_started_at is None:
+            all_started_at = now
+
+        transferring = [t for t in active if t[0] <= 0]
+        demand = sum(t[2] for t in transferring)
+        share = min(1.0, total_bps / demand) if demand else 1.0
+
+        step = min(t[0] if t[0] > 0 else t[1] / (t[2] * share) for t in active)
+        now += step
+        for t in active:
+            if t[0] > 0:
+                t[0] -= step
+            else:
+                t[1] -= t[2] * share * step
+        active = [t for t in active if t[0] > 1e-12 or t[1] > 1e-3]
+
+    return now, now - (all_started_at or now)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=Env.SYNTOOLS_DOWNLOAD_WORKERS())
+    parser.add_argument('--queue-size', type=int, default=Env.SYNTOOLS_QUEUE_SIZE())
+    parser.add_argument('--stream-mbps', type=float, default=40, help='MB/s of a single connection.')
+    parser.add_argument('--total-mbps', type=float, default=400, help='MB/s of all connections.')
+    parser.add_argument('--overhead', type=float, default=0.05, help='Seconds of overhead for each file.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the number of files.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chunk_size = Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE() * Utils.MB
+    print('{0:<24} {1:>9} {2:>12} {3:<15} {4:>12} {5:>12}'.format(
+        'distribution', 'files', 'size', 'policy', 'total (s)', 'tail (s)'))
+    for name, sizes in distributions(args.scale, rng).items():
+        for policy in TransferScheduler.POLICIES:
+            total, tail = simulate(sizes,
+                                   policy,
+                                   workers=args.workers,
+                                   queue_size=args.queue_size,
+                                   stream_bps=args.stream_mbps * Utils.MB,
+                                   total_bps=args.total_mbps * Utils.MB,
+                                   overhead=args.overhead,
+                                   chunk_size=chunk_size,
+                                   chunk_workers=Env.SYNTOOLS_DOWNLOAD_CHUNK_WORKERS())
+            print('{0:<24} {1:>9} {2:>12} {3:<15} {4:>12.1f} {5:>12.1f}'.format(
+                name, len(sizes), Utils.pretty_size(sum(sizes)), policy, total, tail))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
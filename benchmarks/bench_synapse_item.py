@@ -0,0 +1,158 @@
+"""Benchmarks the memory and path access time of SynapseItems.
+
+Builds synthetic items (100 files per folder) and reports the memory they use and the time to read the paths
+the downloader and compare read for every item. --legacy also builds the previous model, which used an instance
+dict and rebuilt the paths on every access.
+
+Usage:
+    python benchmarks/bench_synapse_item.py [--items 1000000] [--reads 3] [--legacy]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from synapsis import Synapsis  # noqa: E402
+from synapse_downloader.core import SynapseItem  # noqa: E402
+
+FILES_PER_FOLDER = 100
+
+
+class LegacySynapseItem:
+    """The previous item model: an instance dict and paths rebuilt on every access."""
+
+    def __init__(self, type, id=None, parent_id=None, name=None, local_root_path=None, synapse_root_path=None):
+        self.type = type
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.local_root_path = local_root_path
+        self.synapse_root_path = synapse_root_path
+        self.version_number = None
+        self.file_handle_id = None
+        self.filename = None
+        self.content_size = None
+        self.content_md5 = None
+        self.file_handle_type = None
+        self.pre_signed_url = None
+        self.pre_signed_url_expires = None
+        self.local = self.Local(self)
+
+    @property
+    def is_file(self):
+        return self.type.is_file
+
+    @property
+    def synapse_path(self):
+        name = self.name
+        if self.is_file and self.filename:
+            name = self.filename
+        return '/'.join([s for s in [self.synapse_root_path, name] if s])
+
+    class Local:
+        def __init__(self, synapse_item):
+            self.synapse_item = synapse_item
+
+        @property
+        def abs_path(self):
+            if self.synapse_item.type.is_project:
+                return os.path.abspath(self.synapse_item.local_root_path)
+            name = self.synapse_item.name
+            if self.synapse_item.is_file and self.synapse_item.filename is not None:
+                name = self.synapse_item.filename
+            return os.path.abspath(os.path.join(self.synapse_item.local_root_path, name))
+
+        @property
+        def dirname(self):
+            return os.path.dirname(self.abs_path)
+
+        @property
+        def name(self):
+            return os.path.basename(self.abs_path)
+
+
+def build_items(item_class, item_count):
+    root = item_class(Synapsis.ConcreteTypes.PROJECT_ENTITY,
+                      id='syn1',
+                      name='Project',
+                      synapse_root_path='',
+                      local_root_path='/tmp/bench')
+    items = [root]
+    next_id = 2
+    folder_index = 0
+    while len(items) < item_count:
+        folder = item_class(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                            id='syn{0}'.format(next_id),
+                            parent_id=root.id,
+                            name='Folder{0}'.format(folder_index),
+                            synapse_root_path=root.synapse_path,
+                            local_root_path=root.local.abs_path)
+        next_id += 1
+        folder_index += 1
+        items.append(folder)
+        for file_index in range(min(FILES_PER_FOLDER, item_count - len(items))):
+            # Each child gets its own copy of the parent paths, like items built from a plan or listing.
+            items.append(item_class(Synapsis.ConcreteTypes.FILE_ENTITY,
+                                    id='syn{0}'.format(next_id),
+                                    parent_id=folder.id,
+                                    name='File{0}.txt'.format(file_index),
+                                    synapse_root_path=''.join(folder.synapse_path),
+                                    local_root_path=''.join(folder.local.abs_path)))
+            next_id += 1
+    return items
+
+
+def read_paths(items, reads):
+    for _ in range(reads):
+        for item in items:
+            item.synapse_path
+            local = item.local
+            local.abs_path
+            local.dirname
+            local.name
+
+
+def run(item_class, item_count, reads):
+    start = time.perf_counter()
+    items = build_items(item_class, item_count)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_paths(items, reads)
+    read_seconds = time.perf_counter() - start
+    del items
+
+    # Measured separately since tracing slows everything down. Includes any paths cached by the first read.
+    tracemalloc.start()
+    items = build_items(item_class, item_count)
+    read_paths(items, 1)
+    used_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(items), used_bytes, build_seconds, read_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SynapseItem memory and path access.')
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--reads', type=int, default=3, help='Number of times to read the paths of every item.')
+    parser.add_argument('--legacy', default=False, action='store_true',
+                        help='Also benchmark the previous item model.')
+    args = parser.parse_args()
+
+    models = [('slots', SynapseItem)]
+    if args.legacy:
+        models.append(('legacy', LegacySynapseItem))
+
+    print('{0:>8} {1:>10} {2:>10} {3:>14} {4:>12} {5:>12}'.format(
+        'model', 'items', 'MB', 'bytes / item', 'build (s)', 'reads (s)'))
+    for name, item_class in models:
+        item_count, used_bytes, build_seconds, read_seconds = run(item_class, args.items, args.reads)
+        print('{0:>8} {1:>10} {2:>10.1f} {3:>14.1f} {4:>12.2f} {5:>12.2f}'.format(
+            name, item_count, used_bytes / 1024 / 1024, used_bytes / item_count, build_seconds, read_seconds))
+
+
+if __name__ == '__main__':
+    main()
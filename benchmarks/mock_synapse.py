@@ -0,0 +1,367 @@
+"""A local stand-in for the Synapse REST API and file storage that serves a synthetic project.
+
+Only the calls the downloader makes are implemented: getting entities and bundles, entity paths, listing children,
+batch loading file handles with pre-signed URLs, and downloading files with or without byte ranges.
+
+The project is never held in memory. Folders are numbered breadth first and the files of each leaf folder are
+numbered in order, so every entity, file handle and byte of content is computed from its ID. A file's content is a
+pattern shared by every file of the same size followed by a trailer unique to the file, so the MD5 of the shared
+part is computed once for each size.
+
+Each API call waits for the latency before it responds and each file download request (a whole file or a range)
+is limited to the bandwidth.
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT_ID = 4489
+PROJECT_ID = 1000
+# Folders are numbered from the project and files from FILE_BASE.
+FILE_BASE = 100000000
+FILE_HANDLE_OFFSET = 500000000
+TRAILER_SIZE = 16
+BLOCK_SIZE = 1024 * 1024
+PAGE_SIZE = 50
+MODIFIED_ON = '2020-01-01T00:00:00.000Z'
+
+PROFILES = {
+    # 1M files of 1 KB in 1000 folders.
+    'tiny': {'depth': 1, 'folders': 1000, 'files': 1000, 'size': 1024},
+    # 100 files of 256 MB in the project.
+    'huge': {'depth': 0, 'folders': 0, 'files': 100, 'size': 256 * 1024 * 1024},
+    # 10 files of 10 KB in each of the 1024 folders 10 levels down.
+    'deep': {'depth': 10, 'folders': 2, 'files': 10, 'size': 10 * 1024},
+    # A quick check: 1000 files of 10 KB in 10 folders.
+    'small': {'depth': 1, 'folders': 10, 'files': 100, 'size': 10 * 1024}
+}
+
+
+class SyntheticProject:
+    """A project with `folders` folders in each folder down to `depth` levels and `files` files in each leaf folder."""
+
+    def __init__(self, depth, folders, files, size):
+        self.depth = depth
+        self.folders = folders if depth else 0
+        self.files_per_folder = files
+        self.size = size
+        # Folder IDs by level. Level 0 is the project.
+        self._levels = [(PROJECT_ID, 1)]
+        next_id, count = PROJECT_ID + 1, 1
+        for _ in range(self.depth):
+            count *= self.folders
+            self._levels.append((next_id, count))
+            next_id += count
+        self.leaf_start, self.leaf_count = self._levels[-1]
+        self.file_count = self.leaf_count * self.files_per_folder
+        self.total_bytes = self.file_count * self.size
+        self._pattern = bytes((i * 7 + i // 251) % 256 for i in range(BLOCK_SIZE))
+        self._body_md5s = {}
+        self._md5_lock = threading.Lock()
+
+    @property
+    def project_id(self):
+        return 'syn{0}'.format(PROJECT_ID)
+
+    def _level(self, number):
+        for level, (start, count) in enumerate(self._levels):
+            if start <= number < start + count:
+                return level, number - start
+        return None, None
+
+    def entity(self, entity_id):
+        """Gets the properties of an entity or None if it does not exist."""
+        number = int(entity_id[3:])
+        if number >= FILE_BASE:
+            index = number - FILE_BASE
+            if index >= self.file_count:
+                return None
+            leaf = self.leaf_start + index // self.files_per_folder
+            return {'id': entity_id,
+                    'name': 'file{0:07d}.bin'.format(index % self.files_per_folder),
+                    'parentId': 'syn{0}'.format(leaf),
+                    'concreteType': 'org.sagebionetworks.repo.model.FileEntity',
+                    'etag': 'e0',
+                    'versionNumber': 1,
+                    'dataFileHandleId': str(number + FILE_HANDLE_OFFSET),
+                    'modifiedOn': MODIFIED_ON}
+
+        level, index = self._level(number)
+        if level is None:
+            return None
+        if level == 0:
+            return {'id': entity_id, 'name': 'Project', 'parentId': 'syn{0}'.format(ROOT_ID),
+                    'concreteType': 'org.sagebionetworks.repo.model.Project', 'etag': 'e0', 'versionNumber': 1,
+                    'modifiedOn': MODIFIED_ON}
+        parent_start = self._levels[level - 1][0]
+        return {'id': entity_id,
+                'name': 'folder{0:04d}'.format(index % self.folders),
+                'parentId': 'syn{0}'.format(parent_start + index // self.folders),
+                'concreteType': 'org.sagebionetworks.repo.model.Folder',
+                'etag': 'e0',
+                'versionNumber': 1,
+                'modifiedOn': MODIFIED_ON}
+
+    def children(self, parent_id, start, count):
+        """Gets a page of the children of a container and if there are more."""
+        level, index = self._level(int(parent_id[3:]))
+        if level is None:
+            return [], False
+        if level < self.depth:
+            first = self._levels[level + 1][0] + index * self.folders
+            ids = range(first, first + self.folders)
+        else:
+            first = FILE_BASE + index * self.files_per_folder
+            ids = range(first, first + self.files_per_folder)
+        page = [self.entity('syn{0}'.format(number)) for number in ids[start:start + count]]
+        return page, start + count < len(ids)
+
+    def path(self, entity_id):
+        path = []
+        entity = self.entity(entity_id)
+        while entity is not None:
+            path.append({'id': entity['id'], 'name': entity['name']})
+            entity = self.entity(entity['parentId'])
+        path.append({'id': 'syn{0}'.format(ROOT_ID), 'name': 'root'})
+        return list(reversed(path))
+
+    def file_handle(self, file_handle_id):
+        return {'id': file_handle_id,
+                'fileName': self.entity('syn{0}'.format(int(file_handle_id) - FILE_HANDLE_OFFSET))['name'],
+                'contentSize': self.size,
+                'contentMd5': self.md5(file_handle_id),
+                'concreteType': 'org.sagebionetworks.repo.model.file.S3FileHandle',
+                'status': 'AVAILABLE',
+                'isPreview': False}
+
+    def _trailer(self, file_handle_id):
+        return hashlib.md5(file_handle_id.encode()).digest()[:min(TRAILER_SIZE, self.size)]
+
+    def md5(self, file_handle_id):
+        body_size = max(0, self.size - TRAILER_SIZE)
+        with self._md5_lock:
+            body_md5 = self._body_md5s.get(body_size)
+            if body_md5 is None:
+                body_md5 = hashlib.md5()
+                for start in range(0, body_size, BLOCK_SIZE):
+                    body_md5.update(self._pattern[:min(BLOCK_SIZE, body_size - start)])
+                self._body_md5s[body_size] = body_md5
+        md5 = body_md5.copy()
+        md5.update(self._trailer(file_handle_id))
+        return md5.hexdigest()
+
+    def read(self, file_handle_id, start, end):
+        """Yields the bytes of a file from start to end inclusive."""
+        body_size = max(0, self.size - TRAILER_SIZE)
+        offset = start
+        while offset <= end:
+            if offset < body_size:
+                block_offset = offset % BLOCK_SIZE
+                length = min(BLOCK_SIZE - block_offset, body_size - offset, end - offset + 1)
+                yield self._pattern[block_offset:block_offset + length]
+            else:
+                trailer = self._trailer(file_handle_id)
+                length = end - offset + 1
+                yield trailer[offset - body_size:offset - body_size + length]
+            offset += length
+
+
+def _handler(project, latency, bandwidth, calls, calls_lock, server_ref):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _count(self, name):
+            with calls_lock:
+                calls[name] += 1
+            if latency:
+                time.sleep(latency)
+
+        def _json(self, obj, status=200):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self):
+            self._json({'reason': 'Not found: {0}'.format(self.path)}, 404)
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/_calls':
+                with calls_lock:
+                    return self._json(dict(calls))
+
+            match = re.match(r'/repo/v1/entity/(syn\d+)(/path|/version/\d+)?$', path)
+            if match:
+                self._count('path' if match.group(2) == '/path' else 'entity')
+                if match.group(1) == 'syn{0}'.format(ROOT_ID) and match.group(2) == '/path':
+                    return self._json({'path': project.path(match.group(1))})
+                entity = project.entity(match.group(1))
+                if entity is None:
+                    return self._not_found()
+                return self._json({'path': project.path(match.group(1))} if match.group(2) == '/path' else entity)
+
+            match = re.match(r'/data/(\d+)$', path)
+            if match:
+                return self._send_file(match.group(1))
+            self._not_found()
+
+        def do_POST(self):
+            path = self.path.split('?')[0]
+            length = int(self.headers.get('Content-Length', 0) or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+
+            match = re.match(r'/repo/v1/entity/(syn\d+)/bundle2$', path)
+            if match:
+                self._count('bundle2')
+                entity = project.entity(match.group(1))
+                if entity is None:
+                    return self._not_found()
+                is_file = 'dataFileHandleId' in entity
+                return self._json({
+                    'entity': entity,
+                    'annotations': {'id': entity['id'], 'etag': 'e0', 'annotations': {}},
+                    'fileHandles': [project.file_handle(entity['dataFileHandleId'])] if is_file else [],
+                    'restrictionInformation': {'hasUnmetAccessRequirement': False},
+                    'entityType': 'file' if is_file else 'folder'})
+
+            if path == '/repo/v1/entity/children':
+                self._count('children')
+                start = int(body.get('nextPageToken') or 0)
+                page, more = project.children(body['parentId'], start, PAGE_SIZE)
+                response = {'page': [{'id': e['id'], 'name': e['name'], 'type': e['concreteType'],
+                                      'versionNumber': 1, 'modifiedOn': e['modifiedOn']} for e in page]}
+                if more:
+                    response['nextPageToken'] = str(start + PAGE_SIZE)
+                return self._json(response)
+
+            if path == '/file/v1/fileHandle/batch':
+                self._count('fileHandle/batch')
+                requested = []
+                for request in body['requestedFiles']:
+                    result = {'fileHandleId': request['fileHandleId'],
+                              'fileHandle': project.file_handle(request['fileHandleId'])}
+                    if body.get('includePreSignedURLs'):
+                        result['preSignedURL'] = 'http://127.0.0.1:{0}/data/{1}'.format(
+                            server_ref[0].server_port, request['fileHandleId'])
+                    requested.append(result)
+                return self._json({'requestedFiles': requested})
+            self._not_found()
+
+        def _send_file(self, file_handle_id):
+            self._count('data')
+            size = project.size
+            range_header = self.headers.get('Range')
+            start, end = 0, size - 1
+            if range_header:
+                first, last = range_header.split('=')[1].split('-')
+                start, end = int(first), min(int(last) if last else size - 1, size - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, end, size))
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Disposition', 'attachment; filename="{0}"'.format(
+                project.file_handle(file_handle_id)['fileName']))
+            self.end_headers()
+
+            started = time.perf_counter()
+            sent = 0
+            for piece in project.read(file_handle_id, start, end):
+                self.wfile.write(piece)
+                sent += len(piece)
+                if bandwidth:
+                    wait = sent / bandwidth - (time.perf_counter() - started)
+                    if wait > 0:
+                        time.sleep(wait)
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept as many connections as the downloader opens at once.
+    request_queue_size = 1024
+
+
+class MockSynapse:
+    """Serves a SyntheticProject on a local port, in this process or in a child process."""
+
+    def __init__(self, project, latency=0, bandwidth=None):
+        """
+        Args:
+            project: The SyntheticProject to serve.
+            latency: Seconds each API call waits before it responds.
+            bandwidth: Bytes per second each file download request is limited to.
+        """
+        self.project = project
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.port = None
+        self._server = None
+        self._process = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.port)
+
+    def start(self, in_process=False):
+        """Starts the server. A child process is used by default so it is not measured with the downloader."""
+        if in_process:
+            self._server = self._new_server()
+            self.port = self._server.server_port
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        else:
+            parent, child = multiprocessing.Pipe()
+            self._process = multiprocessing.Process(target=self._serve, args=(child,), daemon=True)
+            self._process.start()
+            self.port = parent.recv()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._process:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def configure(self):
+        """Points the Synapse client at the server."""
+        from synapsis import Synapsis
+        Synapsis.Synapse.setEndpoints(repoEndpoint=self.url + '/repo/v1',
+                                      authEndpoint=self.url + '/auth/v1',
+                                      fileHandleEndpoint=self.url + '/file/v1',
+                                      portalEndpoint=self.url + '/',
+                                      skip_checks=True)
+        return self
+
+    def calls(self):
+        """Gets the number of API calls and downloads by type."""
+        import requests
+        return requests.get(self.url + '/_calls').json()
+
+    def _new_server(self):
+        server_ref = []
+        server = _Server(('127.0.0.1', 0), _handler(self.project, self.latency, self.bandwidth,
+                                                    Counter(), threading.Lock(), server_ref))
+        server_ref.append(server)
+        return server
+
+    def _serve(self, pipe):
+        server = self._new_server()
+        pipe.send(server.server_port)
+        server.serve_forever()
@@ -29,5 +29,8 @@ setuptools.setup(
     install_requires=[
         "synapseclient>=2.3.1,<3.0.0",
         "synapsis>=0.0.7"
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp>=3.8"]
+    }
 )
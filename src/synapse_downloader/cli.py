@@ -13,18 +13,6 @@ from synapsis import cli as synapsis_cli
 ALL_COMMANDS = [download_cli, sync_from_synapse_cli]
 
 
-class LogFilter(logging.Filter):
-    FILTERS = [
-        'Connection pool is full, discarding connection:'
-    ]
-
-    def filter(self, record):
-        for filter in self.FILTERS:
-            if filter in record.msg:
-                return False
-        return True
-
-
 def main():
     Utils.patch()
     main_parser = argparse.ArgumentParser(description='Synapse Downloader')
@@ -72,11 +60,6 @@ def main():
         console.setFormatter(logging.Formatter('%(message)s'))
         logging.getLogger().addHandler(console)
 
-        # TODO: Fix "Connection pool is full, discarding connection:" and remove the log filter.
-        log_filter = LogFilter()
-        for logger in [logging.getLogger(name) for name in logging.root.manager.loggerDict]:
-            logger.addFilter(log_filter)
-
         print('Logging output to: {0}'.format(log_filename))
         exit_code = 1
         try:
@@ -1,4 +1,5 @@
 from .downloader import Downloader
+from synapse_downloader.core import TransferScheduler, Deduplicator, SynToolsError
 
 
 def create(subparsers, parents):
@@ -13,8 +14,11 @@ def create(subparsers, parents):
             help = 'The ID of the Synapse entity to download (Project, Folder or File).'
         else:
             help = 'The ID of the Synapse entity to compare (Project, Folder or File).'
+        # Downloading a plan gets these from the plan.
+        positional_nargs = '?' if command == 'download' else None
         parser.add_argument('entity_id',
                             metavar='entity-id',
+                            nargs=positional_nargs,
                             help=help)
 
         if command == 'download':
@@ -23,29 +27,117 @@ def create(subparsers, parents):
             help = 'The local path to compare.'
         parser.add_argument('local_path',
                             metavar='local-path',
+                            nargs=positional_nargs,
                             help=help)
 
         if command == 'download':
-            help = 'Items to exclude from download. Synapse IDs, names, or filenames (names are case-sensitive).'
+            help = 'Items to exclude from download. Synapse IDs, names, filenames or paths (names are case-sensitive),' \
+                   ' globs (*.tmp or glob:PATTERN) or regular expressions (re:PATTERN).'
         else:
-            help = 'Items to exclude from compare. Synapse IDs, names, or filenames (names are case-sensitive).'
+            help = 'Items to exclude from compare. Synapse IDs, names, filenames or paths (names are case-sensitive),' \
+                   ' globs (*.tmp or glob:PATTERN) or regular expressions (re:PATTERN).'
         parser.add_argument('-e', '--exclude', help=help, action='append', nargs='?')
 
+        parser.add_argument('-i', '--include',
+                            help='Only {0} files that match. Same patterns as --exclude.'.format(command),
+                            action='append',
+                            nargs='?')
+
+        parser.add_argument('-rh', '--rehash',
+                            help='Ignore cached MD5s and rehash every local file.',
+                            default=False,
+                            action='store_true')
+
+        parser.add_argument('-sf', '--stats-file',
+                            metavar='STATS-PATH',
+                            help='Save progress and latency stats to a JSON file every 30 seconds and at the end.',
+                            default=None)
+
+        parser.add_argument('-mp', '--metrics-port',
+                            metavar='PORT',
+                            help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics.',
+                            type=int,
+                            default=None)
+
+        if command == 'download':
+            help = 'Save the differences found by --with-compare to a JSON lines or CSV (.csv) file, with a ' \
+                   'JSON summary of the counts.'
+        else:
+            help = 'Save the differences to a JSON lines or CSV (.csv) file, with a JSON summary of the counts.'
+        parser.add_argument('-rp', '--report',
+                            metavar='REPORT-PATH',
+                            help=help,
+                            default=None)
+
+        if command == 'compare':
+            parser.add_argument('-st', '--stream',
+                                help='Compare one folder at a time instead of loading everything from Synapse first.',
+                                default=False,
+                                action='store_true')
+
         if command == 'download':
             parser.add_argument('-wc', '--with-compare',
                                 help='Run compare after downloading everything.',
                                 default=False,
                                 action='store_true')
 
+            parser.add_argument('-rs', '--resume',
+                                help='Resume an interrupted download from where it stopped.',
+                                default=False,
+                                action='store_true')
+
+            parser.add_argument('-inc', '--incremental',
+                                help='Skip files that have not changed in Synapse or locally since the last '
+                                     'incremental download.',
+                                default=False,
+                                action='store_true')
+
+            parser.add_argument('-dd', '--dedup',
+                                help='Create files from identical local files (same MD5 and size) instead of '
+                                     'downloading them, with a hard link, reflink or copy.',
+                                choices=Deduplicator.POLICIES,
+                                default=None)
+
+            parser.add_argument('-sc', '--schedule',
+                                help='The order to download files in. Default: fifo (the order they are listed).',
+                                choices=TransferScheduler.POLICIES,
+                                default=None)
+
+            plan_group = parser.add_mutually_exclusive_group()
+            plan_group.add_argument('-dr', '--dry-run',
+                                    metavar='PLAN-PATH',
+                                    help='Save what would be downloaded to a JSON plan without downloading.',
+                                    default=None)
+
+            plan_group.add_argument('-pl', '--plan',
+                                    metavar='PLAN-PATH',
+                                    help='Download the files in a plan saved by --dry-run without listing Synapse.',
+                                    default=None)
+
         parser.set_defaults(_new_command=new_command)
 
 
 def new_command(args):
     do_download = args.command == 'download'
     do_compare = args.command == 'compare' or ('with_compare' in args and args.with_compare)
+    plan = args.plan if 'plan' in args else None
+    if not plan and (args.entity_id is None or args.local_path is None):
+        raise SynToolsError('entity-id and local-path are required.')
     return Downloader(args.entity_id,
                       args.local_path,
                       download=do_download,
                       compare=do_compare,
-                      excludes=args.exclude
+                      excludes=args.exclude,
+                      includes=args.include,
+                      rehash=args.rehash,
+                      resume='resume' in args and args.resume,
+                      schedule=args.schedule if 'schedule' in args else None,
+                      dry_run=args.dry_run if 'dry_run' in args else None,
+                      plan=plan,
+                      stats_file=args.stats_file,
+                      metrics_port=args.metrics_port,
+                      stream_compare='stream' in args and args.stream,
+                      incremental='incremental' in args and args.incremental,
+                      dedup=args.dedup if 'dedup' in args else None,
+                      report=args.report
                       )
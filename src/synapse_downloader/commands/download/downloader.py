@@ -1,31 +1,92 @@
 import os
+import time
 import logging
-from datetime import datetime
+import weakref
+import itertools
+import contextlib
+from stat import S_ISREG
+from datetime import datetime, timedelta
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import synapseclient as syn
-from synapse_downloader.core import Utils, SynapseItem, Env, SynToolsError, FileSizeMismatchError
+from synapse_downloader.core import (
+    Utils, Env, SynToolsError, FileSizeMismatchError, Md5MismatchError,
+    SynapseItem, Comparables, LocalScanner, CompareReport, RemotePathCache, Md5Cache, HashService, ExcludeMatcher,
+    Deduplicator, DownloadCache, RunJournal, SyncState, DownloadPlan,
+    PipelineStage, TransferScheduler, ConcurrencyController, Metrics, MetricsServer,
+    ConnectionPool, AsyncTransfer, RangeDownloader
+)
 from synapsis import Synapsis
 
 
 class Downloader:
+    # Seconds between logging the progress and stage queue depths.
+    STATS_INTERVAL = 30
+    # Threads for the URL requests and fallbacks of downloads made with the AsyncTransfer.
+    ASYNC_TRANSFER_THREADS = 8
+    # The default executor set on each event loop so it can be shut down when the next run replaces it.
+    _api_executors = weakref.WeakKeyDictionary()
 
-    def __init__(self, starting_entity_id, download_path, download=True, compare=False, excludes=None):
+    def __init__(self, starting_entity_id, download_path, download=True, compare=False, excludes=None,
+                 includes=None, rehash=False, resume=False, schedule=None, dry_run=None, plan=None, stats_file=None,
+                 metrics_port=None, stream_compare=False, incremental=False, dedup=None, report=None):
         self._starting_entity_id = starting_entity_id
-        self._download_path = Utils.expand_path(download_path)
+        self._download_path = Utils.expand_path(download_path) if download_path else None
         self._do_download = download
         self._do_compare = compare
-        self._excludes = []
-        for exclude in (excludes or []):
-            if exclude.lower().strip().startswith('syn'):
-                self._excludes.append(exclude.lower().strip())
-            else:
-                self._excludes.append(exclude)
+        # Compare one folder at a time instead of gathering the whole Synapse tree first.
+        self._stream_compare = stream_compare and compare and not download
+        # Path to save the compare report to.
+        self._report_path = Utils.expand_path(report) if report else None
+        self._rehash = rehash
+        self._resume = resume
+        # Skip files that have not changed since the last incremental download.
+        self._incremental = incremental
+        # How to create files from identical local files instead of downloading them.
+        if dedup and dedup not in Deduplicator.POLICIES:
+            raise ValueError('Invalid dedup policy: {0}. Must be one of: {1}.'.format(
+                dedup, ', '.join(Deduplicator.POLICIES)))
+        self._dedup_policy = dedup
+        self._scheduler = TransferScheduler(schedule)
+        # Path to save the plan to instead of downloading.
+        self._dry_run_path = Utils.expand_path(dry_run) if dry_run else None
+        # Path of a plan to download.
+        self._plan_path = Utils.expand_path(plan) if plan else None
+        self._stats_file = Utils.expand_path(stats_file) if stats_file else None
+        self._metrics_port = metrics_port
+        self._excludes = [e for e in (excludes or []) if e]
+        self._includes = [i for i in (includes or []) if i]
+        self._matcher = ExcludeMatcher(self._excludes, self._includes)
 
         self.start_time = None
         self.end_time = None
 
-        self.queue = None
-        self.comparables = []
+        self.listing_stage = None
+        self.metadata_stage = None
+        self.transfer_stage = None
+        self.compare_stage = None
+        self._stats_task = None
+        self.comparables = Comparables()
+        self.remote_paths = RemotePathCache()
+        self.local_scanner = None
+        self.report = None
+        self._compare_complete = False
+        self.md5_cache = None
+        self.deduplicator = None
+        self.download_cache = None
+        self.journal = None
+        self._journal_pending = {}
+        self._journal_parents = {}
+        self.sync_state = None
+        # modifiedOn from the listing of each file that is loading or transferring.
+        self._listed_modified_on = {}
+        self.plan = None
+        self.metrics = Metrics()
+        self._metrics_server = None
+        self.controller = None
+        self.connection_pool = None
+        self.http_session = None
+        self.async_transfer = None
         self.errors = []
         self._abort = False
 
@@ -37,79 +98,265 @@ class Downloader:
         self.start_time = datetime.now()
         self.end_time = None
         self.errors = []
-        self.comparables = []
+        self.comparables = Comparables()
+        self.remote_paths = RemotePathCache()
+        self._compare_complete = False
+        self.journal = None
+        self._journal_pending = {}
+        self._journal_parents = {}
+        self.sync_state = None
+        self._listed_modified_on = {}
+        self.plan = None
+        self.metrics = Metrics()
+        self.controller = self._new_controller()
         try:
-            start_entity = await Synapsis.Chain.get(self._starting_entity_id, downloadFile=False)
-            start_item = await SynapseItem(
-                start_entity,
-                synapse_root_path=await self._remote_abs_base_path(start_entity.parentId),
-                local_root_path=self._download_path
-            ).load()
-
-            if self._do_download:
-                if start_item.is_file:
-                    Utils.ensure_dirs(start_item.local.dirname)
-                else:
-                    Utils.ensure_dirs(start_item.local.abs_path)
-
-            if self._do_compare:
-                self._add_comparable(start_item)
-
-            if not self.validate_for_download_or_compare(start_item):
-                return
-            if self._do_compare and not self.validate_for_compare(start_item):
-                return
-
-            if self._do_download:
-                logging.info('Downloading: {0} ({1}) to {2}'.format(start_item.name,
-                                                                    start_item.id,
-                                                                    start_item.local.abs_path))
-            if self._do_compare:
-                logging.info('Comparing: {0} to {1} ({2})'.format(start_item.local.abs_path,
-                                                                  start_item.name,
-                                                                  start_item.id))
-
-            if self._excludes:
-                logging.info('Excluding: {0}'.format(','.join(self._excludes)))
-
-            if Env.SYNTOOLS_SYN_GET_DOWNLOAD():
-                logging.info('Using synapseclient.get for downloads.')
-
-            if self._do_download:
-                logging.info('Starting Download Process...')
+            self.connection_pool = self._new_connection_pool()
+            if self._do_download and Env.SYNTOOLS_ASYNC_DOWNLOAD() and not Env.SYNTOOLS_SYN_GET_DOWNLOAD():
+                self.async_transfer = AsyncTransfer(connections=self.controller.max_workers,
+                                                    throttled=self.controller.throttled)
+            if self._metrics_port is not None:
+                self._metrics_server = MetricsServer(self.metrics, self._metrics_port).start()
+            self.md5_cache = Md5Cache()
+            if self._dedup_policy and self._do_download and not self._dry_run_path:
+                self.deduplicator = Deduplicator(self.md5_cache, self._dedup_policy)
+            if self._do_download and not self._dry_run_path:
+                self.download_cache = DownloadCache.from_env()
+            if (self._dry_run_path or self._plan_path) and self._do_compare:
+                self._log_error('Compare cannot be used with a dry run or plan.')
+            elif self._plan_path:
+                await self._execute_plan()
             else:
-                logging.info('Gathering Compare Items...')
-
-            self.queue = asyncio.Queue()
-
-            producers = [asyncio.create_task(self._process_children(start_item))]
-            worker_count = Env.SYNTOOLS_DOWNLOAD_WORKERS()
-            logging.debug('Worker Count: {0}'.format(worker_count))
-            workers = [asyncio.create_task(self._worker()) for _ in range(worker_count)]
-            await asyncio.gather(*producers)
-            if not self._abort:
-                await self.queue.join()
-            for worker in workers:
-                worker.cancel()
-
-            if self._do_compare and not self._abort:
-                logging.info('Starting Compare Process...')
-                producers = [asyncio.create_task(self._compare_path(start_item))]
-                workers = [asyncio.create_task(self._compare_worker()) for _ in range(worker_count)]
-                await asyncio.gather(*producers)
-                if not self._abort:
-                    await self.queue.join()
-                for worker in workers:
-                    worker.cancel()
+                if self._do_compare:
+                    self.local_scanner = LocalScanner()
+                    if self._report_path:
+                        self.report = CompareReport(self._report_path,
+                                                    entity_id=self._starting_entity_id,
+                                                    local_path=self._download_path)
+                await self._execute_listing()
 
+            if self.journal and not self.errors and not self._abort:
+                # Everything was downloaded, the next run starts over.
+                self.journal.delete()
         except Exception as ex:
             self._log_error('Execute Error', error=ex)
+        finally:
+            self._report_metrics()
+            if self._metrics_server:
+                self._metrics_server.stop()
+                self._metrics_server = None
+            if self.md5_cache:
+                self.md5_cache.close()
+            if self.local_scanner:
+                self.local_scanner.close()
+                self.local_scanner = None
+            if self.report:
+                self._close_report()
+            self.deduplicator = None
+            if self.download_cache:
+                self.download_cache.close()
+                self.download_cache = None
+            if self.async_transfer:
+                await self.async_transfer.close()
+                self.async_transfer = None
+            if self.connection_pool:
+                self.connection_pool.close()
+                self.connection_pool = None
+                self.http_session = None
+            if self.sync_state:
+                self.sync_state.close()
+            if self.journal and not self.journal.closed:
+                self.journal.close()
+                logging.info('Use --resume to continue this download.')
 
         self.end_time = datetime.now()
         logging.info('')
         logging.info('Run time: {0}'.format(self.end_time - self.start_time))
         return self
 
+    async def _execute_listing(self):
+        """Lists the starting entity and downloads, compares or plans everything under it."""
+        if self._use_journal:
+            self.journal = RunJournal(self._starting_entity_id, self._download_path)
+            if not self._resume_from_journal:
+                self.journal.clear()
+            elif not self.journal.matches_filters(self._excludes, self._includes):
+                # Folders are journaled as completed without their excluded items.
+                logging.warning('The excludes or includes changed since the journal was saved. '
+                                'Downloading everything.')
+                self.journal.clear()
+            self.journal.set_filters(self._excludes, self._includes)
+        if self._use_sync_state:
+            self.sync_state = SyncState(self._starting_entity_id, self._download_path)
+        if self._dry_run_path:
+            self.plan = DownloadPlan(self._starting_entity_id, self._download_path, excludes=self._excludes,
+                                     includes=self._includes)
+
+        start_entity = await Synapsis.Chain.get(self._starting_entity_id, downloadFile=False)
+        start_item = await SynapseItem(
+            start_entity,
+            synapse_root_path=await self._remote_abs_base_path(start_entity.parentId),
+            local_root_path=self._download_path
+        ).load()
+
+        if self._do_download and not self._dry_run_path:
+            if start_item.is_file:
+                Utils.ensure_dirs(start_item.local.dirname)
+            else:
+                Utils.ensure_dirs(start_item.local.abs_path)
+
+        if self._do_compare:
+            self._add_comparable(start_item)
+
+        if not self.validate_for_download_or_compare(start_item):
+            return
+        if self._do_compare and not self.validate_for_compare(start_item):
+            return
+
+        if self._dry_run_path:
+            logging.info('Planning: {0} ({1}) to {2}'.format(start_item.name,
+                                                             start_item.id,
+                                                             start_item.local.abs_path))
+        elif self._do_download:
+            logging.info('Downloading: {0} ({1}) to {2}'.format(start_item.name,
+                                                                start_item.id,
+                                                                start_item.local.abs_path))
+        if self._do_compare:
+            logging.info('Comparing: {0} to {1} ({2})'.format(start_item.local.abs_path,
+                                                              start_item.name,
+                                                              start_item.id))
+            if self.report:
+                logging.info('Compare report: {0}'.format(self.report.path))
+
+        if self._excludes:
+            logging.info('Excluding: {0}'.format(','.join(self._excludes)))
+        if self._includes:
+            logging.info('Including: {0}'.format(','.join(self._includes)))
+
+        if self._rehash:
+            logging.info('Rehashing all local files.')
+
+        if self._resume_from_journal:
+            logging.info('Resuming from journal: {0}'.format(self.journal.db_path))
+        elif self._resume:
+            logging.info('Resume is not available when comparing. Downloading everything.')
+
+        if self.sync_state:
+            logging.info('Incremental: skipping files unchanged since: {0}'.format(self.sync_state.db_path))
+        elif self._incremental:
+            logging.info('Incremental is not available when comparing or planning. Checking everything.')
+
+        if Env.SYNTOOLS_SYN_GET_DOWNLOAD():
+            logging.info('Using synapseclient.get for downloads.')
+
+        if self._do_download and self._scheduler.is_ordered:
+            logging.info('Download order: {0}'.format(self._scheduler.policy))
+
+        if self._do_download and self.controller.is_adaptive:
+            logging.info('Adaptive download workers: {0}-{1}'.format(self.controller.min_workers,
+                                                                      self.controller.max_workers))
+
+        if self._stream_compare:
+            logging.info('Starting Streaming Compare Process...')
+            self.compare_stage = PipelineStage('compare', self._stream_compare_path, Env.SYNTOOLS_DOWNLOAD_WORKERS())
+            await self._run_stages([self.compare_stage], self._stream_compare_path(start_item))
+            self._compare_complete = not self._abort
+            return
+
+        if self._dry_run_path:
+            logging.info('Starting Dry Run...')
+        elif self._do_download:
+            logging.info('Starting Download Process...')
+        else:
+            logging.info('Gathering Compare Items...')
+
+        # Folders are listed, file handles are loaded and files are transferred in separate stages so
+        # a slow stage does not hold up the others.
+        self.listing_stage = PipelineStage('listing', self._process_folder,
+                                           Env.SYNTOOLS_LISTING_WORKERS())
+        self.metadata_stage = PipelineStage('metadata', self._load_children,
+                                            Env.SYNTOOLS_METADATA_WORKERS(),
+                                            maxsize=max(1, Env.SYNTOOLS_QUEUE_SIZE() // SynapseItem.LOAD_BATCH_SIZE))
+        self.transfer_stage = PipelineStage('transfer', self._process_file,
+                                            self.controller.max_workers,
+                                            maxsize=Env.SYNTOOLS_QUEUE_SIZE(),
+                                            priority=self._scheduler.priority if self._scheduler.is_ordered else None)
+        await self._run_stages([self.listing_stage, self.metadata_stage, self.transfer_stage],
+                               self._process_children(start_item))
+
+        if self._dry_run_path and not self._abort:
+            if not start_item.is_file:
+                self.plan.add(start_item, DownloadPlan.DOWNLOAD)
+            self._save_plan()
+
+        if self._do_compare and not self._abort:
+            logging.info('Starting Compare Process...')
+            self.compare_stage = PipelineStage('compare', self._compare_path, Env.SYNTOOLS_DOWNLOAD_WORKERS())
+            await self._run_stages([self.compare_stage], self._compare_path(start_item))
+            self._compare_complete = not self._abort
+
+    def _save_plan(self):
+        plan_path = self.plan.save(self._dry_run_path)
+        totals = self.plan.totals
+        for action in DownloadPlan.ACTIONS:
+            logging.info('{0}: {1} files ({2}{3})'.format(
+                action.replace('-', ' ').title(),
+                totals[action]['files'],
+                Utils.pretty_size(totals[action]['bytes']),
+                ', {0} unknown size'.format(totals[action]['unknown_size']) if totals[action]['unknown_size'] else ''))
+        logging.info('Estimated download time: {0} (at {1} MB/s)'.format(
+            timedelta(seconds=round(self.plan.estimated_seconds())), Env.SYNTOOLS_PLAN_MBPS()))
+        logging.info('Plan saved to: {0}'.format(plan_path))
+        if self.errors:
+            logging.warning('The plan is incomplete because of errors.')
+
+    async def _execute_plan(self):
+        """Downloads the files in a plan made by a dry run without listing Synapse."""
+        self.plan = DownloadPlan.load(self._plan_path)
+        if self._starting_entity_id and self._starting_entity_id.lower() != self.plan.entity_id.lower():
+            self._log_error('Plan is for: {0} not: {1}'.format(self.plan.entity_id, self._starting_entity_id))
+            return
+        if self._download_path and self._download_path != self.plan.download_path:
+            self._log_error('Plan is for: {0} not: {1}'.format(self.plan.download_path, self._download_path))
+            return
+
+        files = [DownloadPlan.to_synapse_item(entry) for entry in self.plan.files(DownloadPlan.DOWNLOAD)]
+        logging.info('Downloading plan: {0} ({1} files, {2}) to {3}'.format(
+            self._plan_path,
+            len(files),
+            Utils.pretty_size(self.plan.totals[DownloadPlan.DOWNLOAD]['bytes']),
+            self.plan.download_path))
+        if self._excludes:
+            logging.info('Excluding: {0}'.format(','.join(self._excludes)))
+        if self._includes:
+            logging.info('Including: {0}'.format(','.join(self._includes)))
+        if self._do_download and self._scheduler.is_ordered:
+            logging.info('Download order: {0}'.format(self._scheduler.policy))
+        if self.controller.is_adaptive:
+            logging.info('Adaptive download workers: {0}-{1}'.format(self.controller.min_workers,
+                                                                      self.controller.max_workers))
+
+        for entry in self.plan.folders(DownloadPlan.DOWNLOAD):
+            Utils.ensure_dirs(entry['local_path'])
+        for synapse_file in files:
+            Utils.ensure_dirs(synapse_file.local.dirname)
+
+        logging.info('Starting Download Process...')
+        self.metadata_stage = PipelineStage('metadata', self._load_children,
+                                            Env.SYNTOOLS_METADATA_WORKERS(),
+                                            maxsize=max(1, Env.SYNTOOLS_QUEUE_SIZE() // SynapseItem.LOAD_BATCH_SIZE))
+        self.transfer_stage = PipelineStage('transfer', self._process_file,
+                                            self.controller.max_workers,
+                                            maxsize=Env.SYNTOOLS_QUEUE_SIZE(),
+                                            priority=self._scheduler.priority if self._scheduler.is_ordered else None)
+        await self._run_stages([self.metadata_stage, self.transfer_stage], self._queue_plan_files(files))
+
+    async def _queue_plan_files(self, files):
+        """Sends the files in a plan to the metadata stage to get their pre-signed URLs."""
+        for index in range(0, len(files), SynapseItem.LOAD_BATCH_SIZE):
+            if self._abort:
+                return
+            await self.metadata_stage.put(files[index:index + SynapseItem.LOAD_BATCH_SIZE])
+
     def validate_for_download_or_compare(self, start_item):
         if not (start_item.is_project or start_item.is_folder or start_item.is_file):
             self._log_error('Starting entity must be a Project, Folder, or File.')
@@ -136,75 +383,308 @@ class Downloader:
             self.errors.append(msg)
             logging.error(msg)
 
-    async def _worker(self):
-        while not self._abort:
-            synapse_item = await self.queue.get()
-            if synapse_item:
-                try:
-                    await synapse_item.load()
+    async def _run_stages(self, stages, producer):
+        """Starts the stages, runs the producer and waits for each stage to finish in order."""
+        for stage in stages:
+            stage.start()
+        self.metrics.track_stages(stages)
+        self._stats_task = asyncio.create_task(self._log_stats_periodically(stages))
+        try:
+            await producer
+            for stage in stages:
+                await stage.join()
+                self.metrics.stage_finished(stage)
+        finally:
+            self._stats_task.cancel()
+            for stage in stages:
+                stage.stop()
+            self._log_stats(stages)
 
-                    if self._do_compare:
-                        self._add_comparable(synapse_item)
+    async def _log_stats_periodically(self, stages):
+        while True:
+            await asyncio.sleep(self.STATS_INTERVAL)
+            self._report_metrics()
+            self._log_stats(stages)
 
-                    if synapse_item.is_folder:
-                        await self._process_folder(synapse_item)
-                    else:
-                        await self._process_file(synapse_item)
-                except Exception as ex:
-                    self._log_error('Download Worker Error', error=ex)
-                finally:
-                    self.queue.task_done()
-
-    async def _compare_worker(self):
-        while not self._abort:
-            synapse_item = await self.queue.get()
-            if synapse_item:
-                try:
-                    await self._compare_path(synapse_item)
-                except Exception as ex:
-                    self._log_error('Compare Worker Error', error=ex)
-                finally:
-                    self.queue.task_done()
+    def _report_metrics(self):
+        """Logs the progress and saves the stats file."""
+        try:
+            if self.metrics.counters['files_hashed']:
+                self.metrics.set_gauge('hash_bytes_per_second', HashService.default().stats()['bytes_per_second'])
+            snapshot = self.metrics.snapshot()
+            if self._do_download and not self._dry_run_path:
+                logging.info(self.metrics.summary(snapshot))
+            if self._stats_file:
+                self.metrics.save(self._stats_file, snapshot=snapshot)
+        except Exception as ex:
+            logging.warning('Failed to save stats: {0}'.format(ex))
+
+    def _log_stats(self, stages):
+        logging.debug('Queues: {0}'.format(', '.join(
+            '{name}: {depth} (max: {max_depth}, active: {active}/{workers}, processed: {processed})'.format(
+                **stage.stats()) for stage in stages)))
 
     async def _process_children(self, synapse_item):
         if self._abort:
             return
         try:
-            remote_abs_base_path = await self._remote_abs_base_path(synapse_item.parent_id)
             if synapse_item.is_file:
                 # Downloading or comparing a single File.
-                await self.queue.put(synapse_item)
+                await self._queue_transfer(synapse_item)
             else:
                 # Downloading or comparing Projects and Folders.
-                async for child in Synapsis.Chain.getChildren(synapse_item.id, includeTypes=["folder", "file"]):
+                self._visited(synapse_item)
+                self._journal_track(synapse_item)
+                listing = self.journal.get_listing(synapse_item.id) if self._resume_from_journal else None
+                from_journal = listing is not None
+                if from_journal:
+                    pages = self._iter_listing(listing)
+                else:
+                    listing = []
+                    pages = self._get_children_pages(synapse_item.id)
+
+                async for page in pages:
                     if self._abort:
                         return
-                    child_id = child.get('id')
-                    child_name = child.get('name')
-                    child_type = Synapsis.ConcreteTypes.get(child)
-                    await self.queue.put(
-                        SynapseItem(child_type,
-                                    id=child_id,
-                                    parent_id=synapse_item.id,
-                                    name=child_name,
-                                    synapse_root_path=remote_abs_base_path,
-                                    local_root_path=synapse_item.local.abs_path))
+                    if self.journal and not from_journal:
+                        listing.extend(page)
+                    modified_on = {c.get('id'): c.get('modifiedOn') for c in page} if self.sync_state else None
+                    children = []
+                    for child in page:
+                        child_id = child.get('id')
+                        child_name = child.get('name')
+                        child_type = Synapsis.ConcreteTypes.get(child)
+                        children.append(
+                            SynapseItem(child_type,
+                                        id=child_id,
+                                        parent_id=synapse_item.id,
+                                        name=child_name,
+                                        synapse_root_path=synapse_item.synapse_path,
+                                        local_root_path=synapse_item.local.abs_path,
+                                        version_number=child.get('versionNumber')))
+                    await self._queue_children(children, modified_on=modified_on)
+
+                self.metrics.increment('folders_listed')
+                if self.journal and not from_journal:
+                    self.journal.folder_listed(synapse_item.id, listing)
+                self._journal_completed(synapse_item.id)
         except Exception as ex:
             self._log_error('Failed to get folders and files for: {0}'.format(Synapsis.id_of(synapse_item)), error=ex)
 
-    def can_skip(self, synapse_item):
-        skip_values = [
-            synapse_item.id,
-            synapse_item.name,
-            synapse_item.synapse_path,
-            synapse_item.local.abs_path,
-            synapse_item.local.name
-        ]
-        for skip_value in skip_values:
-            if skip_value in self._excludes:
-                return True
+    async def _get_children_pages(self, parent_id):
+        """Gets the children of a container in pages of up to LOAD_BATCH_SIZE.
+
+        getChildren is a blocking generator so each page is read in the executor to keep the event loop free.
+        The next page is read while the current page is being processed.
+        """
+        children = await Synapsis.Chain.getChildren(parent_id, includeTypes=["folder", "file"])
+        loop = asyncio.get_running_loop()
+
+        def read_page():
+            with self.metrics.timer('list_children'):
+                return list(itertools.islice(children, SynapseItem.LOAD_BATCH_SIZE))
+
+        next_page = loop.run_in_executor(None, read_page)
+        try:
+            while True:
+                page = await next_page
+                if not page:
+                    next_page = None
+                    break
+                self.metrics.increment('list_pages')
+                self.metrics.increment('entities_listed', len(page))
+                next_page = loop.run_in_executor(None, read_page)
+                yield page
+        finally:
+            if next_page is not None:
+                # The listing was stopped early. Drop the page being read.
+                next_page.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    @staticmethod
+    async def _iter_listing(listing):
+        for index in range(0, len(listing), SynapseItem.LOAD_BATCH_SIZE):
+            yield listing[index:index + SynapseItem.LOAD_BATCH_SIZE]
+
+    async def _queue_children(self, children, modified_on=None):
+        """Sends folders to the listing stage and files to the metadata stage.
+
+        Args:
+            children: The SynapseItems in a page of a listing.
+            modified_on: Dict of the modifiedOn of each child by ID. Unchanged files are skipped when it is set.
+        """
+        for child in children:
+            if child.parent_id in self._journal_pending:
+                self._journal_pending[child.parent_id] += 1
+        if self._resume_from_journal:
+            children = [c for c in children if not self._is_journaled(c)]
+
+        folders = []
+        files = []
+        for child in children:
+            if self._abort:
+                return
+            if child.is_file:
+                # Files excluded by ID or name are skipped before their file handles are loaded.
+                # Dry runs load them so the plan has their sizes.
+                if self._matcher and not self._dry_run_path and self.can_skip(child, loaded=False):
+                    self._skip_file(child)
+                elif modified_on and self._is_unchanged(child, modified_on.get(child.id)):
+                    continue
+                else:
+                    if modified_on:
+                        self._listed_modified_on[child.id] = modified_on.get(child.id)
+                    files.append(child)
+            elif self._matcher and self.can_skip(child):
+                # Excluded folders are never listed.
+                self._skip_folder(child)
+            else:
+                if self._do_compare:
+                    self._add_comparable(child)
+                folders.append(child)
+
+        # Folders go first so listing the next level is not held up by a full metadata stage.
+        if folders:
+            await self.listing_stage.put_many(folders)
+        if files:
+            await self.metadata_stage.put(files)
+
+    async def _load_children(self, children):
+        """Loads the file handles for a batch of files and sends them to the transfer stage."""
+        if self._abort:
+            return
+
+        try:
+            with self.metrics.timer('load_batch'):
+                await SynapseItem.load_batch(children, pre_signed_urls=self._use_pre_signed_urls)
+        except Exception as ex:
+            # Each item will be loaded individually.
+            logging.debug('Failed to batch load file handles: {0}'.format(ex))
+
+        for child in children:
+            if self._abort:
+                return
+            try:
+                await child.load()
+            except Exception as ex:
+                self._listed_modified_on.pop(child.id, None)
+                self._log_error('Failed to load: {0} ({1})'.format(child.synapse_path, child.id), error=ex)
+                continue
+
+            if self._do_compare:
+                self._add_comparable(child)
+            await self._queue_transfer(child)
+
+    async def _queue_transfer(self, synapse_file):
+        self.metrics.increment('files_queued')
+        self.metrics.increment('bytes_queued', synapse_file.content_size or 0)
+        await self.transfer_stage.put(synapse_file)
+
+    @property
+    def _use_journal(self):
+        return self._do_download and not self._dry_run_path and not self._plan_path
+
+    @property
+    def _resume_from_journal(self):
+        return self._resume and self._use_journal and not self._do_compare
+
+    def _is_journaled(self, synapse_item):
+        """Gets if an item was completed in an earlier run and marks it completed in this run."""
+        if synapse_item.is_file:
+            local_path = self.journal.is_file_current(synapse_item.id, synapse_item.version_number)
+            if local_path is None:
+                return False
+            logging.info('File is current (journal): {0} -> {1}'.format(synapse_item.synapse_path, local_path))
+        else:
+            if not self.journal.is_folder_completed(synapse_item.id):
+                return False
+            logging.info('Folder is current (journal): {0} -> {1}'.format(synapse_item.synapse_path,
+                                                                          synapse_item.local.abs_path))
+
+        self._journal_completed(synapse_item.parent_id)
+        return True
+
+    @property
+    def _use_sync_state(self):
+        return self._incremental and self._use_journal and not self._do_compare
+
+    def _is_unchanged(self, synapse_file, modified_on):
+        """Gets if a file has not changed in Synapse or locally since the last incremental download."""
+        entry = self.sync_state.unchanged_file(synapse_file.id,
+                                               synapse_file.version_number,
+                                               modified_on,
+                                               synapse_file.local_root_path)
+        if entry is None:
+            return False
+        logging.info('File is unchanged: {0} -> {1}'.format(synapse_file.synapse_path, entry['local_path']))
+        self.metrics.increment('files_unchanged')
+        self.metrics.increment('files_current')
+        self.metrics.increment('bytes_current', entry['size'])
+        if self.journal:
+            self.journal.file_verified(synapse_file.id, synapse_file.version_number, entry['md5'], entry['size'],
+                                       entry['local_path'])
+            self._journal_completed(synapse_file.parent_id)
+        return True
+
+    def _sync_file(self, synapse_file, local_path):
+        """Records a file that was downloaded or verified for the next incremental download."""
+        modified_on = self._listed_modified_on.pop(synapse_file.id, None)
+        if self.sync_state and modified_on:
+            self.sync_state.file_synced(synapse_file.id,
+                                        synapse_file.version_number,
+                                        modified_on,
+                                        synapse_file.content_md5,
+                                        local_path)
 
-        return False
+    def _journal_track(self, synapse_folder):
+        """Starts counting the outstanding items in a folder so it can be journaled once everything under it
+        has completed. The folder holds one count until its listing finishes.
+        """
+        if self.journal:
+            if synapse_folder.parent_id in self._journal_pending:
+                self._journal_parents[synapse_folder.id] = synapse_folder.parent_id
+            self._journal_pending[synapse_folder.id] = 1
+
+    def _journal_completed(self, folder_id):
+        """Marks one item in a folder as completed."""
+        while folder_id in self._journal_pending:
+            self._journal_pending[folder_id] -= 1
+            if self._journal_pending[folder_id] > 0:
+                break
+            del self._journal_pending[folder_id]
+            self.journal.folder_completed(folder_id)
+            folder_id = self._journal_parents.pop(folder_id, None)
+
+    def _journal_file(self, synapse_file, local_path):
+        if self.journal:
+            self.journal.file_verified(synapse_file.id,
+                                       synapse_file.version_number,
+                                       synapse_file.content_md5,
+                                       synapse_file.content_size,
+                                       local_path)
+            self._journal_completed(synapse_file.parent_id)
+
+    @property
+    def _use_pre_signed_urls(self):
+        return self._do_download and not self._dry_run_path and not Env.SYNTOOLS_SYN_GET_DOWNLOAD()
+
+    def _plan_add(self, synapse_item, action):
+        if self._dry_run_path:
+            self.plan.add(synapse_item, action)
+
+    def can_skip(self, synapse_item, loaded=True):
+        """Gets if an item is excluded. See ExcludeMatcher.is_excluded."""
+        return self._matcher.is_excluded(synapse_item, loaded=loaded)
+
+    def _skip_folder(self, synapse_folder):
+        logging.info('Skipping Folder: {0} ({1})'.format(synapse_folder.synapse_path, synapse_folder.id))
+        self._journal_completed(synapse_folder.parent_id)
+        self._plan_add(synapse_folder, DownloadPlan.SKIP_EXCLUDED)
+
+    def _skip_file(self, synapse_file):
+        logging.info('Skipping File: {0} ({1})'.format(synapse_file.synapse_path, synapse_file.id))
+        self.metrics.increment('files_excluded')
+        self._journal_completed(synapse_file.parent_id)
+        self._plan_add(synapse_file, DownloadPlan.SKIP_EXCLUDED)
 
     async def _process_folder(self, synapse_folder):
         if self._abort:
@@ -217,9 +697,12 @@ class Downloader:
             local_abs_full_path = synapse_folder.local.abs_path
 
             if self.can_skip(synapse_folder):
-                logging.info('Skipping Folder: {0} ({1})'.format(full_remote_path, synapse_folder.id))
+                self._skip_folder(synapse_folder)
             else:
-                if self._do_download:
+                if self._dry_run_path:
+                    logging.info('Folder: {0} -> {1}'.format(full_remote_path, local_abs_full_path))
+                    self._plan_add(synapse_folder, DownloadPlan.DOWNLOAD)
+                elif self._do_download:
                     if os.path.isdir(local_abs_full_path):
                         logging.info('Folder Exists: {0} -> {1}'.format(full_remote_path, local_abs_full_path))
                     else:
@@ -255,7 +738,7 @@ class Downloader:
             full_remote_path = synapse_file.synapse_path
 
             if self.can_skip(synapse_file):
-                logging.info('Skipping File: {0} ({1})'.format(full_remote_path, syn_id))
+                self._skip_file(synapse_file)
             else:
                 remote_md5 = synapse_file.content_md5
                 content_size = synapse_file.content_size
@@ -269,7 +752,6 @@ class Downloader:
                                                                                Utils.real_path(download_path)))
                     download_path = Utils.real_path(download_path)
 
-                local_path = os.path.dirname(download_path)
                 can_download = True
 
                 if is_unknown_size:
@@ -280,53 +762,36 @@ class Downloader:
                     if local_size == content_size:
                         # Only check the md5 if the file sizes match.
                         # This way we can avoid MD5 checking for partial downloads and changed files.
-                        local_md5 = await synapse_file.local.content_md5_async()
+                        local_md5 = await self._get_local_md5(synapse_file)
                         if local_md5 == remote_md5:
                             can_download = False
                             logging.info('File is current: {0} -> {1}'.format(full_remote_path, download_path))
+                            self.metrics.increment('files_current')
+                            self.metrics.increment('bytes_current', content_size)
+                            self._journal_file(synapse_file, download_path)
+                            self._sync_file(synapse_file, download_path)
+                            self._plan_add(synapse_file, DownloadPlan.SKIP_CURRENT)
 
-                if can_download:
-                    downloaded_path = None
-                    if Env.SYNTOOLS_SYN_GET_DOWNLOAD():
-                        downloaded_file = await Synapsis.Chain.get(syn_id,
-                                                                   downloadFile=True,
-                                                                   downloadLocation=local_path,
-                                                                   ifcollision='overwrite.local')
-                        downloaded_path = downloaded_file.path
-                    else:
-                        downloaded_path = await Synapsis.Chain.Synapse._downloadFileHandle(
-                            synapse_file.file_handle_id,
-                            syn_id,
-                            'FileEntity',
-                            local_path,
-                            retries=Env.SYNTOOLS_DOWNLOAD_RETRIES())
-                        if downloaded_path is None or downloaded_path.strip() == '':
-                            raise SynToolsError('Unknown error.')
-
-                    downloaded_real_path = Utils.real_path(downloaded_path)
-
-                    if downloaded_real_path != download_path:
-                        if os.path.exists(download_path):
-                            os.remove(download_path)
-                        raise SynToolsError(
-                            'Downloaded path: {0} does not match expected path: {1}. Downloaded file deleted.'.format(
-                                downloaded_real_path,
-                                download_path))
-
-                    downloaded_size = os.path.getsize(download_path)
-                    if downloaded_size != synapse_file.content_size:
-                        if os.path.exists(download_path):
-                            os.remove(download_path)
-                        raise FileSizeMismatchError(
-                            'Downloaded size: {0} does not match expected size: {1}. Downloaded file deleted.'.format(
-                                downloaded_size,
-                                synapse_file.content_size))
-
-                    logging.info('File  : {0} ({1}) -> {2} ({3})'.format(full_remote_path,
+                if can_download and self._dry_run_path:
+                    logging.info('Plan  : {0} ({1}) -> {2} ({3})'.format(full_remote_path,
                                                                          syn_id,
                                                                          download_path,
-                                                                         Utils.pretty_size(downloaded_size)))
+                                                                         Utils.pretty_size(content_size)))
+                    self._plan_add(synapse_file, DownloadPlan.DOWNLOAD)
+                elif can_download and self.deduplicator and await self._deduplicate(synapse_file, download_path):
+                    pass
+                elif can_download:
+                    # Registered before the download cache is checked and held until the MD5 is cached so files
+                    # with the same MD5 wait for this one instead of downloading it too. There is no await between
+                    # a deduplicator miss and the registration.
+                    downloaded_md5 = None
+                    with self._downloading(synapse_file):
+                        if not (self.download_cache and await self._fill_from_cache(synapse_file, download_path)):
+                            downloaded_md5 = await self._download(synapse_file, download_path)
+                    if self.download_cache and downloaded_md5:
+                        await self._add_to_cache(synapse_file, download_path)
         except Exception as ex:
+            self.metrics.increment('files_failed')
             msg = 'Failed to Download:'
             if full_remote_path:
                 msg += ' {0} ({1})'.format(full_remote_path, synapse_file.id)
@@ -338,121 +803,570 @@ class Downloader:
             else:
                 msg += ' -> {0}'.format(synapse_file.local.abs_path)
             self._log_error(msg, error=ex)
+        finally:
+            self._listed_modified_on.pop(synapse_file.id, None)
+            self.metrics.increment('files_completed')
+            self.metrics.increment('bytes_completed', synapse_file.content_size or 0)
+
+    @staticmethod
+    def _new_controller():
+        workers = Env.SYNTOOLS_DOWNLOAD_WORKERS()
+        if Env.SYNTOOLS_ADAPTIVE_WORKERS():
+            return ConcurrencyController(Env.SYNTOOLS_MIN_DOWNLOAD_WORKERS(),
+                                         Env.SYNTOOLS_MAX_DOWNLOAD_WORKERS(),
+                                         initial_workers=workers)
+        return ConcurrencyController(workers, workers)
+
+    def _new_connection_pool(self):
+        """Sends the Synapse client's requests and the range downloads through a shared ConnectionPool.
+
+        The Synapse client is called from the loop's default executor, which is sized so every worker gets a thread.
+        The pool keeps a connection for each of those threads and for the ranges of a large file.
+        Downloads made with the AsyncTransfer do not use a thread so only a few are kept for them.
+        """
+        transfer_threads = self.controller.max_workers
+        if Env.SYNTOOLS_ASYNC_DOWNLOAD() and not Env.SYNTOOLS_SYN_GET_DOWNLOAD():
+            transfer_threads = min(transfer_threads, self.ASYNC_TRANSFER_THREADS)
+        threads = transfer_threads + Env.SYNTOOLS_LISTING_WORKERS() + Env.SYNTOOLS_METADATA_WORKERS()
+        pool_size = Env.SYNTOOLS_HTTP_POOL_SIZE() or threads + Env.SYNTOOLS_DOWNLOAD_CHUNK_WORKERS()
+        connection_pool = ConnectionPool(pool_size, metrics=self.metrics)
+        connection_pool.mount(Synapsis.Synapse._requests_session)
+        self.http_session = connection_pool.session()
+        self._set_api_executor(threads)
+        self.metrics.set_gauge('http_pool_size', pool_size)
+        return connection_pool
+
+    @classmethod
+    def _set_api_executor(cls, threads):
+        """Sets the loop's default executor. An earlier run on the loop with the same number of threads reuses
+        its executor, otherwise the earlier executor is shut down so its threads do not leak. The last one is
+        shut down with the loop.
+        """
+        loop = asyncio.get_running_loop()
+        previous_threads, previous = cls._api_executors.get(loop, (None, None))
+        if previous is not None and previous_threads == threads:
+            executor = previous
+        else:
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='syntools-api')
+            cls._api_executors[loop] = (threads, executor)
+        loop.set_default_executor(executor)
+        if previous is not None and previous is not executor:
+            previous.shutdown(wait=False)
+        return executor
+
+    async def _deduplicate(self, synapse_file, download_path):
+        """Creates a file from an identical local file.
+
+        Returns:
+            True if the file was created, False if it needs to be downloaded.
+        """
+        source_path = await self.deduplicator.find(synapse_file.content_md5, synapse_file.content_size, download_path)
+        if source_path is None:
+            return False
+        try:
+            policy = await self.deduplicator.create(source_path, download_path)
+        except OSError as ex:
+            logging.warning('Failed to create: {0} from: {1}. Downloading. {2}'.format(download_path, source_path, ex))
+            return False
+
+        size = os.path.getsize(download_path)
+        if size != synapse_file.content_size:
+            os.remove(download_path)
+            raise FileSizeMismatchError(
+                'Deduplicated size: {0} does not match expected size: {1}. File deleted.'.format(
+                    size, synapse_file.content_size))
+        await self._set_local_md5(download_path, synapse_file.content_md5)
+        logging.info('File  : {0} ({1}) -> {2} ({3} from: {4})'.format(synapse_file.synapse_path,
+                                                                       synapse_file.id,
+                                                                       download_path,
+                                                                       policy,
+                                                                       source_path))
+        self.metrics.increment('files_deduplicated')
+        self.metrics.increment('bytes_deduplicated', size)
+        self._journal_file(synapse_file, download_path)
+        self._sync_file(synapse_file, download_path)
+        return True
+
+    async def _fill_from_cache(self, synapse_file, download_path):
+        """Creates a file from the download cache.
+
+        Returns:
+            True if the file was created, False if it is not cached.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            policy = await loop.run_in_executor(None,
+                                                self.download_cache.fill,
+                                                synapse_file.file_handle_id,
+                                                synapse_file.content_md5,
+                                                synapse_file.content_size,
+                                                download_path)
+        except OSError as ex:
+            logging.warning('Failed to get: {0} from the download cache. Downloading. {1}'.format(download_path, ex))
+            return False
+        if policy is None:
+            return False
+
+        await self._set_local_md5(download_path, synapse_file.content_md5)
+        logging.info('File  : {0} ({1}) -> {2} ({3} from the download cache)'.format(synapse_file.synapse_path,
+                                                                                     synapse_file.id,
+                                                                                     download_path,
+                                                                                     policy))
+        self.metrics.increment('files_from_cache')
+        self.metrics.increment('bytes_from_cache', synapse_file.content_size)
+        self._journal_file(synapse_file, download_path)
+        self._sync_file(synapse_file, download_path)
+        return True
+
+    async def _add_to_cache(self, synapse_file, download_path):
+        """Adds a downloaded file to the download cache. Failures are logged and do not fail the download."""
+        loop = asyncio.get_running_loop()
+        try:
+            if await loop.run_in_executor(None,
+                                          self.download_cache.add,
+                                          synapse_file.file_handle_id,
+                                          synapse_file.content_md5,
+                                          download_path):
+                self.metrics.increment('files_cached')
+        except Exception as ex:
+            logging.warning('Failed to add: {0} to the download cache. {1}'.format(download_path, ex))
+
+    async def _download(self, synapse_file, download_path):
+        """Downloads a file and verifies its path and size.
+
+        Returns:
+            The MD5 computed while the file downloaded or None.
+        """
+        with self.metrics.timer('download_file'):
+            downloaded_path, downloaded_md5 = await self._transfer_file(synapse_file, download_path)
+
+        downloaded_real_path = Utils.real_path(downloaded_path)
+
+        if downloaded_real_path != download_path:
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            raise SynToolsError(
+                'Downloaded path: {0} does not match expected path: {1}. Downloaded file deleted.'.format(
+                    downloaded_real_path,
+                    download_path))
+
+        downloaded_size = os.path.getsize(download_path)
+        if downloaded_size != synapse_file.content_size:
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            raise FileSizeMismatchError(
+                'Downloaded size: {0} does not match expected size: {1}. Downloaded file deleted.'.format(
+                    downloaded_size,
+                    synapse_file.content_size))
+
+        if downloaded_md5:
+            # The MD5 was computed as the file downloaded so it does not need to be read again.
+            await self._set_local_md5(synapse_file.local.abs_path, downloaded_md5)
+            self.metrics.increment('files_verified')
+
+        logging.info('File  : {0} ({1}) -> {2} ({3})'.format(synapse_file.synapse_path,
+                                                             synapse_file.id,
+                                                             download_path,
+                                                             Utils.pretty_size(downloaded_size)))
+        self.metrics.increment('files_downloaded')
+        self.metrics.increment('bytes_downloaded', downloaded_size)
+        self._journal_file(synapse_file, download_path)
+        self._sync_file(synapse_file, download_path)
+        return downloaded_md5
+
+    def _downloading(self, synapse_file):
+        """Makes files with the same MD5 wait for a file to download so they can be created from it."""
+        if self.deduplicator:
+            return self.deduplicator.downloading(synapse_file.content_md5)
+        return contextlib.nullcontext()
+
+    async def _transfer_file(self, synapse_file, download_path):
+        """Downloads a file once the controller allows another transfer and records the result with it.
+
+        Returns:
+            Tuple of the downloaded path and the MD5 computed while downloading, or None if it was not computed.
+        """
+        async with self.controller.slot():
+            self.metrics.set_gauge('download_workers', self.controller.limit)
+            start = time.perf_counter()
+            try:
+                if Env.SYNTOOLS_SYN_GET_DOWNLOAD():
+                    downloaded_file = await Synapsis.Chain.get(synapse_file.id,
+                                                               downloadFile=True,
+                                                               downloadLocation=os.path.dirname(download_path),
+                                                               ifcollision='overwrite.local')
+                    downloaded_path, downloaded_md5 = downloaded_file.path, None
+                    self.metrics.increment('bytes_transferred', synapse_file.content_size or 0)
+                else:
+                    downloaded_path, downloaded_md5 = await self._download_file_handle(synapse_file, download_path)
+                    if downloaded_path is None or downloaded_path.strip() == '':
+                        raise SynToolsError('Unknown error.')
+            except Exception as ex:
+                self.controller.record(error=True, throttled=Utils.is_throttled(ex))
+                raise
+
+            content_size = synapse_file.content_size or 0
+            latency = time.perf_counter() - start
+            self.controller.record(size=content_size,
+                                   latency=latency if content_size <= self.controller.LATENCY_MAX_SIZE else None)
+            return downloaded_path, downloaded_md5
+
+    async def _download_file_handle(self, synapse_file, download_path):
+        """Downloads the file handle for a file.
 
-    REMOTE_ABS_BASE_PATH = {}
+        S3 files are hashed as they download and rejected as soon as the MD5 does not match.
+
+        Returns:
+            Tuple of the downloaded path and the MD5 computed while downloading, or None if it was not computed.
+        """
+        is_s3_file = synapse_file.file_handle_type == Synapsis.ConcreteTypes.S3_FILE_HANDLE.code
+        if is_s3_file and RangeDownloader.should_use(synapse_file.content_size):
+            # Download large files in multiple ranges at once.
+            try:
+                range_downloader = RangeDownloader(lambda: self._get_pre_signed_url(synapse_file),
+                                                   download_path,
+                                                   synapse_file.content_size,
+                                                   expected_md5=synapse_file.content_md5,
+                                                   progress=lambda size: self.metrics.increment('bytes_transferred',
+                                                                                                size),
+                                                   throttled=self.controller.throttled,
+                                                   session=self.http_session)
+                return await range_downloader.download(), range_downloader.md5
+            except Md5MismatchError:
+                raise
+            except Exception as ex:
+                logging.debug('Range download failed, retrying: {0} ({1}): {2}'.format(
+                    synapse_file.synapse_path, synapse_file.id, ex))
+
+        if is_s3_file and self.async_transfer and not RangeDownloader.should_use(synapse_file.content_size):
+            # Streams the file on the event loop instead of holding a thread for the whole download.
+            try:
+                return await self.async_transfer.download(lambda: self._get_pre_signed_url(synapse_file),
+                                                          download_path,
+                                                          content_size=synapse_file.content_size,
+                                                          expected_md5=synapse_file.content_md5,
+                                                          progress=lambda size: self.metrics.increment(
+                                                              'bytes_transferred', size))
+            except Md5MismatchError:
+                raise
+            except Exception as ex:
+                logging.debug('Async download failed, retrying: {0} ({1}): {2}'.format(
+                    synapse_file.synapse_path, synapse_file.id, ex))
+
+        if is_s3_file:
+            # Uses the pre-signed URL from the batch load when it has not expired to save a request per file.
+            # The download is hashed as it streams in and checked against the file handle's MD5.
+            try:
+                pre_signed_url = await self._get_pre_signed_url(synapse_file)
+                downloaded_path = await Synapsis.Chain.Synapse._download_from_URL(pre_signed_url,
+                                                                                  download_path,
+                                                                                  synapse_file.file_handle_id,
+                                                                                  expected_md5=synapse_file.content_md5)
+                self.metrics.increment('bytes_transferred', synapse_file.content_size or 0)
+                return downloaded_path, synapse_file.content_md5
+            except syn.core.exceptions.SynapseMd5MismatchError:
+                raise
+            except Exception as ex:
+                logging.debug('Pre-signed URL download failed, retrying: {0} ({1}): {2}'.format(
+                    synapse_file.synapse_path, synapse_file.id, ex))
+
+        downloaded_path = await Synapsis.Chain.Synapse._downloadFileHandle(synapse_file.file_handle_id,
+                                                                           synapse_file.id,
+                                                                           'FileEntity',
+                                                                           os.path.dirname(download_path),
+                                                                           retries=Env.SYNTOOLS_DOWNLOAD_RETRIES())
+        self.metrics.increment('bytes_transferred', synapse_file.content_size or 0)
+        return downloaded_path, None
+
+    async def _get_pre_signed_url(self, synapse_file):
+        if synapse_file.has_pre_signed_url:
+            url = synapse_file.pre_signed_url
+            synapse_file.pre_signed_url = None
+            return url
+
+        with self.metrics.timer('get_download_url'):
+            result = await Synapsis.Chain.Synapse._getFileHandleDownload(synapse_file.file_handle_id,
+                                                                         synapse_file.id,
+                                                                         objectType='FileEntity')
+        return result['preSignedURL']
+
+    async def _get_local_md5(self, synapse_item, stat=None):
+        local_path = synapse_item.local.abs_path
+        if stat is None:
+            stat = Md5Cache.stat(local_path)
+        if stat is None or not S_ISREG(stat.st_mode):
+            return None
+
+        if not self._rehash:
+            try:
+                local_md5 = await asyncio.get_running_loop().run_in_executor(None, self.md5_cache.get, local_path, stat)
+            except Exception as ex:
+                logging.warning('Failed to get the cached MD5 of: {0}. {1}'.format(local_path, ex))
+                local_md5 = None
+            if local_md5:
+                return local_md5
+
+        with self.metrics.timer('hash_file'):
+            local_md5 = await synapse_item.local.content_md5_async()
+        self.metrics.increment('files_hashed')
+        self.metrics.increment('bytes_hashed', stat.st_size)
+        await self._set_local_md5(local_path, local_md5, stat=stat)
+        return local_md5
+
+    async def _set_local_md5(self, local_path, md5, stat=None):
+        """Caches the MD5 of a local file in the Md5Cache, off the event loop since the cache is shared with
+        other processes. Failures are logged and do not fail the download.
+        """
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.md5_cache.set, local_path, md5, stat)
+        except Exception as ex:
+            logging.warning('Failed to cache the MD5 of: {0}. {1}'.format(local_path, ex))
 
     async def _remote_abs_base_path(self, parent_id):
-        if parent_id not in self.REMOTE_ABS_BASE_PATH:
-            if parent_id in self.comparables and self.comparables[parent_id]:
-                path = self.comparables[parent_id][0].synapse_root_path
-            else:
-                try:
-                    path = await Synapsis.Chain.Utils.get_synapse_path(parent_id)
-                except syn.core.exceptions.SynapseHTTPError as ex:
-                    if ex.response.status_code == 403:
-                        # Do not have access to the parent (probably the parent of a Project).
-                        path = ''
+        """Gets the Synapse path of a container from the paths visited in this run or from Synapse."""
+        return await self.remote_paths.get(parent_id, self._load_remote_abs_base_path)
 
-            self.REMOTE_ABS_BASE_PATH[parent_id] = path
+    async def _load_remote_abs_base_path(self, parent_id):
+        parent = self.comparables.get(parent_id)
+        if parent and not parent.is_file:
+            return parent.synapse_path
+        try:
+            self.metrics.increment('remote_path_lookups')
+            return await Synapsis.Chain.Utils.get_synapse_path(parent_id)
+        except syn.core.exceptions.SynapseHTTPError as ex:
+            if ex.response is not None and ex.response.status_code == 403:
+                # Do not have access to the parent (probably the parent of a Project).
+                return ''
+            raise
 
-        return self.REMOTE_ABS_BASE_PATH[parent_id]
+    def _visited(self, synapse_item):
+        """Caches the Synapse path of a container that is being listed."""
+        if not synapse_item.is_file:
+            self.remote_paths.set(synapse_item.id, synapse_item.synapse_path)
 
     def _add_comparable(self, synapse_item):
-        if synapse_item not in self.comparables:
-            self.comparables.append(synapse_item)
+        self.comparables.add(synapse_item)
         return synapse_item
 
     async def _compare_path(self, this_comparable):
         if self._abort:
             return
         try:
-            local_items = []
             if this_comparable.is_file:
-                local_dir = this_comparable.local.dirname
-                if os.path.exists(local_dir):
-                    local_items = list(os.scandir(local_dir))
-                    local_items = Synapsis.utils.select(local_items, key='path', value=this_comparable.local.abs_path)
+                local_items = await self._scan_local_dir(this_comparable.local.dirname)
+                local_items = Synapsis.utils.select(local_items, key='path', value=this_comparable.local.abs_path)
                 comparables = [this_comparable]
             else:
-                local_dir = this_comparable.local.abs_path
-                if os.path.exists(local_dir):
-                    local_items = list(os.scandir(local_dir))
-                comparables = Synapsis.utils.select(self.comparables,
-                                                    lambda c: c.local.dirname == this_comparable.local.abs_path)
+                local_items = await self._scan_local_dir(this_comparable.local.abs_path)
+                comparables = self.comparables.select_by_local_dirname(this_comparable.local.abs_path)
 
             # Add missing locals.
             for local in local_items:
                 if self._abort:
                     return
-                local_comparable = Synapsis.utils.find(self.comparables, lambda c: c.local.abs_path == local.path)
+                local_comparable = self.comparables.find_by_local_path(local.path)
                 if not local_comparable:
-                    remote_abs_base_path = await self._remote_abs_base_path(this_comparable.parent_id)
+                    remote_abs_base_path = await self._remote_abs_base_path(this_comparable.id)
                     entity_type = Synapsis.ConcreteTypes.FOLDER_ENTITY if local.is_dir() else Synapsis.ConcreteTypes.FILE_ENTITY
                     local_comparable = SynapseItem(entity_type,
                                                    name=local.name,
-                                                   parent_id=this_comparable.parent_id,
+                                                   parent_id=this_comparable.id,
                                                    synapse_root_path=remote_abs_base_path,
                                                    local_root_path=this_comparable.local.abs_path)
                     comparables.append(local_comparable)
 
             comparables.sort(key=lambda c: c.synapse_path)
+            await self._compare_items(comparables)
+        except Exception as ex:
+            self._compare_failed(this_comparable, ex)
+
+    async def _stream_compare_path(self, this_comparable):
+        """Compares a folder by merging its Synapse children with its local entries, both sorted by local name.
 
-            # Remove any ignored files
-            if self._excludes:
-                for c in comparables:
-                    if self.can_skip(c):
-                        comparables.remove(c)
-                        if c.local.exists:
-                            logging.info('[SKIPPING] {0}'.format(c.local.abs_path))
-                        if c.exists:
-                            logging.info('[SKIPPING] {0}'.format(c.synapse_path))
-
-            # Compare
-            for c in comparables:
+        Only the children of the folder are held in memory. Subfolders that exist in both places are sent to
+        the compare stage.
+        """
+        if self._abort:
+            return
+        if this_comparable.is_file:
+            await self._compare_path(this_comparable)
+            return
+        try:
+            self._visited(this_comparable)
+            local_dir = this_comparable.local.abs_path
+            # Scans the local directory while Synapse is listed.
+            self.local_scanner.prefetch(local_dir)
+            remote_items = []
+            # Local names of the files that failed to load. They are not compared.
+            failed_names = set()
+            async for page in self._get_children_pages(this_comparable.id):
                 if self._abort:
                     return
-                if c.is_folder:
-                    if c.local.exists and not c.exists:
-                        self._log_error(
-                            '[-] {0} <- {1} [FOLDER NOT FOUND ON SYNAPSE]'.format(c.synapse_path, c.local.abs_path))
-                    elif c.exists and not c.local.exists:
-                        self._log_error(
-                            '[-] {0} -> {1} [FOLDER NOT FOUND LOCALLY]'.format(c.synapse_path, c.local.abs_path))
-                    else:
-                        logging.info('[+] {0} <-> {1}'.format(c.synapse_path, c.local.abs_path))
-                        await self.queue.put(c)
+                children = [SynapseItem(Synapsis.ConcreteTypes.get(child),
+                                        id=child.get('id'),
+                                        parent_id=this_comparable.id,
+                                        name=child.get('name'),
+                                        synapse_root_path=this_comparable.synapse_path,
+                                        local_root_path=this_comparable.local.abs_path,
+                                        version_number=child.get('versionNumber'))
+                            for child in page]
+                files = [c for c in children if c.is_file]
+                if files:
+                    try:
+                        with self.metrics.timer('load_batch'):
+                            await SynapseItem.load_batch(files)
+                    except Exception as ex:
+                        # Each item will be loaded individually.
+                        logging.debug('Failed to batch load file handles: {0}'.format(ex))
+                    for file in files:
+                        try:
+                            await file.load()
+                        except Exception as ex:
+                            self.metrics.increment('compare_failures')
+                            self._log_error('Failed to load: {0} ({1})'.format(file.synapse_path, file.id), error=ex)
+                            children.remove(file)
+                            failed_names.add(file.local.name)
+                remote_items.extend(children)
+            self.metrics.increment('folders_listed')
+            remote_items.sort(key=lambda c: c.local.name)
+
+            local_items = await self._scan_local_dir(local_dir)
+
+            comparables = []
+            remote_index = 0
+            local_index = 0
+            while remote_index < len(remote_items) or local_index < len(local_items):
+                if self._abort:
+                    return
+                remote = remote_items[remote_index] if remote_index < len(remote_items) else None
+                local = local_items[local_index] if local_index < len(local_items) else None
+                if local is None or (remote is not None and remote.local.name <= local.name):
+                    if local is not None and remote.local.name == local.name:
+                        local_index += 1
+                    remote_index += 1
+                    comparables.append(remote)
                 else:
-                    if c.local.exists and not c.exists:
-                        self._log_error(
-                            '[-] {0} <- {1} [FILE NOT FOUND ON SYNAPSE]'.format(c.synapse_path, c.local.abs_path))
-                    elif c.exists and not c.local.exists:
-                        self._log_error(
-                            '[-] {0} -> {1} [FILE NOT FOUND LOCALLY]'.format(c.synapse_path, c.local.abs_path))
+                    local_index += 1
+                    if local.name in failed_names:
+                        continue
+                    entity_type = Synapsis.ConcreteTypes.FOLDER_ENTITY if local.is_dir() else Synapsis.ConcreteTypes.FILE_ENTITY
+                    comparables.append(SynapseItem(entity_type,
+                                                   name=local.name,
+                                                   parent_id=this_comparable.id,
+                                                   synapse_root_path=this_comparable.synapse_path,
+                                                   local_root_path=local_dir))
+            await self._compare_items(comparables)
+        except Exception as ex:
+            self._compare_failed(this_comparable, ex)
+
+    async def _scan_local_dir(self, local_dir):
+        """Lists a local directory in the LocalScanner so slow file systems do not block the event loop.
+
+        Returns:
+            List of os.DirEntry sorted by name. Empty if the directory does not exist.
+        """
+        with self.metrics.timer('scan_dir'):
+            local_items = await self.local_scanner.scandir(local_dir)
+        self.metrics.increment('local_dirs_scanned')
+        return local_items
+
+    async def _compare_items(self, comparables):
+        """Compares the items in a folder, skipping the excluded items. The local paths are stat'd at once in
+        the LocalScanner.
+        """
+        local_stats = await asyncio.gather(*[self.local_scanner.stat(c.local.abs_path) for c in comparables])
+        for c, local_stat in zip(comparables, local_stats):
+            if self._abort:
+                return
+            if self._matcher and self.can_skip(c):
+                if local_stat is not None:
+                    logging.info('[SKIPPING] {0}'.format(c.local.abs_path))
+                if c.exists:
+                    logging.info('[SKIPPING] {0}'.format(c.synapse_path))
+                continue
+            await self._compare_item(c, local_stat)
+
+    async def _compare_item(self, c, local_stat):
+        """Compares a Synapse item to its local path and sends matching folders to the compare stage.
+
+        Args:
+            c: The SynapseItem.
+            local_stat: The os.stat_result of the local path or None if it does not exist.
+        """
+        local_exists = local_stat is not None
+        if c.is_folder:
+            if local_exists and not c.exists:
+                self._compare_result(CompareReport.MISSING_REMOTE, c)
+                self._log_error(
+                    '[-] {0} <- {1} [FOLDER NOT FOUND ON SYNAPSE]'.format(c.synapse_path, c.local.abs_path))
+            elif c.exists and not local_exists:
+                self._compare_result(CompareReport.MISSING_LOCAL, c)
+                self._log_error(
+                    '[-] {0} -> {1} [FOLDER NOT FOUND LOCALLY]'.format(c.synapse_path, c.local.abs_path))
+            else:
+                self._compare_result(CompareReport.MATCH, c)
+                logging.info('[+] {0} <-> {1}'.format(c.synapse_path, c.local.abs_path))
+                self.local_scanner.prefetch(c.local.abs_path)
+                await self.compare_stage.put(c)
+        else:
+            if local_exists and not c.exists:
+                self._compare_result(CompareReport.MISSING_REMOTE, c)
+                self._log_error(
+                    '[-] {0} <- {1} [FILE NOT FOUND ON SYNAPSE]'.format(c.synapse_path, c.local.abs_path))
+            elif c.exists and not local_exists:
+                self._compare_result(CompareReport.MISSING_LOCAL, c)
+                self._log_error(
+                    '[-] {0} -> {1} [FILE NOT FOUND LOCALLY]'.format(c.synapse_path, c.local.abs_path))
+            else:
+                if c.content_size is None:
+                    self._compare_result(CompareReport.UNKNOWN, c)
+                    logging.info('[+] {0} <-> {1} [SYNAPSE FILE SIZE/MD5 UNKNOWN]'.format(
+                        c.synapse_path,
+                        c.local.abs_path))
+                else:
+                    local_size = local_stat.st_size
+                    if local_size != c.content_size:
+                        self._compare_result(CompareReport.SIZE_MISMATCH, c, local_size=local_size)
+                        self._log_error('[-] {0} {1} <- {2} {3} [FILE SIZE MISMATCH]'.format(
+                            c.synapse_path,
+                            Utils.pretty_size(c.content_size),
+                            c.local.abs_path,
+                            Utils.pretty_size(local_size)))
                     else:
-                        if c.content_size is None:
-                            logging.info('[+] {0} <-> {1} [SYNAPSE FILE SIZE/MD5 UNKNOWN]'.format(
+                        local_md5 = await self._get_local_md5(c, stat=local_stat)
+                        if local_md5 != c.content_md5:
+                            self._compare_result(CompareReport.MD5_MISMATCH, c, local_size=local_size,
+                                                 local_md5=local_md5)
+                            self._log_error('[-] {0} {1} <- {2} {3} [FILE MD5 MISMATCH]'.format(
                                 c.synapse_path,
-                                c.local.abs_path))
+                                c.content_md5,
+                                c.local.abs_path,
+                                local_md5
+                            ))
                         else:
-                            local_size = c.local.content_size
-                            if local_size != c.content_size:
-                                self._log_error('[-] {0} {1} <- {2} {3} [FILE SIZE MISMATCH]'.format(
-                                    c.synapse_path,
-                                    Utils.pretty_size(c.content_size),
-                                    c.local.abs_path,
-                                    Utils.pretty_size(local_size)))
-                            else:
-                                local_md5 = await c.local.content_md5_async()
-                                if local_md5 != c.content_md5:
-                                    self._log_error('[-] {0} {1} <- {2} {3} [FILE MD5 MISMATCH]'.format(
-                                        c.synapse_path,
-                                        c.content_md5,
-                                        c.local.abs_path,
-                                        local_md5
-                                    ))
-                                else:
-                                    logging.info('[+] {0} <-> {1}'.format(c.synapse_path, c.local.abs_path))
+                            self._compare_result(CompareReport.MATCH, c)
+                            logging.info('[+] {0} <-> {1}'.format(c.synapse_path, c.local.abs_path))
+
+    def _compare_result(self, result, synapse_item, **kwargs):
+        if self.report:
+            self.report.add(result, synapse_item, **kwargs)
+
+    def _compare_failed(self, this_comparable, error):
+        self.metrics.increment('compare_failures')
+        self._log_error(
+            'Failed to Compare: {0} -> {1}'.format(this_comparable.synapse_path, this_comparable.local.abs_path),
+            error=error)
+
+    def _close_report(self):
+        """Saves the compare report and its summary."""
+        try:
+            complete = self._compare_complete and not self.metrics.counters['compare_failures']
+            summary = self.report.close(complete=complete)
+            logging.info('Compare report saved to: {0} ({1} compared, {2} differences{3})'.format(
+                self.report.path,
+                summary['compared'],
+                summary['differences'],
+                '' if complete else ', incomplete'))
         except Exception as ex:
-            self._log_error(
-                'Failed to Compare: {0} -> {1}'.format(this_comparable.synapse_path, this_comparable.local.abs_path),
-                error=ex)
+            logging.warning('Failed to save the compare report: {0}'.format(ex))
+        self.report = None
@@ -13,9 +13,23 @@ def create(subparsers, parents):
                         metavar='local-path',
                         help='The local path to save the files to.')
 
+    parser.add_argument('-sf', '--stats-file',
+                        metavar='STATS-PATH',
+                        help='Save progress and latency stats to a JSON file every 30 seconds and at the end.',
+                        default=None)
+
+    parser.add_argument('-mp', '--metrics-port',
+                        metavar='PORT',
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics.',
+                        type=int,
+                        default=None)
+
     parser.set_defaults(_new_command=new_command)
     return parser
 
 
 def new_command(args):
-    return SyncFromSynapse(args.entity_id, args.local_path)
+    return SyncFromSynapse(args.entity_id,
+                           args.local_path,
+                           stats_file=args.stats_file,
+                           metrics_port=args.metrics_port)
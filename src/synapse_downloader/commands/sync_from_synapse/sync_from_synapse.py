@@ -1,43 +1,242 @@
+import os
+import time
+import inspect
 import logging
+import asyncio
 from datetime import datetime
-from synapse_downloader.core import Utils
+from concurrent.futures import ThreadPoolExecutor
+import synapseutils
+from synapse_downloader.core import Utils, Metrics, MetricsServer, Env, SynToolsError
 from synapsis import Synapsis
 
+try:
+    # Not part of the synapseutils API. Only used when it matches the version this was written against.
+    from synapseutils.sync import _SyncDownloader
+except ImportError:
+    _SyncDownloader = None
+
 
 class SyncFromSynapse:
-    def __init__(self, starting_entity_id, download_path):
+    """Downloads with synapseutils' syncFromSynapse.
+
+    The sync runs in a thread so the event loop stays free to log progress, serve metrics and handle aborts.
+    Each file is logged and counted as soon as it finishes. A file that fails is reported and the sync carries on
+    with the other files.
+
+    Reporting each file relies on synapseutils' private sync downloader. If the installed synapseclient does not
+    have a compatible one, the public syncFromSynapse is used instead: the files are reported when the sync
+    finishes, the first failed file stops the sync and an abort only takes effect once the sync finishes.
+    """
+    # Seconds between logging the progress.
+    STATS_INTERVAL = 30
+
+    def __init__(self, starting_entity_id, download_path, stats_file=None, metrics_port=None):
         self._starting_entity_id = starting_entity_id
         self._download_path = Utils.expand_path(download_path)
+        self._stats_file = Utils.expand_path(stats_file) if stats_file else None
+        self._metrics_port = metrics_port
         self.start_time = None
         self.end_time = None
+        self.metrics = Metrics()
+        self._metrics_server = None
         self.errors = []
+        self._abort = False
 
     def abort(self):
+        if self._abort:
+            return
+        self._abort = True
         self._log_error('User Aborted.')
 
     async def execute(self):
         self.start_time = datetime.now()
+        self.end_time = None
         self.errors = []
+        self._abort = False
+        self.metrics = Metrics()
+        stats_task = None
+        try:
+            if self._metrics_port is not None:
+                self._metrics_server = MetricsServer(self.metrics, self._metrics_port).start()
 
-        start_entity = await Synapsis.Chain.get(self._starting_entity_id, downloadFile=False)
-        logging.info('Syncing: {0} ({1}) to {2}'.format(start_entity.name, start_entity.id, self._download_path))
+            start_entity = await Synapsis.Chain.get(self._starting_entity_id, downloadFile=False)
+            logging.info('Syncing: {0} ({1}) to {2}'.format(start_entity.name, start_entity.id, self._download_path))
 
-        downloaded = Synapsis.SynapseUtils.syncFromSynapse(self._starting_entity_id,
-                                                           path=self._download_path,
-                                                           downloadFile=True)
-        for entity in downloaded:
-            label = Synapsis.ConcreteTypes.get(entity).name
-            logging.info('{0}: {1} -> {2}'.format(label, entity.properties['name'], entity.path))
+            stats_task = asyncio.create_task(self._log_stats_periodically())
+            loop = asyncio.get_running_loop()
+            sync = loop.run_in_executor(None, self._sync, loop)
+            try:
+                await asyncio.shield(sync)
+            except asyncio.CancelledError:
+                # Stop starting files and let the running files finish so the loop can close.
+                self.abort()
+                await sync
+                raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            if not self._abort:
+                self._log_error('Execute Error', error=ex)
+        finally:
+            if stats_task:
+                stats_task.cancel()
+            self._report_metrics()
+            if self._metrics_server:
+                self._metrics_server.stop()
+                self._metrics_server = None
 
         self.end_time = datetime.now()
         logging.info('')
         logging.info('Run time: {0}'.format(self.end_time - (self.start_time or datetime.now())))
         return self
 
-    def _log_error(self, msg):
+    def _sync(self, loop):
+        """Runs the sync. Runs in the executor and sends the result of each file to the loop."""
+        if not _StreamingSyncDownloader.is_supported():
+            self._sync_with_public_api(loop)
+            return
+        workers = Env.SYNTOOLS_DOWNLOAD_WORKERS()
+        # synapseutils downloads the parts of large files in the same executor as the files.
+        with ThreadPoolExecutor(max_workers=max(2, workers + Env.SYNTOOLS_DOWNLOAD_CHUNK_WORKERS()),
+                                thread_name_prefix='syntools-sync') as executor:
+            downloader = _StreamingSyncDownloader(
+                Synapsis.Synapse,
+                executor,
+                workers,
+                started=lambda: loop.call_soon_threadsafe(self.metrics.increment, 'files_queued'),
+                finished=lambda *args: loop.call_soon_threadsafe(self._file_finished, *args),
+                is_aborted=lambda: self._abort)
+            if not hasattr(downloader, '_file_semaphore'):
+                self._sync_with_public_api(loop)
+                return
+            downloader.sync(self._starting_entity_id,
+                            self._download_path,
+                            ifcollision='overwrite.local',
+                            followLink=False,
+                            downloadFile=True,
+                            manifest='all')
+
+    def _sync_with_public_api(self, loop):
+        """Runs the sync with syncFromSynapse. Runs in the executor and sends the files to the loop at the end."""
+        logging.warning('The installed synapseclient does not support reporting each file as it finishes. '
+                        'Files will be reported when the sync finishes.')
+        start = time.perf_counter()
+        files = synapseutils.syncFromSynapse(Synapsis.Synapse,
+                                             self._starting_entity_id,
+                                             path=self._download_path,
+                                             ifcollision='overwrite.local',
+                                             followLink=False,
+                                             manifest='all',
+                                             downloadFile=True)
+        seconds = (time.perf_counter() - start) / max(1, len(files))
+        for entity in files:
+            loop.call_soon_threadsafe(self.metrics.increment, 'files_queued')
+            loop.call_soon_threadsafe(self._file_finished, entity.id, [entity], None, seconds)
+
+    def _file_finished(self, entity_id, entities, error, seconds):
+        self.metrics.increment('files_completed')
+        self.metrics.observe('download_file', seconds)
+        if error:
+            self.metrics.increment('files_failed')
+            self._log_error('Error syncing: {0}'.format(entity_id), error=error)
+            return
+
+        for entity in entities:
+            label = Synapsis.ConcreteTypes.get(entity).name
+            logging.info('{0}: {1} -> {2}'.format(label, entity.properties['name'], entity.path))
+            size = os.path.getsize(entity.path) if entity.path and os.path.isfile(entity.path) else 0
+            self.metrics.increment('files_downloaded')
+            self.metrics.increment('bytes_downloaded', size)
+            self.metrics.increment('bytes_transferred', size)
+
+    async def _log_stats_periodically(self):
+        while True:
+            await asyncio.sleep(self.STATS_INTERVAL)
+            self._report_metrics()
+
+    def _report_metrics(self):
+        """Logs the progress and saves the stats file."""
+        try:
+            snapshot = self.metrics.snapshot()
+            logging.info(self.metrics.summary(snapshot))
+            if self._stats_file:
+                self.metrics.save(self._stats_file, snapshot=snapshot)
+        except Exception as ex:
+            logging.warning('Failed to save stats: {0}'.format(ex))
+
+    def _log_error(self, msg, error=None):
         if isinstance(msg, Exception):
             self.errors.append(str(msg))
             logging.exception(msg)
+        elif error:
+            log_msg = '. '.join(filter(None, [msg, str(error)]))
+            self.errors.append(log_msg)
+            logging.error(log_msg)
         else:
             self.errors.append(msg)
             logging.error(msg)
+
+
+class _StreamingSyncDownloader(_SyncDownloader or object):
+    """synapseutils' sync downloader with a limit on concurrent files that reports each file as it finishes.
+
+    A failed file is reported and marked as finished instead of stopping the sync, and no more files are started
+    once the sync is aborted.
+    """
+    # Arguments of _SyncDownloader._sync_file this overrides.
+    SYNC_FILE_ARGS = ['self', 'entity_id', 'parent_folder_sync', 'path', 'ifcollision', 'followLink', 'progress',
+                      'downloadFile']
+
+    @classmethod
+    def is_supported(cls):
+        """Gets if the installed synapseutils has the private sync downloader this was written against."""
+        if _SyncDownloader is None:
+            return False
+        try:
+            init_args = inspect.signature(_SyncDownloader.__init__).parameters
+            sync_file_args = list(inspect.signature(_SyncDownloader._sync_file).parameters)
+        except (AttributeError, TypeError, ValueError):
+            return False
+        return 'max_concurrent_file_downloads' in init_args and sync_file_args == cls.SYNC_FILE_ARGS
+
+    def __init__(self, syn, executor, max_concurrent_file_downloads, started, finished, is_aborted):
+        super().__init__(syn, executor, max_concurrent_file_downloads=max_concurrent_file_downloads)
+        self._started = started
+        self._finished = finished
+        self._is_aborted = is_aborted
+
+    def _sync_file(self, entity_id, parent_folder_sync, *args):
+        if self._is_aborted():
+            self._file_semaphore.release()
+            # Stops the listing and finishes the folders.
+            parent_folder_sync.set_exception(SynToolsError('User Aborted.'))
+            return
+        self._started()
+        super()._sync_file(entity_id, _ReportingFolderSync(parent_folder_sync, entity_id, self._finished), *args)
+
+
+class _ReportingFolderSync:
+    """Wraps the folder sync of a file to report the file when it finishes."""
+
+    def __init__(self, folder_sync, entity_id, finished):
+        self._folder_sync = folder_sync
+        self._entity_id = entity_id
+        self._finished = finished
+        self._start = time.perf_counter()
+        self._reported = False
+
+    def update(self, finished_id=None, files=None, provenance=None):
+        self._report(files or [], None)
+        self._folder_sync.update(finished_id=finished_id, files=files, provenance=provenance)
+
+    def set_exception(self, exception):
+        if self._reported:
+            # The file finished but updating its folder failed.
+            self._folder_sync.set_exception(exception)
+            return
+        self._report([], exception)
+        self._folder_sync.update(finished_id=self._entity_id)
+
+    def _report(self, entities, error):
+        self._reported = True
+        self._finished(self._entity_id, entities, error, time.perf_counter() - self._start)
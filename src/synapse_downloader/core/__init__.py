@@ -1,4 +1,25 @@
 from .env import Env
 from .utils import Utils
 from .synapse_item import SynapseItem
+from .comparables import Comparables
+from .local_scanner import LocalScanner
+from .compare_report import CompareReport
+from .remote_path_cache import RemotePathCache
+from .sqlite_store import SqliteStore
+from .md5_cache import Md5Cache
+from .deduplicator import Deduplicator
+from .download_cache import DownloadCache
+from .run_journal import RunJournal
+from .sync_state import SyncState
+from .range_downloader import RangeDownloader
+from .pipeline_stage import PipelineStage
+from .transfer_scheduler import TransferScheduler
+from .download_plan import DownloadPlan
+from .metrics import Metrics
+from .metrics_server import MetricsServer
+from .concurrency_controller import ConcurrencyController
+from .hash_service import HashService
+from .exclude_matcher import ExcludeMatcher
+from .connection_pool import ConnectionPool
+from .async_transfer import AsyncTransfer
 from .exceptions import SynToolsError, FileSizeMismatchError, Md5MismatchError
@@ -0,0 +1,209 @@
+import os
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from .env import Env
+from .utils import Utils
+from .exceptions import SynToolsError, FileSizeMismatchError, Md5MismatchError
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncTransfer:
+    """Downloads files from pre-signed URLs on the event loop with aiohttp.
+
+    Each body is streamed to a temporary file in reads of at most read_size bytes. The reads are written and hashed
+    by a small pool of writer threads shared by all the downloads, so file I/O does not block the event loop. Each
+    download has at most one write pending while it reads the next chunk, so it holds at most two buffers and no
+    thread. Thousands of small files can download at once from a handful of threads. Connections are kept alive
+    and shared by all the downloads.
+
+    The temporary file is moved to the download path once the size and MD5 are verified.
+    """
+    # Largest read from a response.
+    READ_SIZE = 256 * 1024
+    # Seconds to wait to connect or for the server to send data.
+    TIMEOUT = 60
+    # Seconds to keep an idle connection open.
+    KEEP_ALIVE_TIMEOUT = 60
+    # Suffix of the temporary file.
+    PARTIAL_SUFFIX = '.syntools.part'
+    # Threads that write and hash the downloaded files.
+    WRITER_THREADS = 4
+
+    def __init__(self, connections=None, read_size=None, retries=None, throttled=None):
+        """
+        Args:
+            connections: Max number of open connections. Defaults to Env.SYNTOOLS_DOWNLOAD_WORKERS.
+            read_size: Largest read from a response.
+            retries: Number of times to retry each file. Defaults to Env.SYNTOOLS_DOWNLOAD_RETRIES.
+            throttled: Function called when the server throttles a request.
+        """
+        if aiohttp is None:
+            raise SynToolsError('aiohttp is required to download with SYNTOOLS_ASYNC_DOWNLOAD. '
+                                'Install it with: pip install synapse-downloader[async]')
+        self.connections = max(1, connections or Env.SYNTOOLS_DOWNLOAD_WORKERS())
+        self.read_size = read_size or self.READ_SIZE
+        self.retries = Env.SYNTOOLS_DOWNLOAD_RETRIES() if retries is None else retries
+        self.throttled = throttled
+        self._session = None
+        self._writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=self.KEEP_ALIVE_TIMEOUT),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.TIMEOUT, sock_read=self.TIMEOUT),
+                # The MD5 is of the bytes as stored.
+                auto_decompress=False)
+        return self._session
+
+    @property
+    def writer(self):
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=self.WRITER_THREADS,
+                                              thread_name_prefix='async-transfer-write')
+        return self._writer
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._writer is not None:
+            self._writer.shutdown(wait=False)
+            self._writer = None
+
+    async def download(self, get_url, download_path, content_size=None, expected_md5=None, progress=None):
+        """Downloads a file.
+
+        Args:
+            get_url: Coroutine function that returns a pre-signed URL for the file. Called again for each retry.
+            download_path: Path to save the file to.
+            content_size: The size of the file. Not verified if not set.
+            expected_md5: The MD5 of the file. Not verified if not set.
+            progress: Function called with the number of bytes in each read.
+
+        Returns:
+            Tuple of the download path and the MD5 of the file.
+        """
+        Utils.ensure_dirs(os.path.dirname(download_path))
+        partial_path = download_path + self.PARTIAL_SUFFIX
+        try:
+            md5, size = await self._fetch_with_retries(get_url, partial_path, progress)
+            if content_size is not None and size != content_size:
+                raise FileSizeMismatchError(
+                    'Downloaded size: {0} does not match expected size: {1}.'.format(size, content_size))
+            if expected_md5 and md5 != expected_md5:
+                raise Md5MismatchError(
+                    'Downloaded MD5: {0} does not match expected MD5: {1}.'.format(md5, expected_md5))
+            os.replace(partial_path, download_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return download_path, md5
+
+    async def _fetch_with_retries(self, get_url, partial_path, progress):
+        attempt = 0
+        while True:
+            url = await get_url()
+            try:
+                return await self._fetch(url, partial_path, progress)
+            except (_UrlExpiredError, _ThrottledError, _IncompleteBodyError, aiohttp.ClientError,
+                    asyncio.TimeoutError) as ex:
+                if not self._is_retryable(ex):
+                    raise SynToolsError('Failed to download: {0}'.format(ex)) from ex
+                error = ex
+
+            if isinstance(error, _ThrottledError) and self.throttled:
+                self.throttled()
+
+            attempt += 1
+            if attempt > self.retries:
+                raise SynToolsError('Failed to download: {0}'.format(error)) from error
+            if not isinstance(error, _UrlExpiredError):
+                await asyncio.sleep(min(2 ** (attempt - 1), 30))
+
+    @staticmethod
+    def _is_retryable(error):
+        """Gets if a request error is temporary: an expired URL, throttling, a connection error, a timeout or a 5xx
+        response. Other 4xx responses (e.g. 404) fail right away.
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500
+        return isinstance(error, (_UrlExpiredError, _ThrottledError, _IncompleteBodyError,
+                                  aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    async def _fetch(self, url, partial_path, progress):
+        """Streams a URL to a file.
+
+        Returns:
+            Tuple of the MD5 and the number of bytes read.
+        """
+        loop = asyncio.get_running_loop()
+        md5 = hashlib.md5()
+        size = 0
+        async with self.session.get(url) as response:
+            if response.status == 403:
+                raise _UrlExpiredError()
+            if response.status in Utils.THROTTLE_STATUS_CODES:
+                raise _ThrottledError(response)
+            response.raise_for_status()
+
+            f = await loop.run_in_executor(self.writer, open, partial_path, 'wb')
+            writing = None
+            try:
+                async for chunk in response.content.iter_chunked(self.read_size):
+                    # The next chunk is read while the last one is written.
+                    if writing is not None:
+                        await writing
+                    writing = loop.run_in_executor(self.writer, self._write, f, md5, chunk)
+                    size += len(chunk)
+                    if progress:
+                        progress(len(chunk))
+                if writing is not None:
+                    await writing
+                    writing = None
+            finally:
+                if writing is not None:
+                    # Wait for the pending write before the file is closed.
+                    await asyncio.wait([writing])
+                    if not writing.cancelled():
+                        writing.exception()
+                await loop.run_in_executor(self.writer, f.close)
+
+            if response.content_length is not None and size != response.content_length:
+                raise _IncompleteBodyError()
+        return md5.hexdigest(), size
+
+    @staticmethod
+    def _write(f, md5, chunk):
+        """Writes and hashes a chunk. Runs in the writer threads."""
+        f.write(chunk)
+        md5.update(chunk)
+
+
+class _UrlExpiredError(SynToolsError):
+    """The pre-signed URL has expired."""
+
+
+class _ThrottledError(SynToolsError):
+    """The server is throttling requests."""
+
+    def __init__(self, response):
+        super().__init__('HTTP {0}'.format(response.status))
+        self.response = response
+
+
+class _IncompleteBodyError(SynToolsError, IOError):
+    """The server sent less than the Content-Length."""
@@ -0,0 +1,69 @@
+class Comparables:
+    """Index of SynapseItems used by the compare process.
+
+    Items are indexed by Synapse ID, local absolute path and local parent directory so lookups
+    do not need to scan every item.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._by_id = {}
+        self._by_local_path = {}
+        self._by_local_dirname = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, synapse_item):
+        return self._find_existing(synapse_item) is not None
+
+    def add(self, synapse_item):
+        """Adds a SynapseItem to the index.
+
+        Args:
+            synapse_item: The SynapseItem to add.
+
+        Returns:
+            True if the item was added, False if it was already in the index.
+        """
+        if self._find_existing(synapse_item) is not None:
+            return False
+
+        self._items.append(synapse_item)
+        if synapse_item.id is not None:
+            self._by_id[synapse_item.id] = synapse_item
+        local_path = synapse_item.local.abs_path
+        self._by_local_path[local_path] = synapse_item
+        self._by_local_dirname.setdefault(synapse_item.local.dirname, []).append(synapse_item)
+        return True
+
+    def get(self, synapse_id, default=None):
+        """Gets the item with a Synapse ID."""
+        return self._by_id.get(synapse_id, default)
+
+    def find_by_local_path(self, local_path, default=None):
+        """Gets the item with a local absolute path."""
+        return self._by_local_path.get(local_path, default)
+
+    def select_by_local_dirname(self, local_dirname):
+        """Gets a new list of the items whose local parent directory is local_dirname."""
+        return list(self._by_local_dirname.get(local_dirname, []))
+
+    def clear(self):
+        self._items.clear()
+        self._by_id.clear()
+        self._by_local_path.clear()
+        self._by_local_dirname.clear()
+
+    def _find_existing(self, synapse_item):
+        if synapse_item.id is not None and synapse_item.id in self._by_id:
+            return self._by_id[synapse_item.id]
+
+        existing = self._by_local_path.get(synapse_item.local.abs_path)
+        if existing is synapse_item:
+            return existing
+
+        return None
@@ -0,0 +1,146 @@
+import os
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+from .utils import Utils
+
+
+class CompareReport:
+    """Machine-readable results of a compare.
+
+    Each difference is written to the report as it is found, as JSON lines or CSV (chosen by the extension of the
+    path). The counts of every result, including the items that match, are saved to a JSON summary next to the
+    report when it is closed.
+
+    Results:
+        match: The item exists in both places and the files have the same size and MD5.
+        unknown: The file exists in both places but its size and MD5 are unknown in Synapse (external files).
+        missing-local: The item is in Synapse but not in the local path.
+        missing-remote: The item is in the local path but not in Synapse.
+        size-mismatch: The files have different sizes.
+        md5-mismatch: The files have the same size and different MD5s.
+    """
+    VERSION = 1
+    JSONL = 'jsonl'
+    CSV = 'csv'
+    FORMATS = [JSONL, CSV]
+    MATCH = 'match'
+    UNKNOWN = 'unknown'
+    MISSING_LOCAL = 'missing-local'
+    MISSING_REMOTE = 'missing-remote'
+    SIZE_MISMATCH = 'size-mismatch'
+    MD5_MISMATCH = 'md5-mismatch'
+    RESULTS = [MATCH, UNKNOWN, MISSING_LOCAL, MISSING_REMOTE, SIZE_MISMATCH, MD5_MISMATCH]
+    DIFFERENCES = [MISSING_LOCAL, MISSING_REMOTE, SIZE_MISMATCH, MD5_MISMATCH]
+    FIELDS = ['result', 'type', 'id', 'synapse_path', 'local_path',
+              'synapse_size', 'local_size', 'synapse_md5', 'local_md5']
+
+    def __init__(self, path, entity_id=None, local_path=None):
+        """
+        Args:
+            path: Path to save the report to. CSV if it ends with .csv, otherwise JSON lines.
+            entity_id: The Synapse entity that is compared.
+            local_path: The local path that is compared.
+        """
+        self.path = Utils.expand_path(path)
+        self.format = self.CSV if self.path.lower().endswith('.csv') else self.JSONL
+        self.summary_path = os.path.splitext(self.path)[0] + '.summary.json'
+        self.entity_id = entity_id
+        self.local_path = local_path
+        self.created = datetime.now().isoformat(timespec='seconds')
+        self.counts = Counter({result: 0 for result in self.RESULTS})
+        Utils.ensure_dirs(os.path.dirname(self.path))
+        self._tmp_path = self.path + '.tmp'
+        self._file = open(self._tmp_path, 'w', newline='')
+        self._csv = None
+        if self.format == self.CSV:
+            self._csv = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+            self._csv.writeheader()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    @property
+    def differences(self):
+        """Number of differences found."""
+        return sum(self.counts[result] for result in self.DIFFERENCES)
+
+    def add(self, result, synapse_item, local_size=None, local_md5=None):
+        """Adds the result of comparing an item. Differences are written to the report.
+
+        Args:
+            result: One of RESULTS.
+            synapse_item: The compared SynapseItem.
+            local_size: Size of the local file, for size and MD5 mismatches.
+            local_md5: MD5 of the local file, for MD5 mismatches.
+
+        Returns:
+            The report entry or None if the result is not a difference.
+        """
+        if result not in self.RESULTS:
+            raise ValueError('Invalid result: {0}'.format(result))
+        self.counts[result] += 1
+        if result not in self.DIFFERENCES:
+            return None
+
+        entry = {
+            'result': result,
+            'type': 'file' if synapse_item.is_file else 'folder',
+            'id': synapse_item.id,
+            'synapse_path': synapse_item.synapse_path,
+            'local_path': synapse_item.local.abs_path,
+            'synapse_size': None,
+            'local_size': local_size,
+            'synapse_md5': None,
+            'local_md5': local_md5
+        }
+        if synapse_item.is_file and result != self.MISSING_REMOTE:
+            entry['synapse_size'] = synapse_item.content_size
+            entry['synapse_md5'] = synapse_item.content_md5
+        if self._csv:
+            self._csv.writerow(entry)
+        else:
+            self._file.write(json.dumps(entry) + '\n')
+        return entry
+
+    def summary(self, complete=True):
+        """Gets the summary saved next to the report.
+
+        Args:
+            complete: False if the compare failed or was aborted before every item was compared.
+        """
+        return {
+            'version': self.VERSION,
+            'created': self.created,
+            'entity_id': self.entity_id,
+            'local_path': self.local_path,
+            'report_path': self.path,
+            'format': self.format,
+            'complete': complete,
+            'compared': sum(self.counts.values()),
+            'differences': self.differences,
+            'counts': dict(self.counts)
+        }
+
+    def close(self, complete=True):
+        """Saves the report and its summary.
+
+        Args:
+            complete: False if the compare failed or was aborted before every item was compared.
+
+        Returns:
+            The summary.
+        """
+        summary = self.summary(complete=complete)
+        if self.closed:
+            return summary
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+        tmp_path = self.summary_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_path, self.summary_path)
+        return summary
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import logging
+import contextlib
+
+
+class ConcurrencyController:
+    """Limits the number of concurrent transfers and adjusts the limit with AIMD.
+
+    The results of the transfers in each interval are used to adjust the limit:
+        - Throttling, an error rate above ERROR_RATE_THRESHOLD or latency above LATENCY_FACTOR times the lowest
+          latency seen cuts the limit by DECREASE_FACTOR.
+        - If the limit was reached the limit is increased by INCREASE_STEP, unless the last increase did not
+          improve the throughput by MIN_IMPROVEMENT in which case it is reverted.
+
+    The limit stays between min_workers and max_workers. The limit is fixed when they are the same.
+    """
+    # Seconds between adjustments.
+    ADJUST_INTERVAL = 5
+    # Workers added when the limit is increased.
+    INCREASE_STEP = 2
+    # Fraction of the limit kept when the limit is decreased.
+    DECREASE_FACTOR = 0.5
+    # Fraction of transfers in an interval that can fail before the limit is decreased.
+    ERROR_RATE_THRESHOLD = 0.1
+    # Latency compared to the lowest latency seen that causes the limit to be decreased.
+    LATENCY_FACTOR = 3.0
+    # Fraction the throughput must improve by after an increase to keep increasing.
+    MIN_IMPROVEMENT = 0.05
+    # Only transfers up to this size are used for latency since larger transfers are bound by bandwidth.
+    LATENCY_MAX_SIZE = 1024 * 1024
+
+    def __init__(self, min_workers, max_workers, initial_workers=None, clock=time.monotonic):
+        """
+        Args:
+            min_workers: The lowest the limit can go.
+            max_workers: The highest the limit can go.
+            initial_workers: The starting limit. Defaults to min_workers.
+            clock: Function that returns the current time in seconds.
+        """
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.limit = min(self.max_workers, max(self.min_workers, initial_workers or self.min_workers))
+        self.active = 0
+        self.clock = clock
+        self.changes = []
+        self._condition = None
+        self._min_latency = None
+        self._last_throughput = None
+        self._last_change = 0
+        self._last_decrease = None
+        self._reset_window(self.clock())
+
+    @property
+    def is_adaptive(self):
+        return self.min_workers < self.max_workers
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Waits until a transfer can start and holds its place until it finishes."""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+            self._peak_active = max(self._peak_active, self.active)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.active -= 1
+                self._condition.notify_all()
+
+    def record(self, size=0, latency=None, error=False, throttled=False):
+        """Records the result of a transfer.
+
+        Args:
+            size: Bytes transferred.
+            latency: Seconds the transfer took. Only set for small transfers.
+            error: True if the transfer failed.
+            throttled: True if the server throttled the transfer (HTTP 429 or 503).
+        """
+        if not self.is_adaptive:
+            return
+        now = self.clock()
+        self._count += 1
+        self._bytes += size
+        if error or throttled:
+            self._errors += 1
+        if latency is not None:
+            self._latency_sum += latency
+            self._latency_count += 1
+
+        if throttled and (self._last_decrease is None or now - self._last_decrease >= self.ADJUST_INTERVAL):
+            self._decrease(now, 'throttled')
+        elif now - self._window_start >= self.ADJUST_INTERVAL:
+            self._adjust(now)
+
+    def throttled(self):
+        """Records a throttled request that was retried."""
+        if not self.is_adaptive:
+            return
+        now = self.clock()
+        self._errors += 1
+        if self._last_decrease is None or now - self._last_decrease >= self.ADJUST_INTERVAL:
+            self._decrease(now, 'throttled')
+
+    def _adjust(self, now):
+        elapsed = now - self._window_start
+        throughput = self._bytes / elapsed if elapsed > 0 else 0
+        error_rate = self._errors / self._count if self._count else 0
+        latency = self._latency_sum / self._latency_count if self._latency_count else None
+        if latency is not None and (self._min_latency is None or latency < self._min_latency):
+            self._min_latency = latency
+
+        if error_rate > self.ERROR_RATE_THRESHOLD:
+            self._decrease(now, 'error rate: {0:.0%}'.format(error_rate))
+        elif latency is not None and latency > self._min_latency * self.LATENCY_FACTOR:
+            self._decrease(now, 'latency: {0:.2f}s'.format(latency))
+        elif self._last_change > 0 and self._last_throughput is not None and \
+                throughput < self._last_throughput * (1 + self.MIN_IMPROVEMENT):
+            # The last increase did not help.
+            self._set_limit(self.limit - self._last_change, now, 'throughput did not improve', -1)
+            self._last_throughput = throughput
+        elif self._peak_active >= self.limit:
+            self._set_limit(self.limit + self.INCREASE_STEP, now, 'throughput: {0:.0f} B/s'.format(throughput), 1)
+            self._last_throughput = throughput
+        else:
+            self._last_change = 0
+            self._reset_window(now)
+
+    def _decrease(self, now, reason):
+        self._last_decrease = now
+        self._last_throughput = None
+        self._set_limit(int(self.limit * self.DECREASE_FACTOR), now, reason, -1)
+
+    def _set_limit(self, limit, now, reason, direction):
+        limit = min(self.max_workers, max(self.min_workers, limit))
+        self._last_change = (limit - self.limit) if direction > 0 else 0
+        if limit != self.limit:
+            logging.debug('Download Workers: {0} -> {1} ({2})'.format(self.limit, limit, reason))
+            self.changes.append((now, limit, reason))
+            self.limit = limit
+            if self._condition is not None and limit > self.active:
+                # Start waiting transfers without blocking the caller.
+                asyncio.ensure_future(self._notify())
+        self._reset_window(now)
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._count = 0
+        self._bytes = 0
+        self._errors = 0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._peak_active = self.active
@@ -0,0 +1,139 @@
+import socket
+import logging
+import threading
+import requests
+from collections import Counter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Detect dead idle connections instead of failing the next request sent on them.
+KEEP_ALIVE_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    KEEP_ALIVE_OPTIONS += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+                           (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15)]
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections shared by the Synapse API calls and the file transfers.
+
+    requests keeps 10 connections for each host. With more workers than that, every request past the 10th opens
+    a new connection, and a new TLS handshake, that is closed with a "Connection pool is full" warning once the
+    response has been read. This pool keeps up to pool_size connections for each host so each worker reuses its
+    connection from one request to the next.
+
+    A connection is only returned to the pool once its response has been read to the end or it has been closed,
+    so it carries one request at a time and never starts a request while part of an earlier response is unread.
+
+    Counters (also added to the Metrics when given):
+        http_requests: Requests sent.
+        http_connections_opened: Connections opened, including reconnects of connections the server closed.
+        http_connections_reused: Requests sent on a connection that was already open.
+        http_connections_discarded: Connections closed because the pool was full.
+        tls_handshakes: HTTPS connections opened.
+    """
+    # Number of hosts to keep connections for (Synapse's endpoints and the storage buckets).
+    MAX_HOSTS = 16
+
+    def __init__(self, pool_size, metrics=None):
+        """
+        Args:
+            pool_size: Number of connections to keep for each host. Should be the number of threads sending requests.
+            metrics: Optional Metrics to add the counters to.
+        """
+        self.pool_size = max(1, pool_size)
+        self.metrics = metrics
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        self._mounted = []
+        self.adapter = self._Adapter(self)
+
+    def mount(self, session):
+        """Sends the http and https requests of a session through the pool until the pool is closed.
+
+        Returns:
+            The session.
+        """
+        self._mounted.append((session, {prefix: session.get_adapter(prefix + '//')
+                                        for prefix in ['https:', 'http:']}))
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def session(self):
+        """Creates a requests Session that uses the pool."""
+        return self.mount(requests.Session())
+
+    def stats(self):
+        """Gets the pool size and the counters."""
+        with self._lock:
+            stats = {name: self._counters[name] for name in ['http_requests',
+                                                             'http_connections_opened',
+                                                             'http_connections_reused',
+                                                             'http_connections_discarded',
+                                                             'tls_handshakes']}
+        stats['pool_size'] = self.pool_size
+        return stats
+
+    def close(self):
+        """Closes the idle connections and restores the adapters of the mounted sessions."""
+        for session, adapters in reversed(self._mounted):
+            for prefix, adapter in adapters.items():
+                session.mount(prefix + '//', adapter)
+        self._mounted = []
+        self.adapter.close()
+
+    def _increment(self, name):
+        with self._lock:
+            self._counters[name] += 1
+        if self.metrics:
+            self.metrics.increment(name)
+
+    def _pool_class(self, pool_class):
+        """Creates a urllib3 pool class that counts its connections."""
+        connection_pool = self
+        is_https = pool_class.scheme == 'https'
+
+        class CountingConnection(pool_class.ConnectionCls):
+            def connect(self):
+                connection_pool._increment('http_connections_opened')
+                if is_https:
+                    connection_pool._increment('tls_handshakes')
+                return super().connect()
+
+        class CountingPool(pool_class):
+            ConnectionCls = CountingConnection
+
+            def _get_conn(self, timeout=None):
+                conn = super()._get_conn(timeout=timeout)
+                if getattr(conn, 'sock', None) is not None:
+                    connection_pool._increment('http_connections_reused')
+                return conn
+
+            def _put_conn(self, conn):
+                if conn is not None and self.pool is not None and self.pool.full():
+                    # More threads are sending requests to the host than the pool was sized for.
+                    connection_pool._increment('http_connections_discarded')
+                    logging.debug('Connection pool for {0} is full ({1}), closing connection.'.format(
+                        self.host, connection_pool.pool_size))
+                    conn.close()
+                    return
+                super()._put_conn(conn)
+
+        return CountingPool
+
+    class _Adapter(requests.adapters.HTTPAdapter):
+        def __init__(self, connection_pool):
+            self.connection_pool = connection_pool
+            super().__init__(pool_connections=ConnectionPool.MAX_HOSTS, pool_maxsize=connection_pool.pool_size)
+
+        def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+            pool_kwargs.setdefault('socket_options', HTTPConnection.default_socket_options + KEEP_ALIVE_OPTIONS)
+            super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': self.connection_pool._pool_class(HTTPConnectionPool),
+                'https': self.connection_pool._pool_class(HTTPSConnectionPool)
+            }
+
+        def send(self, request, **kwargs):
+            self.connection_pool._increment('http_requests')
+            return super().send(request, **kwargs)
@@ -0,0 +1,157 @@
+import os
+import shutil
+import asyncio
+import logging
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Deduplicator:
+    """Creates local files from identical local files instead of downloading them.
+
+    Local files are found by MD5 and size in the Md5Cache, which has every file downloaded or verified (in this or
+    earlier runs) that has not changed since. While a file is downloading, other files with the same MD5 wait for it
+    and are then created from it.
+
+    Policies:
+        hardlink: Hard link to the existing file. The files share their content so changing one changes the other.
+            Falls back to a copy when the files are on different file systems.
+        reflink: Copy-on-write clone of the existing file (Linux file systems that support FICLONE, e.g. Btrfs and XFS).
+            Falls back to a copy when cloning is not supported.
+        copy: Copy the existing file.
+    """
+    HARDLINK = 'hardlink'
+    REFLINK = 'reflink'
+    COPY = 'copy'
+    POLICIES = [HARDLINK, REFLINK, COPY]
+    # ioctl request to clone a file on Linux.
+    FICLONE = 0x40049409
+    # Suffix of the file while it is created.
+    PARTIAL_SUFFIX = '.syntools.dedup'
+
+    def __init__(self, md5_cache, policy):
+        """
+        Args:
+            md5_cache: The Md5Cache to find existing files in.
+            policy: One of POLICIES.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError('Invalid dedup policy: {0}. Must be one of: {1}.'.format(policy, ', '.join(self.POLICIES)))
+        self.md5_cache = md5_cache
+        self.policy = policy
+        self._pending = {}
+
+    async def find(self, md5, size, target_path):
+        """Finds an existing local file to create a file from.
+
+        Waits for a file with the same MD5 that is downloading. The Md5Cache is searched in the default executor
+        since it is shared with other processes. A file with the same MD5 that starts downloading during the search
+        is waited for and the search is repeated, so when None is returned no file with the MD5 is downloading and
+        the caller can mark its file as downloading before its next await.
+
+        Args:
+            md5: The MD5 of the file.
+            size: The size of the file.
+            target_path: The path the file will be created at.
+
+        Returns:
+            The absolute path of the existing file or None.
+        """
+        if not md5 or not size:
+            return None
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = self._pending.get(md5)
+            if pending is not None:
+                await asyncio.shield(pending)
+            try:
+                source_path = await loop.run_in_executor(None, self._find, md5, size, target_path)
+            except Exception as ex:
+                logging.warning('Failed to find an identical file for: {0}. {1}'.format(target_path, ex))
+                source_path = None
+            if source_path is not None or md5 not in self._pending:
+                return source_path
+
+    def _find(self, md5, size, target_path):
+        return self.md5_cache.find(md5, size, exclude=target_path)
+
+    @contextlib.contextmanager
+    def downloading(self, md5):
+        """Marks a file as downloading so files with the same MD5 wait for it."""
+        if not md5 or md5 in self._pending:
+            yield
+            return
+        pending = self._pending[md5] = asyncio.get_running_loop().create_future()
+        try:
+            yield
+        finally:
+            del self._pending[md5]
+            pending.set_result(None)
+
+    async def create(self, source_path, target_path):
+        """Creates a file from an existing file with the policy.
+
+        Returns:
+            The policy used, which is copy if the policy was not supported for the files.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._create, source_path, target_path)
+
+    def _create(self, source_path, target_path):
+        return self.create_file(self.policy, source_path, target_path)
+
+    @classmethod
+    def create_file(cls, policy, source_path, target_path, partial_suffix=None):
+        """Creates a file from an existing file with a policy. Blocks while the file is copied.
+
+        The file is created at a temporary path and moved to the target path so it never exists partially.
+
+        Args:
+            policy: One of POLICIES.
+            source_path: The existing file.
+            target_path: The file to create. Replaced if it exists.
+            partial_suffix: Suffix of the temporary path. Defaults to PARTIAL_SUFFIX.
+
+        Returns:
+            The policy used, which is copy if the policy was not supported for the files.
+        """
+        partial_path = target_path + (partial_suffix or cls.PARTIAL_SUFFIX)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        try:
+            if policy == cls.HARDLINK:
+                try:
+                    os.link(source_path, partial_path)
+                except OSError as ex:
+                    logging.debug('Failed to hard link: {0} -> {1}. Copying. {2}'.format(source_path, target_path, ex))
+                    policy = cls.COPY
+            elif policy == cls.REFLINK:
+                try:
+                    cls._reflink(source_path, partial_path)
+                except OSError as ex:
+                    logging.debug('Failed to reflink: {0} -> {1}. Copying. {2}'.format(source_path, target_path, ex))
+                    policy = cls.COPY
+
+            if policy == cls.COPY:
+                shutil.copyfile(source_path, partial_path)
+            os.replace(partial_path, target_path)
+            return policy
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    @classmethod
+    def _reflink(cls, source_path, target_path):
+        if fcntl is None:
+            raise OSError('Reflinks are not supported on this platform.')
+        try:
+            with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+                fcntl.ioctl(target.fileno(), cls.FICLONE, source.fileno())
+        except OSError:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
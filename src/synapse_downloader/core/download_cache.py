@@ -0,0 +1,175 @@
+import os
+import time
+from .env import Env
+from .utils import Utils
+from .sqlite_store import SqliteStore
+from .deduplicator import Deduplicator
+
+
+class DownloadCache(SqliteStore):
+    """Cache of downloaded files shared by every run and download path on a machine.
+
+    Files are stored by file handle ID and MD5 in the cache directory. A downloaded file is added to the cache and
+    later downloads of the same file handle are filled from the cache instead of downloading it again.
+    Files are added and filled with a hard link (falling back to a copy across file systems) or a copy.
+
+    The least recently used files are removed when the cache is larger than max_size. Files are stored with the size,
+    modified time and inode they were added with and are removed instead of used if they change, e.g. a hard linked
+    file that was edited in a download directory.
+
+    Several processes can use the same cache at once. Each change to the index is committed right away, files are
+    added through a temporary file unique to the process and files that are removed by another process are treated
+    as not cached.
+    """
+    DB_FILENAME = 'index.sqlite'
+    OBJECTS_DIRNAME = 'objects'
+    POLICIES = [Deduplicator.HARDLINK, Deduplicator.COPY]
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS files ('
+        ' path TEXT PRIMARY KEY,'
+        ' file_handle_id TEXT NOT NULL,'
+        ' md5 TEXT NOT NULL,'
+        ' size INTEGER NOT NULL,'
+        ' mtime_ns INTEGER NOT NULL,'
+        ' inode INTEGER NOT NULL,'
+        ' last_used REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)'
+    ]
+
+    def __init__(self, cache_dir, max_size, policy=None):
+        """
+        Args:
+            cache_dir: The cache directory.
+            max_size: Max number of bytes to keep.
+            policy: hardlink or copy. Defaults to hardlink.
+        """
+        self.cache_dir = Utils.expand_path(cache_dir)
+        self.max_size = max_size
+        self.policy = policy or Deduplicator.HARDLINK
+        if self.policy not in self.POLICIES:
+            raise ValueError('Invalid download cache link: {0}. Must be one of: {1}.'.format(
+                policy, ', '.join(self.POLICIES)))
+        super().__init__(os.path.join(self.cache_dir, self.DB_FILENAME))
+
+    @classmethod
+    def from_env(cls):
+        """Gets the cache set by Env.SYNTOOLS_DOWNLOAD_CACHE_DIR or None if there is no cache."""
+        cache_dir = Env.SYNTOOLS_DOWNLOAD_CACHE_DIR()
+        if not cache_dir:
+            return None
+        return cls(cache_dir,
+                   int(Env.SYNTOOLS_DOWNLOAD_CACHE_SIZE() * Utils.GB),
+                   policy=Env.SYNTOOLS_DOWNLOAD_CACHE_LINK())
+
+    def object_path(self, file_handle_id, md5):
+        """Gets the path a file is stored at in the cache."""
+        return os.path.join(self.cache_dir, self.OBJECTS_DIRNAME, md5[:2], '{0}_{1}'.format(file_handle_id, md5))
+
+    @property
+    def size(self):
+        """Number of bytes in the cache."""
+        row = self._fetchone('SELECT COALESCE(SUM(size), 0) FROM files')
+        return row[0]
+
+    def get(self, file_handle_id, md5, size):
+        """Gets the path of a cached file and marks it as used.
+
+        Returns:
+            The path or None if the file is not cached or has changed.
+        """
+        if not file_handle_id or not md5:
+            return None
+        path = self.object_path(file_handle_id, md5)
+        row = self._fetchone('SELECT size, mtime_ns, inode FROM files WHERE path = ?', (path,))
+        if row is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is None or (stat.st_size, stat.st_mtime_ns, stat.st_ino) != tuple(row) or stat.st_size != size:
+            self._remove(path)
+            return None
+        self._execute('UPDATE files SET last_used = ? WHERE path = ?', (time.time(), path))
+        return path
+
+    def fill(self, file_handle_id, md5, size, target_path):
+        """Creates a file from the cache. Blocks while the file is copied.
+
+        Returns:
+            The policy used or None if the file is not cached.
+        """
+        path = self.get(file_handle_id, md5, size)
+        if path is None:
+            return None
+        try:
+            return Deduplicator.create_file(self.policy, path, target_path, partial_suffix=self._partial_suffix)
+        except FileNotFoundError:
+            # Removed by another process.
+            return None
+
+    def add(self, file_handle_id, md5, source_path):
+        """Adds a downloaded file to the cache and removes the least recently used files if the cache is full.
+        Blocks while the file is copied.
+
+        Returns:
+            True if the file was added, False if it was already cached or is larger than the cache.
+        """
+        if not file_handle_id or not md5:
+            return False
+        source_size = os.path.getsize(source_path)
+        if source_size > self.max_size:
+            return False
+        if self.get(file_handle_id, md5, source_size):
+            return False
+
+        path = self.object_path(file_handle_id, md5)
+        Utils.ensure_dirs(os.path.dirname(path))
+        Deduplicator.create_file(self.policy, source_path, path, partial_suffix=self._partial_suffix)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed by another process.
+            return False
+        self._execute('INSERT OR REPLACE INTO files (path, file_handle_id, md5, size, mtime_ns, inode, last_used) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      (path, str(file_handle_id), md5, stat.st_size, stat.st_mtime_ns, stat.st_ino, time.time()))
+        self.evict()
+        return True
+
+    def evict(self):
+        """Removes the least recently used files until the cache is no larger than max_size.
+
+        Returns:
+            The number of files removed.
+        """
+        removed = 0
+        excess = self.size - self.max_size
+        while excess > 0:
+            rows = self._fetchall('SELECT path, size FROM files ORDER BY last_used LIMIT 100')
+            if not rows:
+                break
+            for path, size in rows:
+                self._remove(path)
+                removed += 1
+                excess -= size
+                if excess <= 0:
+                    break
+        return removed
+
+    @property
+    def _partial_suffix(self):
+        return '.syntools.{0}.part'.format(os.getpid())
+
+    def _remove(self, path):
+        self._execute('DELETE FROM files WHERE path = ?', (path,))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _execute(self, sql, params=()):
+        """Writes and commits right away so other processes see the change."""
+        with self._lock:
+            self._conn.execute(sql, params)
+            self.commit()
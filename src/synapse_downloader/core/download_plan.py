@@ -0,0 +1,169 @@
+import os
+import json
+from datetime import datetime, timedelta
+from synapsis import Synapsis
+from .env import Env
+from .utils import Utils
+from .synapse_item import SynapseItem
+from .exceptions import SynToolsError
+
+
+class DownloadPlan:
+    """The folders and files a download will transfer or skip.
+
+    A plan is made by a dry run and saved as JSON. Downloading from a plan transfers its files without
+    listing Synapse again.
+    """
+    VERSION = 1
+    DOWNLOAD = 'download'
+    SKIP_CURRENT = 'skip-current'
+    SKIP_EXCLUDED = 'skip-excluded'
+    ACTIONS = [DOWNLOAD, SKIP_CURRENT, SKIP_EXCLUDED]
+    # Seconds of request overhead for each downloaded file used in the estimate.
+    FILE_OVERHEAD = 0.1
+
+    def __init__(self, entity_id, download_path, excludes=None, items=None, created=None, includes=None):
+        self.entity_id = entity_id
+        self.download_path = download_path
+        self.excludes = list(excludes or [])
+        self.includes = list(includes or [])
+        self.items = list(items or [])
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+
+    def add(self, synapse_item, action):
+        """Adds a folder or file to the plan.
+
+        Args:
+            synapse_item: The SynapseItem.
+            action: One of ACTIONS.
+
+        Returns:
+            The plan entry.
+        """
+        if action not in self.ACTIONS:
+            raise ValueError('Invalid action: {0}'.format(action))
+        entry = {
+            'action': action,
+            'concrete_type': synapse_item.type.code,
+            'id': synapse_item.id,
+            'parent_id': synapse_item.parent_id,
+            'name': synapse_item.name,
+            'version_number': synapse_item.version_number,
+            'synapse_root_path': synapse_item.synapse_root_path,
+            'local_root_path': synapse_item.local_root_path,
+            'synapse_path': synapse_item.synapse_path,
+            'local_path': synapse_item.local.abs_path
+        }
+        if synapse_item.is_file:
+            entry.update({
+                'file_handle_id': synapse_item.file_handle_id,
+                'filename': synapse_item.filename,
+                'content_size': synapse_item.content_size,
+                'content_md5': synapse_item.content_md5,
+                'file_handle_type': synapse_item.file_handle_type
+            })
+        self.items.append(entry)
+        return entry
+
+    def folders(self, action=None):
+        """Gets the folder entries, optionally only those with an action."""
+        return [e for e in self.items if not self._is_file(e) and (action is None or e['action'] == action)]
+
+    def files(self, action=None):
+        """Gets the file entries, optionally only those with an action."""
+        return [e for e in self.items if self._is_file(e) and (action is None or e['action'] == action)]
+
+    @staticmethod
+    def _is_file(entry):
+        return Synapsis.ConcreteTypes.get(entry['concrete_type']).is_file
+
+    @property
+    def totals(self):
+        """Gets the number of files and bytes for each action.
+
+        Files with an unknown size (external files) are counted in 'unknown_size' and not in 'bytes'.
+        """
+        totals = {}
+        for action in self.ACTIONS:
+            files = self.files(action)
+            totals[action] = {
+                'files': len(files),
+                'bytes': sum(f['content_size'] for f in files if f['content_size'] is not None),
+                'unknown_size': len([f for f in files if f['content_size'] is None])
+            }
+        return totals
+
+    def estimated_seconds(self, mbps=None, workers=None):
+        """Estimates how long the downloads in the plan will take.
+
+        Args:
+            mbps: Expected download speed in MB/s. Defaults to Env.SYNTOOLS_PLAN_MBPS.
+            workers: Number of files downloaded at once. Defaults to Env.SYNTOOLS_DOWNLOAD_WORKERS.
+
+        Returns:
+            The estimate in seconds.
+        """
+        mbps = mbps or Env.SYNTOOLS_PLAN_MBPS()
+        workers = max(1, workers or Env.SYNTOOLS_DOWNLOAD_WORKERS())
+        downloads = self.totals[self.DOWNLOAD]
+        return downloads['bytes'] / (mbps * Utils.MB) + downloads['files'] * self.FILE_OVERHEAD / workers
+
+    def to_dict(self):
+        estimated = self.estimated_seconds()
+        return {
+            'version': self.VERSION,
+            'created': self.created,
+            'entity_id': self.entity_id,
+            'download_path': self.download_path,
+            'excludes': self.excludes,
+            'includes': self.includes,
+            'totals': self.totals,
+            'estimated_mbps': Env.SYNTOOLS_PLAN_MBPS(),
+            'estimated_seconds': round(estimated, 1),
+            'estimated_duration': str(timedelta(seconds=round(estimated))),
+            'items': sorted(self.items, key=lambda e: e['local_path'])
+        }
+
+    def save(self, path):
+        path = Utils.expand_path(path)
+        Utils.ensure_dirs(os.path.dirname(path))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(Utils.expand_path(path)) as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('version') != cls.VERSION:
+            raise SynToolsError('Unsupported plan file: {0}'.format(path))
+        return cls(data['entity_id'],
+                   data['download_path'],
+                   excludes=data.get('excludes'),
+                   items=data.get('items'),
+                   created=data.get('created'),
+                   includes=data.get('includes'))
+
+    @staticmethod
+    def to_synapse_item(entry):
+        """Creates the SynapseItem for a plan entry. Files have their file handle set so they do not need
+        to be loaded.
+        """
+        synapse_item = SynapseItem(Synapsis.ConcreteTypes.get(entry['concrete_type']),
+                                   id=entry['id'],
+                                   parent_id=entry['parent_id'],
+                                   name=entry['name'],
+                                   synapse_root_path=entry['synapse_root_path'],
+                                   local_root_path=entry['local_root_path'],
+                                   version_number=entry.get('version_number'))
+        if synapse_item.is_file and entry.get('file_handle_id'):
+            synapse_item.set_file_handle({
+                'id': entry['file_handle_id'],
+                'fileName': entry['filename'],
+                'contentSize': entry['content_size'],
+                'contentMd5': entry['content_md5'],
+                'concreteType': entry['file_handle_type']
+            })
+        return synapse_item
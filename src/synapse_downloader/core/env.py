@@ -6,6 +6,24 @@ class Env:
     _SYNTOOLS_SYN_GET_DOWNLOAD = None
     _SYNTOOLS_DOWNLOAD_WORKERS = None
     _SYNTOOLS_DOWNLOAD_RETRIES = None
+    _SYNTOOLS_DOWNLOAD_CHUNK_SIZE = None
+    _SYNTOOLS_DOWNLOAD_CHUNK_WORKERS = None
+    _SYNTOOLS_LISTING_WORKERS = None
+    _SYNTOOLS_METADATA_WORKERS = None
+    _SYNTOOLS_QUEUE_SIZE = None
+    _SYNTOOLS_PLAN_MBPS = None
+    _SYNTOOLS_ADAPTIVE_WORKERS = None
+    _SYNTOOLS_MIN_DOWNLOAD_WORKERS = None
+    _SYNTOOLS_MAX_DOWNLOAD_WORKERS = None
+    _SYNTOOLS_HASH_WORKERS = None
+    _SYNTOOLS_HASH_BUFFER_SIZE = None
+    _SYNTOOLS_HASH_PROCESSES = None
+    _SYNTOOLS_HTTP_POOL_SIZE = None
+    _SYNTOOLS_ASYNC_DOWNLOAD = None
+    _SYNTOOLS_DOWNLOAD_CACHE_DIR = None
+    _SYNTOOLS_DOWNLOAD_CACHE_SIZE = None
+    _SYNTOOLS_DOWNLOAD_CACHE_LINK = None
+    _SYNTOOLS_SCAN_WORKERS = None
 
     @classmethod
     def SYNTOOLS_PATCH(cls):
@@ -31,3 +49,133 @@ class Env:
         if cls._SYNTOOLS_DOWNLOAD_WORKERS is None:
             cls._SYNTOOLS_DOWNLOAD_WORKERS = int(os.environ.get('SYNTOOLS_DOWNLOAD_WORKERS', '20'))
         return cls._SYNTOOLS_DOWNLOAD_WORKERS
+
+    @classmethod
+    def SYNTOOLS_DOWNLOAD_CHUNK_SIZE(cls):
+        """Size in MB of each range when downloading large files."""
+        if cls._SYNTOOLS_DOWNLOAD_CHUNK_SIZE is None:
+            cls._SYNTOOLS_DOWNLOAD_CHUNK_SIZE = int(os.environ.get('SYNTOOLS_DOWNLOAD_CHUNK_SIZE', '64'))
+        return cls._SYNTOOLS_DOWNLOAD_CHUNK_SIZE
+
+    @classmethod
+    def SYNTOOLS_DOWNLOAD_CHUNK_WORKERS(cls):
+        """Max number of ranges to download at once for each large file."""
+        if cls._SYNTOOLS_DOWNLOAD_CHUNK_WORKERS is None:
+            cls._SYNTOOLS_DOWNLOAD_CHUNK_WORKERS = int(os.environ.get('SYNTOOLS_DOWNLOAD_CHUNK_WORKERS', '8'))
+        return cls._SYNTOOLS_DOWNLOAD_CHUNK_WORKERS
+
+    @classmethod
+    def SYNTOOLS_LISTING_WORKERS(cls):
+        """Number of workers listing folders."""
+        if cls._SYNTOOLS_LISTING_WORKERS is None:
+            cls._SYNTOOLS_LISTING_WORKERS = int(os.environ.get('SYNTOOLS_LISTING_WORKERS', '4'))
+        return cls._SYNTOOLS_LISTING_WORKERS
+
+    @classmethod
+    def SYNTOOLS_METADATA_WORKERS(cls):
+        """Number of workers loading file handles."""
+        if cls._SYNTOOLS_METADATA_WORKERS is None:
+            cls._SYNTOOLS_METADATA_WORKERS = int(os.environ.get('SYNTOOLS_METADATA_WORKERS', '4'))
+        return cls._SYNTOOLS_METADATA_WORKERS
+
+    @classmethod
+    def SYNTOOLS_QUEUE_SIZE(cls):
+        """Max number of files waiting to be loaded or transferred."""
+        if cls._SYNTOOLS_QUEUE_SIZE is None:
+            cls._SYNTOOLS_QUEUE_SIZE = int(os.environ.get('SYNTOOLS_QUEUE_SIZE', '1000'))
+        return cls._SYNTOOLS_QUEUE_SIZE
+
+    @classmethod
+    def SYNTOOLS_PLAN_MBPS(cls):
+        """Expected download speed in MB/s used to estimate how long a plan will take."""
+        if cls._SYNTOOLS_PLAN_MBPS is None:
+            cls._SYNTOOLS_PLAN_MBPS = int(os.environ.get('SYNTOOLS_PLAN_MBPS', '50'))
+        return cls._SYNTOOLS_PLAN_MBPS
+
+    @classmethod
+    def SYNTOOLS_ADAPTIVE_WORKERS(cls):
+        """Adjust the number of download workers between the min and max based on throughput and throttling."""
+        if cls._SYNTOOLS_ADAPTIVE_WORKERS is None:
+            cls._SYNTOOLS_ADAPTIVE_WORKERS = os.environ.get('SYNTOOLS_ADAPTIVE_WORKERS',
+                                                            'false').lower().strip() == 'true'
+        return cls._SYNTOOLS_ADAPTIVE_WORKERS
+
+    @classmethod
+    def SYNTOOLS_MIN_DOWNLOAD_WORKERS(cls):
+        """Lowest number of download workers when adaptive."""
+        if cls._SYNTOOLS_MIN_DOWNLOAD_WORKERS is None:
+            cls._SYNTOOLS_MIN_DOWNLOAD_WORKERS = int(os.environ.get('SYNTOOLS_MIN_DOWNLOAD_WORKERS', '4'))
+        return cls._SYNTOOLS_MIN_DOWNLOAD_WORKERS
+
+    @classmethod
+    def SYNTOOLS_MAX_DOWNLOAD_WORKERS(cls):
+        """Highest number of download workers when adaptive."""
+        if cls._SYNTOOLS_MAX_DOWNLOAD_WORKERS is None:
+            cls._SYNTOOLS_MAX_DOWNLOAD_WORKERS = int(os.environ.get('SYNTOOLS_MAX_DOWNLOAD_WORKERS', '64'))
+        return cls._SYNTOOLS_MAX_DOWNLOAD_WORKERS
+
+    @classmethod
+    def SYNTOOLS_HASH_WORKERS(cls):
+        """Number of local files to hash at once."""
+        if cls._SYNTOOLS_HASH_WORKERS is None:
+            cls._SYNTOOLS_HASH_WORKERS = int(os.environ.get('SYNTOOLS_HASH_WORKERS', '8'))
+        return cls._SYNTOOLS_HASH_WORKERS
+
+    @classmethod
+    def SYNTOOLS_HASH_BUFFER_SIZE(cls):
+        """Size in MB of each read when hashing local files."""
+        if cls._SYNTOOLS_HASH_BUFFER_SIZE is None:
+            cls._SYNTOOLS_HASH_BUFFER_SIZE = int(os.environ.get('SYNTOOLS_HASH_BUFFER_SIZE', '4'))
+        return cls._SYNTOOLS_HASH_BUFFER_SIZE
+
+    @classmethod
+    def SYNTOOLS_HASH_PROCESSES(cls):
+        """Hash local files in a pool of processes instead of threads."""
+        if cls._SYNTOOLS_HASH_PROCESSES is None:
+            cls._SYNTOOLS_HASH_PROCESSES = os.environ.get('SYNTOOLS_HASH_PROCESSES',
+                                                          'false').lower().strip() == 'true'
+        return cls._SYNTOOLS_HASH_PROCESSES
+
+    @classmethod
+    def SYNTOOLS_HTTP_POOL_SIZE(cls):
+        """Number of HTTP connections to keep open for each host. 0 to use one for each worker."""
+        if cls._SYNTOOLS_HTTP_POOL_SIZE is None:
+            cls._SYNTOOLS_HTTP_POOL_SIZE = int(os.environ.get('SYNTOOLS_HTTP_POOL_SIZE', '0'))
+        return cls._SYNTOOLS_HTTP_POOL_SIZE
+
+    @classmethod
+    def SYNTOOLS_ASYNC_DOWNLOAD(cls):
+        """Download files on the event loop with aiohttp instead of a thread for each download."""
+        if cls._SYNTOOLS_ASYNC_DOWNLOAD is None:
+            cls._SYNTOOLS_ASYNC_DOWNLOAD = os.environ.get('SYNTOOLS_ASYNC_DOWNLOAD',
+                                                          'false').lower().strip() == 'true'
+        return cls._SYNTOOLS_ASYNC_DOWNLOAD
+
+    @classmethod
+    def SYNTOOLS_DOWNLOAD_CACHE_DIR(cls):
+        """Directory of the download cache shared by all runs. Empty to not use a download cache."""
+        if cls._SYNTOOLS_DOWNLOAD_CACHE_DIR is None:
+            cls._SYNTOOLS_DOWNLOAD_CACHE_DIR = os.environ.get('SYNTOOLS_DOWNLOAD_CACHE_DIR', '').strip()
+        return cls._SYNTOOLS_DOWNLOAD_CACHE_DIR
+
+    @classmethod
+    def SYNTOOLS_DOWNLOAD_CACHE_SIZE(cls):
+        """Max size of the download cache in GB."""
+        if cls._SYNTOOLS_DOWNLOAD_CACHE_SIZE is None:
+            cls._SYNTOOLS_DOWNLOAD_CACHE_SIZE = float(os.environ.get('SYNTOOLS_DOWNLOAD_CACHE_SIZE', '100'))
+        return cls._SYNTOOLS_DOWNLOAD_CACHE_SIZE
+
+    @classmethod
+    def SYNTOOLS_DOWNLOAD_CACHE_LINK(cls):
+        """How files are added to and filled from the download cache: hardlink or copy."""
+        if cls._SYNTOOLS_DOWNLOAD_CACHE_LINK is None:
+            cls._SYNTOOLS_DOWNLOAD_CACHE_LINK = os.environ.get('SYNTOOLS_DOWNLOAD_CACHE_LINK',
+                                                               'hardlink').lower().strip()
+        return cls._SYNTOOLS_DOWNLOAD_CACHE_LINK
+
+    @classmethod
+    def SYNTOOLS_SCAN_WORKERS(cls):
+        """Number of local directories or files to list or stat at once when comparing."""
+        if cls._SYNTOOLS_SCAN_WORKERS is None:
+            cls._SYNTOOLS_SCAN_WORKERS = int(os.environ.get('SYNTOOLS_SCAN_WORKERS', '8'))
+        return cls._SYNTOOLS_SCAN_WORKERS
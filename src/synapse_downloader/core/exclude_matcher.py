@@ -0,0 +1,153 @@
+import re
+import fnmatch
+from .exceptions import SynToolsError
+
+ID_PATTERN = re.compile(r'^syn\d+$', re.IGNORECASE)
+GLOB_CHARS = ('*', '?', '[')
+
+
+class ExcludeMatcher:
+    """Matches SynapseItems against exclude and include patterns.
+
+    Patterns:
+        syn123: A Synapse ID (case-insensitive).
+        re:<regex>: A regular expression that must match the whole name or path.
+        glob:<glob> or any pattern with *, ? or [: A glob. Globs with a / are matched against the Synapse path and
+            local path, other globs against the Synapse name and local name. Patterns without the glob: prefix
+            are also matched exactly first, so a name such as data[1].csv still matches itself.
+        Anything else: An exact Synapse name, local name, Synapse path or local path (case-sensitive).
+
+    IDs and exact values are looked up in sets and globs of the form *<suffix> (e.g. *.tmp) by suffix. The remaining
+    globs are grouped by their literal prefix (the first character for names, the directory for paths) and each
+    group is compiled into a single regex, so a name or path is only checked against the groups it could match.
+    Regexes are compiled on their own since their flags, group names and backreferences cannot be combined.
+
+    Includes only apply to files. When includes are set a file is skipped unless it matches one.
+    """
+
+    def __init__(self, excludes=None, includes=None):
+        self.excludes = self._Patterns(excludes)
+        self.includes = self._Patterns(includes)
+
+    def __bool__(self):
+        return bool(self.excludes or self.includes)
+
+    def is_excluded(self, synapse_item, loaded=True):
+        """Gets if an item is excluded or, for files, not included.
+
+        Args:
+            synapse_item: The SynapseItem to check.
+            loaded: False if the file handle has not been loaded yet. Only the ID and Synapse name are checked since
+                the filename and paths can change once it is loaded.
+        """
+        if self.excludes.matches(synapse_item, loaded=loaded):
+            return True
+        if loaded and self.includes and synapse_item.is_file:
+            return not self.includes.matches(synapse_item)
+        return False
+
+    class _Patterns:
+        def __init__(self, patterns):
+            self.patterns = []
+            self.ids = set()
+            self.values = set()
+            self.name_suffixes = {}
+            # Compiled regexes by prefix. Regexes are checked before the globs.
+            self.name_regexes = {}
+            self.path_regexes = {}
+            name_globs = {}
+            path_globs = {}
+
+            for pattern in (patterns or []):
+                if not pattern:
+                    continue
+                self.patterns.append(pattern)
+                if ID_PATTERN.match(pattern.strip()):
+                    self.ids.add(pattern.strip().lower())
+                elif pattern.startswith('re:'):
+                    try:
+                        regex = re.compile(pattern[3:])
+                    except re.error as ex:
+                        raise SynToolsError('Invalid regex: {0}: {1}'.format(pattern, ex)) from ex
+                    self.name_regexes.setdefault('', []).append(regex)
+                    self.path_regexes.setdefault('', []).append(regex)
+                elif pattern.startswith('glob:') or any(c in pattern for c in GLOB_CHARS):
+                    if pattern.startswith('glob:'):
+                        glob = pattern[5:]
+                    else:
+                        # Names and paths can contain glob characters.
+                        self.values.add(pattern)
+                        glob = pattern
+                    literal = glob[:min([glob.index(c) for c in GLOB_CHARS if c in glob] or [len(glob)])]
+                    suffix = glob[1:]
+                    if '/' in glob:
+                        prefix = literal[:literal.rfind('/') + 1]
+                        path_globs.setdefault(prefix, []).append(fnmatch.translate(glob))
+                    elif glob.startswith('*') and suffix and not any(c in suffix for c in GLOB_CHARS):
+                        self.name_suffixes.setdefault(len(suffix), set()).add(suffix)
+                    else:
+                        name_globs.setdefault(literal[:1], []).append(fnmatch.translate(glob))
+                else:
+                    self.values.add(pattern)
+
+            for key, globs in name_globs.items():
+                self.name_regexes.setdefault(key, []).append(self._compile(globs))
+            for key, globs in path_globs.items():
+                self.path_regexes.setdefault(key, []).append(self._compile(globs))
+
+        def __bool__(self):
+            return bool(self.patterns)
+
+        @staticmethod
+        def _compile(globs):
+            # Translated globs have no flags, groups or backreferences that could clash.
+            return re.compile('|'.join('(?:{0})'.format(glob) for glob in globs))
+
+        @staticmethod
+        def _fullmatch(regexes, value):
+            return regexes is not None and any(regex.fullmatch(value) for regex in regexes)
+
+        def matches(self, synapse_item, loaded=True):
+            if not self.patterns:
+                return False
+            if synapse_item.id is not None and synapse_item.id.lower() in self.ids:
+                return True
+
+            names = [synapse_item.name]
+            paths = []
+            if loaded:
+                local = synapse_item.local
+                if local.name != synapse_item.name:
+                    names.append(local.name)
+                paths = [synapse_item.synapse_path, local.abs_path]
+
+            for value in names + paths:
+                if value in self.values:
+                    return True
+            for name in names:
+                if self._matches_name(name):
+                    return True
+            if self.path_regexes:
+                for path in paths:
+                    if self._matches_path(path):
+                        return True
+            return False
+
+        def _matches_name(self, name):
+            for length, suffixes in self.name_suffixes.items():
+                if len(name) >= length and name[-length:] in suffixes:
+                    return True
+            for key in ('', name[:1]):
+                if self._fullmatch(self.name_regexes.get(key), name):
+                    return True
+            return False
+
+        def _matches_path(self, path):
+            if self._fullmatch(self.path_regexes.get(''), path):
+                return True
+            index = path.find('/')
+            while index != -1:
+                if self._fullmatch(self.path_regexes.get(path[:index + 1]), path):
+                    return True
+                index = path.find('/', index + 1)
+            return False
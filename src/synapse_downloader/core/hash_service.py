@@ -0,0 +1,174 @@
+import os
+import mmap
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .env import Env
+from .utils import Utils
+
+_buffers = threading.local()
+
+
+def _get_buffer(buffer_size):
+    """Gets a page aligned read buffer that is reused by the current thread."""
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != buffer_size:
+        buffer = _buffers.buffer = mmap.mmap(-1, buffer_size)
+    return buffer
+
+
+def md5_file(path, buffer_size, drop_cache=True):
+    """Gets the MD5 of a file.
+
+    Args:
+        path: Path to the file.
+        buffer_size: Size of each read.
+        drop_cache: True to drop the file from the page cache once it is hashed.
+
+    Returns:
+        Tuple of the hex MD5 and the number of bytes read.
+    """
+    md5 = hashlib.md5()
+    view = memoryview(_get_buffer(buffer_size))
+    size = 0
+    with open(path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        try:
+            while True:
+                read = f.readinto(view)
+                if not read:
+                    break
+                md5.update(view[:read])
+                size += read
+        finally:
+            view.release()
+            if drop_cache and hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return md5.hexdigest(), size
+
+
+class HashService:
+    """Hashes local files in a dedicated pool of threads or processes.
+
+    hashlib releases the GIL while it hashes each buffer so threads use multiple cores for large files.
+    Processes avoid the GIL for the per-file work and are faster for many small files.
+    Files are read into a reusable page aligned buffer with a sequential readahead hint and are dropped from
+    the page cache once hashed so verifying a large tree does not evict everything else.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, workers=None, buffer_size=None, use_processes=None, drop_cache=True):
+        """
+        Args:
+            workers: Number of files to hash at once. Defaults to Env.SYNTOOLS_HASH_WORKERS.
+            buffer_size: Size of each read. Defaults to Env.SYNTOOLS_HASH_BUFFER_SIZE.
+            use_processes: True to hash in a process pool. Defaults to Env.SYNTOOLS_HASH_PROCESSES.
+            drop_cache: True to drop files from the page cache once they are hashed.
+        """
+        self.workers = max(1, workers or Env.SYNTOOLS_HASH_WORKERS())
+        self.buffer_size = max(mmap.PAGESIZE, buffer_size or Env.SYNTOOLS_HASH_BUFFER_SIZE() * Utils.MB)
+        self.use_processes = Env.SYNTOOLS_HASH_PROCESSES() if use_processes is None else use_processes
+        self.drop_cache = drop_cache
+        self._executor = None
+        self._lock = threading.Lock()
+        self._files = 0
+        self._bytes = 0
+        self._active = 0
+        self._busy_since = None
+        self._busy_seconds = 0.0
+
+    @classmethod
+    def default(cls):
+        """Gets the HashService shared by the process."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @classmethod
+    def reset_default(cls):
+        """Shuts down the shared HashService so the next one picks up the current settings."""
+        with cls._default_lock:
+            if cls._default is not None:
+                cls._default.shutdown()
+                cls._default = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='syntools-hash')
+        return self._executor
+
+    async def md5(self, path):
+        """Gets the MD5 of a file."""
+        self._started()
+        try:
+            md5, size = await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                         md5_file,
+                                                                         path,
+                                                                         self.buffer_size,
+                                                                         self.drop_cache)
+        finally:
+            self._finished()
+        self._record(size)
+        return md5
+
+    def md5_sync(self, path):
+        """Gets the MD5 of a file on the current thread."""
+        self._started()
+        try:
+            md5, size = md5_file(path, self.buffer_size, self.drop_cache)
+        finally:
+            self._finished()
+        self._record(size)
+        return md5
+
+    def stats(self):
+        """Gets the number of files and bytes hashed and the throughput while hashing.
+
+        Returns:
+            Dict with files, bytes, busy_seconds, bytes_per_second and files_per_second.
+        """
+        with self._lock:
+            busy_seconds = self._busy_seconds
+            if self._busy_since is not None:
+                busy_seconds += time.perf_counter() - self._busy_since
+            files, size = self._files, self._bytes
+        return {
+            'files': files,
+            'bytes': size,
+            'busy_seconds': round(busy_seconds, 3),
+            'bytes_per_second': round(size / busy_seconds, 1) if busy_seconds > 0 else 0,
+            'files_per_second': round(files / busy_seconds, 2) if busy_seconds > 0 else 0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _started(self):
+        with self._lock:
+            if self._active == 0:
+                self._busy_since = time.perf_counter()
+            self._active += 1
+
+    def _finished(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+                self._busy_since = None
+
+    def _record(self, size):
+        with self._lock:
+            self._files += 1
+            self._bytes += size
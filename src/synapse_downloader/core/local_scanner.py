@@ -0,0 +1,81 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .env import Env
+
+
+class LocalScanner:
+    """Lists and stats local directories and files in a dedicated pool of threads.
+
+    Directory listings and stats can block for a long time on network file systems (e.g. NFS). Running them in
+    threads keeps the event loop free and lets many directories be scanned at once. Directories that are waiting
+    to be compared can be prefetched so their listings are ready when a worker gets to them.
+    """
+    # Max number of prefetched listings to keep.
+    MAX_PREFETCH = 1000
+
+    def __init__(self, workers=None, max_prefetch=None):
+        """
+        Args:
+            workers: Number of directories or files to scan at once. Defaults to Env.SYNTOOLS_SCAN_WORKERS.
+            max_prefetch: Max number of prefetched listings to keep. Defaults to MAX_PREFETCH.
+        """
+        self.workers = max(1, workers or Env.SYNTOOLS_SCAN_WORKERS())
+        self.max_prefetch = max(0, self.MAX_PREFETCH if max_prefetch is None else max_prefetch)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scan')
+        self._prefetched = {}
+        self.dirs_scanned = 0
+
+    async def scandir(self, path):
+        """Lists a directory.
+
+        Args:
+            path: Path to the directory.
+
+        Returns:
+            List of os.DirEntry sorted by name. Empty if the directory does not exist.
+        """
+        future = self._prefetched.pop(path, None)
+        if future is None:
+            future = self._submit(path)
+        return await asyncio.wrap_future(future)
+
+    def prefetch(self, path):
+        """Starts listing a directory that will be scanned soon."""
+        if path in self._prefetched or len(self._prefetched) >= self.max_prefetch:
+            return
+        self._prefetched[path] = self._submit(path)
+
+    async def stat(self, path):
+        """Gets the os.stat_result of a local path or None if it does not exist."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._stat, path)
+
+    def close(self):
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, path):
+        self.dirs_scanned += 1
+        return self._executor.submit(self._scandir, path)
+
+    @staticmethod
+    def _scandir(path):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        for entry in entries:
+            # Caches the type on the entry so it does not need a stat on the event loop.
+            entry.is_dir()
+        entries.sort(key=lambda e: e.name)
+        return entries
+
+    @staticmethod
+    def _stat(path):
+        try:
+            return os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
@@ -0,0 +1,95 @@
+import os
+from stat import S_ISREG
+from .utils import Utils
+from .sqlite_store import SqliteStore
+
+
+class Md5Cache(SqliteStore):
+    """Persistent cache of local file MD5s.
+
+    Entries are keyed by the file's absolute path, size, modified time and inode so a cached MD5 is only
+    returned while the file is unchanged on disk.
+    """
+    FILENAME = 'md5_cache.sqlite'
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS md5_cache ('
+        ' abs_path TEXT PRIMARY KEY,'
+        ' size INTEGER NOT NULL,'
+        ' mtime_ns INTEGER NOT NULL,'
+        ' inode INTEGER NOT NULL,'
+        ' md5 TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS md5_cache_md5 ON md5_cache (md5)'
+    ]
+
+    def __init__(self, db_path=None):
+        super().__init__(db_path or os.path.join(Utils.app_cache_dir(), self.FILENAME))
+
+    @staticmethod
+    def stat(local_path):
+        """Gets the os.stat_result for a file or None if it is not a file."""
+        try:
+            stat = os.stat(local_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat if S_ISREG(stat.st_mode) else None
+
+    def get(self, local_path, stat=None):
+        """Gets the cached MD5 for a local file.
+
+        Args:
+            local_path: Absolute path to the file.
+            stat: The os.stat_result for the file. Read from disk if not set.
+
+        Returns:
+            The MD5 or None if the file is not cached or has changed since it was cached.
+        """
+        stat = stat or self.stat(local_path)
+        if stat is None:
+            return None
+
+        row = self._fetchone('SELECT size, mtime_ns, inode, md5 FROM md5_cache WHERE abs_path = ?', (local_path,))
+        if row and tuple(row[:3]) == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return row[3]
+        return None
+
+    def set(self, local_path, md5, stat=None):
+        """Caches the MD5 for a local file.
+
+        Args:
+            local_path: Absolute path to the file.
+            md5: The MD5 of the file.
+            stat: The os.stat_result for the file taken before the MD5 was computed. Read from disk if not set.
+
+        Returns:
+            None
+        """
+        stat = stat or self.stat(local_path)
+        if stat is None or md5 is None:
+            return
+
+        self._write('INSERT OR REPLACE INTO md5_cache (abs_path, size, mtime_ns, inode, md5) VALUES (?, ?, ?, ?, ?)',
+                    (local_path, stat.st_size, stat.st_mtime_ns, stat.st_ino, md5))
+
+    def find(self, md5, size, exclude=None):
+        """Finds a local file with an MD5 and size that has not changed since it was cached.
+
+        Args:
+            md5: The MD5 to find.
+            size: The size of the file.
+            exclude: Absolute path to ignore.
+
+        Returns:
+            The absolute path of the file or None.
+        """
+        rows = self._fetchall('SELECT abs_path, size, mtime_ns, inode FROM md5_cache WHERE md5 = ? AND size = ?',
+                              (md5, size))
+        for abs_path, size, mtime_ns, inode in rows:
+            if abs_path == exclude:
+                continue
+            stat = self.stat(abs_path)
+            if stat and (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (size, mtime_ns, inode):
+                return abs_path
+        return None
+
+    def remove(self, local_path):
+        self._write('DELETE FROM md5_cache WHERE abs_path = ?', (local_path,))
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from .utils import Utils
+
+
+class Metrics:
+    """Counters, latency histograms and throughput for a run.
+
+    Counters used by the downloader:
+        folders_listed: Folders whose children have been listed.
+        list_pages, entities_listed: Pages of children listed from Synapse and the folders and files in them.
+        files_queued, bytes_queued: Files sent to the transfer stage.
+        files_completed, bytes_completed: Files the transfer stage has finished with, whatever the outcome.
+        files_downloaded, bytes_downloaded: Files downloaded.
+        files_verified: Downloaded files whose MD5 was computed while downloading.
+        files_current, bytes_current: Files that were already downloaded.
+        files_deduplicated, bytes_deduplicated: Files created from identical local files instead of downloading them.
+        files_from_cache, bytes_from_cache: Files created from the DownloadCache.
+        files_cached: Downloaded files added to the DownloadCache.
+        files_unchanged: Current files skipped by an incremental download without being loaded or hashed.
+        files_excluded: Files that were excluded.
+        files_hashed, bytes_hashed: Local files that were hashed.
+        files_failed: Files that failed to download.
+        bytes_transferred: Bytes received, including ranges of large files that are still downloading.
+        local_dirs_scanned: Local directories listed by the LocalScanner when comparing.
+        compare_failures: Folders or files that could not be compared.
+        remote_path_lookups: Synapse paths of containers that were not visited in the run and had to be requested.
+        http_requests, http_connections_opened, http_connections_reused, http_connections_discarded, tls_handshakes:
+            Requests and connections of the ConnectionPool.
+
+    Gauges used by the downloader:
+        download_workers: The current limit on concurrent downloads.
+        hash_bytes_per_second: Bytes hashed per second while the HashService is busy.
+        http_pool_size: Number of connections the ConnectionPool keeps for each host.
+        <stage>_seconds: Seconds from the start of the run until each PipelineStage finished (e.g. listing_seconds).
+
+    Listing (discovery) is measured separately from transfers: listed_per_second is the rate of entities_listed and
+    listing_seconds is how long it took to list the whole tree.
+
+    Latencies are recorded by operation (list_children, load_batch, get_download_url, download_file, hash_file,
+    scan_dir).
+    """
+    # Seconds of samples used to calculate the current rates.
+    RATE_WINDOW = 60
+    # Upper bounds of the latency histogram buckets in seconds.
+    LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.counters = Counter()
+        self.gauges = {}
+        self.latencies = {}
+        self.stages = []
+        self._start_time = time.monotonic()
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, operation, seconds):
+        """Records the latency of an operation."""
+        with self._lock:
+            histogram = self.latencies.get(operation)
+            if histogram is None:
+                histogram = self.latencies[operation] = {
+                    'count': 0,
+                    'sum': 0.0,
+                    'max': 0.0,
+                    'buckets': [0] * (len(self.LATENCY_BUCKETS) + 1)
+                }
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            histogram['buckets'][bisect.bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+
+    @contextlib.contextmanager
+    def timer(self, operation):
+        """Records how long the block takes as the latency of the operation."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(operation, time.perf_counter() - start)
+
+    def track_stages(self, stages):
+        """Sets the PipelineStages whose queue depths are reported."""
+        self.stages = list(stages)
+
+    def stage_finished(self, stage):
+        """Records how long it took for a PipelineStage to finish."""
+        self.set_gauge('{0}_seconds'.format(stage.name), round(time.monotonic() - self._start_time, 3))
+
+    def snapshot(self):
+        """Gets the current values and rates.
+
+        Returns:
+            Dict that can be serialized to JSON.
+        """
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            latencies = {operation: dict(histogram, buckets=list(histogram['buckets']))
+                         for operation, histogram in self.latencies.items()}
+            self._samples.append((now, counters.get('bytes_transferred', 0), counters.get('files_completed', 0),
+                                  counters.get('entities_listed', 0)))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.RATE_WINDOW:
+                self._samples.popleft()
+            first_time, first_bytes, first_files, first_listed = self._samples[0]
+
+        elapsed = now - self._start_time
+        window = now - first_time
+        if window > 0:
+            bytes_per_second = (counters.get('bytes_transferred', 0) - first_bytes) / window
+            files_per_second = (counters.get('files_completed', 0) - first_files) / window
+            listed_per_second = (counters.get('entities_listed', 0) - first_listed) / window
+        else:
+            bytes_per_second = counters.get('bytes_transferred', 0) / elapsed if elapsed > 0 else 0
+            files_per_second = counters.get('files_completed', 0) / elapsed if elapsed > 0 else 0
+            listed_per_second = counters.get('entities_listed', 0) / elapsed if elapsed > 0 else 0
+
+        remaining_bytes = max(0, counters.get('bytes_queued', 0) - counters.get('bytes_completed', 0))
+        remaining_files = max(0, counters.get('files_queued', 0) - counters.get('files_completed', 0))
+        eta = None
+        if remaining_bytes and bytes_per_second > 0:
+            eta = remaining_bytes / bytes_per_second
+        elif remaining_files and files_per_second > 0:
+            eta = remaining_files / files_per_second
+        elif not remaining_files:
+            eta = 0
+
+        for histogram in latencies.values():
+            histogram['avg'] = histogram['sum'] / histogram['count'] if histogram['count'] else 0
+
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 1),
+            'counters': counters,
+            'gauges': gauges,
+            'bytes_per_second': round(bytes_per_second, 1),
+            'files_per_second': round(files_per_second, 2),
+            'listed_per_second': round(listed_per_second, 2),
+            'remaining_files': remaining_files,
+            'remaining_bytes': remaining_bytes,
+            'eta_seconds': None if eta is None else round(eta, 1),
+            'stages': [stage.stats() for stage in self.stages],
+            'latency_buckets': self.LATENCY_BUCKETS,
+            'latencies': latencies
+        }
+
+    def summary(self, snapshot=None):
+        """Gets a one line summary of the progress."""
+        snapshot = snapshot or self.snapshot()
+        counters = snapshot['counters']
+        eta = snapshot['eta_seconds']
+        summary = 'Progress: {0}/{1} files, {2} downloaded, {3}/s, {4} files/s, ETA: {5}, Queues: {6}'.format(
+            counters.get('files_completed', 0),
+            counters.get('files_queued', 0),
+            Utils.pretty_size(counters.get('bytes_downloaded', 0)),
+            Utils.pretty_size(snapshot['bytes_per_second']),
+            snapshot['files_per_second'],
+            'Unknown' if eta is None else timedelta(seconds=round(eta)),
+            ', '.join('{name}: {depth}'.format(**stage) for stage in snapshot['stages']) or 'None')
+        if 'listing_seconds' not in snapshot['gauges'] and counters.get('entities_listed'):
+            summary += ', Listed: {0} ({1}/s)'.format(counters['entities_listed'], snapshot['listed_per_second'])
+        if 'download_workers' in snapshot['gauges']:
+            summary += ', Download Workers: {0}'.format(snapshot['gauges']['download_workers'])
+        return summary
+
+    def save(self, path, snapshot=None):
+        """Writes the snapshot to a JSON file."""
+        path = Utils.expand_path(path)
+        Utils.ensure_dirs(os.path.dirname(path))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot or self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def prometheus(self):
+        """Gets the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, type, help, samples):
+            lines.append('# HELP syntools_{0} {1}'.format(name, help))
+            lines.append('# TYPE syntools_{0} {1}'.format(name, type))
+            for labels, value in samples:
+                labels = ','.join('{0}="{1}"'.format(k, v) for k, v in labels.items())
+                lines.append('syntools_{0}{1} {2}'.format(name, '{' + labels + '}' if labels else '', value))
+
+        for name, value in sorted(snapshot['counters'].items()):
+            metric('{0}_total'.format(name), 'counter', name.replace('_', ' ').capitalize() + '.', [({}, value)])
+        for name, value in sorted(snapshot['gauges'].items()):
+            metric(name, 'gauge', name.replace('_', ' ').capitalize() + '.', [({}, value)])
+        metric('bytes_per_second', 'gauge', 'Bytes received per second.', [({}, snapshot['bytes_per_second'])])
+        metric('files_per_second', 'gauge', 'Files completed per second.', [({}, snapshot['files_per_second'])])
+        metric('listed_per_second', 'gauge', 'Folders and files listed per second.',
+               [({}, snapshot['listed_per_second'])])
+        if snapshot['eta_seconds'] is not None:
+            metric('eta_seconds', 'gauge', 'Estimated seconds until the queued files complete.',
+                   [({}, snapshot['eta_seconds'])])
+        if snapshot['stages']:
+            metric('queue_depth', 'gauge', 'Items waiting in each stage.',
+                   [({'stage': s['name']}, s['depth']) for s in snapshot['stages']])
+            metric('active_workers', 'gauge', 'Workers processing an item in each stage.',
+                   [({'stage': s['name']}, s['active']) for s in snapshot['stages']])
+
+        if snapshot['latencies']:
+            lines.append('# HELP syntools_latency_seconds Latency of each operation.')
+            lines.append('# TYPE syntools_latency_seconds histogram')
+            for operation, histogram in sorted(snapshot['latencies'].items()):
+                cumulative = 0
+                for bound, count in zip(self.LATENCY_BUCKETS + ['+Inf'], histogram['buckets']):
+                    cumulative += count
+                    lines.append('syntools_latency_seconds_bucket{{operation="{0}",le="{1}"}} {2}'.format(
+                        operation, bound, cumulative))
+                lines.append('syntools_latency_seconds_sum{{operation="{0}"}} {1}'.format(operation, histogram['sum']))
+                lines.append('syntools_latency_seconds_count{{operation="{0}"}} {1}'.format(operation,
+                                                                                          histogram['count']))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+
+class PipelineStage:
+    """A queue and the pool of workers that process its items.
+
+    Stages are chained by having the handler of one stage put items on the next stage. A bounded stage
+    (maxsize > 0) blocks the stage feeding it when it is full.
+    Items are processed in the order they are put unless a priority function is set.
+    """
+
+    def __init__(self, name, handler, worker_count, maxsize=0, priority=None):
+        """
+        Args:
+            name: Name of the stage used in logging.
+            handler: Coroutine function called with each item. Must handle its own errors.
+            worker_count: Number of workers.
+            maxsize: Max number of items that can be queued. 0 for unbounded.
+            priority: Function that gets the sort key for an item. Items with lower keys are processed first.
+                Keys must be unique.
+        """
+        self.name = name
+        self.handler = handler
+        self.worker_count = max(1, worker_count)
+        self.maxsize = maxsize
+        self.priority = priority
+        self.queue = None
+        self.workers = []
+        self.processed = 0
+        self.max_depth = 0
+        self.active = 0
+
+    @property
+    def depth(self):
+        """Number of items waiting in the queue."""
+        return self.queue.qsize() if self.queue else 0
+
+    def start(self):
+        if self.priority:
+            self.queue = asyncio.PriorityQueue(maxsize=self.maxsize)
+        else:
+            self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.processed = 0
+        self.max_depth = 0
+        self.active = 0
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        logging.debug('{0} Workers: {1}, Queue Size: {2}'.format(self.name.title(),
+                                                                 self.worker_count,
+                                                                 self.maxsize or 'Unbounded'))
+        return self
+
+    async def put(self, item):
+        if self.priority:
+            await self.queue.put((self.priority(item), item))
+        else:
+            await self.queue.put(item)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def put_many(self, items):
+        """Puts a batch of items. Only waits for space when the queue is full."""
+        for item in items:
+            if self.priority:
+                item = (self.priority(item), item)
+            if self.queue.full():
+                await self.queue.put(item)
+            else:
+                self.queue.put_nowait(item)
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def join(self):
+        await self.queue.join()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+
+    def stats(self):
+        """Gets the current queue depth and totals for the stage."""
+        return {
+            'name': self.name,
+            'workers': self.worker_count,
+            'active': self.active,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'processed': self.processed
+        }
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            if self.priority:
+                item = item[1]
+            self.active += 1
+            try:
+                await self.handler(item)
+            except Exception as ex:
+                logging.exception('{0} Worker Error: {1}'.format(self.name.title(), ex))
+            finally:
+                self.active -= 1
+                self.processed += 1
+                self.queue.task_done()
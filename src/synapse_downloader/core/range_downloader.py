@@ -0,0 +1,322 @@
+import os
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from .env import Env
+from .utils import Utils
+from .exceptions import SynToolsError, FileSizeMismatchError, Md5MismatchError
+
+
+class RangeDownloader:
+    """Downloads a file in byte ranges that are fetched concurrently.
+
+    Each range is written into a preallocated temporary file at its offset as it is received, so no range is held
+    in memory. The ranges are hashed in order as they complete by reading them back from the file (usually from the
+    page cache) so the MD5 is known as soon as the last range is written.
+    The temporary file is moved to the download path once the size and MD5 are verified.
+    """
+    # Size of each read from a response.
+    READ_SIZE = 1 * Utils.MB
+    # Seconds to wait for the server to send data.
+    TIMEOUT = 60
+    # Suffix of the temporary file.
+    PARTIAL_SUFFIX = '.syntools.part'
+    # URLs are refreshed if they expire within this many seconds.
+    URL_EXPIRE_BUFFER = 60
+
+    def __init__(self, get_url, download_path, content_size, expected_md5=None, chunk_size=None,
+                 max_parallel=None, retries=None, progress=None, throttled=None, session=None):
+        """
+        Args:
+            get_url: Coroutine function that returns a pre-signed URL for the file. Called again when the
+                URL expires.
+            download_path: Path to save the file to.
+            content_size: The size of the file.
+            expected_md5: The MD5 of the file. Not verified if not set.
+            chunk_size: The size of each range. Defaults to Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE.
+            max_parallel: Max number of ranges to fetch at once. Defaults to Env.SYNTOOLS_DOWNLOAD_CHUNK_WORKERS.
+            retries: Number of times to retry each range. Defaults to Env.SYNTOOLS_DOWNLOAD_RETRIES.
+            progress: Function called with the number of bytes in each range as it completes.
+            throttled: Function called when the server throttles a range request.
+            session: requests Session to fetch the ranges with, e.g. one from a ConnectionPool. A Session with a
+                connection for each range worker is created for the download when not set.
+        """
+        self.get_url = get_url
+        self.download_path = download_path
+        self.content_size = content_size
+        self.expected_md5 = expected_md5
+        self.chunk_size = chunk_size or Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE() * Utils.MB
+        self.max_parallel = max(1, max_parallel or Env.SYNTOOLS_DOWNLOAD_CHUNK_WORKERS())
+        self.retries = Env.SYNTOOLS_DOWNLOAD_RETRIES() if retries is None else retries
+        self.progress = progress
+        self.throttled = throttled
+        self.partial_path = self.download_path + self.PARTIAL_SUFFIX
+        self.md5 = None
+
+        self._url = None
+        self._url_expires = None
+        self._url_lock = None
+        self.session = session
+        self._session = None
+        self._fd = None
+        self._write_lock = threading.Lock()
+        self._ranges = []
+        self._next_range = 0
+        self._hash_index = 0
+        self._completed = set()
+        self._hashing = False
+        self._window = None
+        self._error = None
+        self._stopped = False
+
+    @classmethod
+    def should_use(cls, content_size, chunk_size=None):
+        """Gets if a file is large enough to be downloaded in ranges."""
+        chunk_size = chunk_size or Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE() * Utils.MB
+        return content_size is not None and content_size > chunk_size
+
+    async def download(self):
+        """Downloads the file.
+
+        Returns:
+            The download path.
+        """
+        Utils.ensure_dirs(os.path.dirname(self.download_path))
+        self._ranges = [(start, min(start + self.chunk_size, self.content_size) - 1)
+                        for start in range(0, self.content_size, self.chunk_size)]
+        self._next_range = 0
+        self._hash_index = 0
+        self._completed = set()
+        self._hashing = False
+        self._error = None
+        self._stopped = False
+        self._url_lock = asyncio.Lock()
+        self._window = asyncio.Condition()
+        md5 = hashlib.md5()
+
+        worker_count = min(self.max_parallel, len(self._ranges)) or 1
+        executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='range-download')
+        hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='range-hash')
+        self._session = self.session
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=worker_count)
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+        try:
+            self._fd = os.open(self.partial_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+            try:
+                self._preallocate()
+                workers = [asyncio.create_task(self._worker(executor, hash_executor, md5))
+                           for _ in range(worker_count)]
+                await asyncio.gather(*workers, return_exceptions=True)
+                if self._error:
+                    raise self._error
+            finally:
+                self._stopped = True
+                # Wait for any running range to stop before the file is closed.
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, executor.shutdown, True)
+                await loop.run_in_executor(None, hash_executor.shutdown, True)
+                if self._session is not self.session:
+                    self._session.close()
+                os.close(self._fd)
+                self._fd = None
+
+            self.md5 = md5.hexdigest()
+            size = os.path.getsize(self.partial_path)
+            if size != self.content_size:
+                raise FileSizeMismatchError(
+                    'Downloaded size: {0} does not match expected size: {1}.'.format(size, self.content_size))
+            if self.expected_md5 and self.md5 != self.expected_md5:
+                raise Md5MismatchError(
+                    'Downloaded MD5: {0} does not match expected MD5: {1}.'.format(self.md5, self.expected_md5))
+            os.replace(self.partial_path, self.download_path)
+        finally:
+            if os.path.exists(self.partial_path):
+                os.remove(self.partial_path)
+
+        return self.download_path
+
+    def _preallocate(self):
+        if self.content_size > 0 and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self._fd, 0, self.content_size)
+                return
+            except OSError:
+                # Not supported by the file system.
+                pass
+        os.ftruncate(self._fd, self.content_size)
+
+    async def _worker(self, executor, hash_executor, md5):
+        try:
+            while True:
+                async with self._window:
+                    # Limit how far ahead of the hash the ranges can get so the unhashed ranges are still in the
+                    # page cache when they are read back.
+                    await self._window.wait_for(
+                        lambda: self._error is not None or
+                                self._next_range >= len(self._ranges) or
+                                self._next_range < self._hash_index + self.max_parallel * 2)
+                    if self._error is not None or self._next_range >= len(self._ranges):
+                        return
+                    index = self._next_range
+                    self._next_range += 1
+
+                size = await self._fetch_range(executor, index)
+                if self.progress:
+                    self.progress(size)
+
+                async with self._window:
+                    self._completed.add(index)
+                    if self._hashing:
+                        # The worker that is hashing will pick it up.
+                        continue
+                    self._hashing = True
+
+                await self._hash_completed(hash_executor, md5)
+        except Exception as ex:
+            async with self._window:
+                if self._error is None:
+                    self._error = ex
+                self._window.notify_all()
+
+    async def _hash_completed(self, hash_executor, md5):
+        """Hashes the completed ranges that are next in order."""
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._window:
+                if self._hash_index not in self._completed or self._error is not None:
+                    self._hashing = False
+                    return
+                self._completed.remove(self._hash_index)
+                start, end = self._ranges[self._hash_index]
+            await loop.run_in_executor(hash_executor, self._update_md5, md5, start, end)
+            async with self._window:
+                self._hash_index += 1
+                self._window.notify_all()
+
+    def _update_md5(self, md5, start, end):
+        """Hashes a range by reading it back from the file. Runs in the hash executor."""
+        offset = start
+        while offset <= end:
+            data = self._pread(min(self.READ_SIZE, end + 1 - offset), offset)
+            if not data:
+                raise _IncompleteRangeError()
+            md5.update(data)
+            offset += len(data)
+
+    async def _fetch_range(self, executor, index):
+        loop = asyncio.get_running_loop()
+        start, end = self._ranges[index]
+        attempt = 0
+        url = await self._get_url()
+        while True:
+            try:
+                return await loop.run_in_executor(executor, self._read_range, url, start, end)
+            except (_UrlExpiredError, _ThrottledError, _IncompleteRangeError) as ex:
+                error = ex
+            except requests.RequestException as ex:
+                if not self._is_retryable(ex):
+                    raise SynToolsError('Failed to download bytes {0}-{1}: {2}'.format(start, end, ex)) from ex
+                error = ex
+
+            if isinstance(error, _ThrottledError) and self.throttled:
+                self.throttled()
+
+            attempt += 1
+            if attempt > self.retries:
+                raise SynToolsError('Failed to download bytes {0}-{1}: {2}'.format(start, end, error)) from error
+
+            if isinstance(error, _UrlExpiredError):
+                url = await self._get_url(expired_url=url)
+            else:
+                await asyncio.sleep(min(2 ** (attempt - 1), 30))
+                url = await self._get_url()
+
+    @staticmethod
+    def _is_retryable(error):
+        """Gets if a request error is temporary: a connection error, a timeout or a 5xx response.
+        Other 4xx responses (e.g. 404) fail right away.
+        """
+        if isinstance(error, requests.HTTPError):
+            status_code = getattr(error.response, 'status_code', None)
+            return status_code is None or status_code >= 500
+        return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+    async def _get_url(self, expired_url=None):
+        """Gets the current URL. Gets a new URL if the current URL is about to expire or is expired_url."""
+        async with self._url_lock:
+            now = datetime.utcnow()
+            if self._url is None or \
+                    (expired_url is not None and expired_url == self._url) or \
+                    now + timedelta(seconds=self.URL_EXPIRE_BUFFER) >= self._url_expires:
+                self._url = await self.get_url()
+                self._url_expires = Utils.pre_signed_url_expires(self._url, now=now)
+            return self._url
+
+    def _read_range(self, url, start, end):
+        """Fetches a range and writes it to the file. Runs in the executor.
+
+        Returns:
+            The number of bytes written.
+        """
+        headers = {'Range': 'bytes={0}-{1}'.format(start, end)}
+        with self._session.get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            if response.status_code == 403:
+                raise _UrlExpiredError()
+            if response.status_code in Utils.THROTTLE_STATUS_CODES:
+                raise _ThrottledError(response)
+            if response.status_code != 206:
+                response.raise_for_status()
+                raise SynToolsError('Server does not support range requests.')
+
+            offset = start
+            for piece in response.iter_content(chunk_size=self.READ_SIZE):
+                if self._stopped:
+                    raise SynToolsError('Download stopped.')
+                if offset + len(piece) > end + 1:
+                    raise _IncompleteRangeError()
+                self._pwrite(piece, offset)
+                offset += len(piece)
+
+            if offset != end + 1:
+                raise _IncompleteRangeError()
+            return offset - start
+
+    def _pwrite(self, data, offset):
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(self._fd, data, offset)
+                data = data[written:]
+                offset += written
+        else:
+            with self._write_lock:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                os.write(self._fd, data)
+
+    def _pread(self, size, offset):
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        with self._write_lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, size)
+
+
+class _UrlExpiredError(SynToolsError):
+    """The pre-signed URL has expired."""
+
+
+class _ThrottledError(SynToolsError):
+    """The server is throttling requests."""
+
+    def __init__(self, response):
+        super().__init__('HTTP {0}'.format(response.status_code))
+        self.response = response
+
+
+class _IncompleteRangeError(SynToolsError, IOError):
+    """The server sent more or less than the requested range."""
@@ -0,0 +1,74 @@
+import asyncio
+from collections import OrderedDict
+
+
+class RemotePathCache:
+    """LRU cache of the Synapse paths of containers for a single run.
+
+    Paths are added as the containers are visited so most lookups never call Synapse. Lookups for a path that
+    is not cached are coalesced: concurrent lookups of the same ID wait for the first one instead of making
+    their own requests. Failed lookups are not cached.
+    """
+    # Max number of paths to keep.
+    MAX_SIZE = 10000
+
+    def __init__(self, max_size=None):
+        self.max_size = max(1, max_size or self.MAX_SIZE)
+        self._paths = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.loads = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._paths
+
+    def set(self, entity_id, path):
+        """Adds or updates the path of a container."""
+        self._paths[entity_id] = path
+        self._paths.move_to_end(entity_id)
+        while len(self._paths) > self.max_size:
+            self._paths.popitem(last=False)
+
+    async def get(self, entity_id, load):
+        """Gets the path of a container.
+
+        Args:
+            entity_id: The ID of the container.
+            load: Coroutine function called with entity_id to get the path when it is not cached.
+
+        Returns:
+            The path.
+        """
+        if entity_id in self._paths:
+            self.hits += 1
+            self._paths.move_to_end(entity_id)
+            return self._paths[entity_id]
+
+        pending = self._pending.get(entity_id)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        pending = self._pending[entity_id] = asyncio.get_running_loop().create_future()
+        try:
+            self.loads += 1
+            path = await load(entity_id)
+            self.set(entity_id, path)
+            pending.set_result(path)
+            return path
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as ex:
+            pending.set_exception(ex)
+            # Marks the exception as retrieved when there are no waiters.
+            pending.exception()
+            raise
+        finally:
+            self._pending.pop(entity_id, None)
+
+    def clear(self):
+        self._paths.clear()
@@ -0,0 +1,151 @@
+import os
+import json
+import hashlib
+from .utils import Utils
+from .sqlite_store import SqliteStore
+
+
+class RunJournal(SqliteStore):
+    """Journal of the progress of a download so an interrupted run can be resumed.
+
+    A journal is kept for each starting entity and local download path. It records:
+        - The children of each folder that has been listed.
+        - The folders whose entire subtree has been downloaded and verified.
+        - Each file that has been downloaded or verified as current (ID, version, MD5, size and local path).
+        - A hash of the excludes and includes of the run. Excluded items count toward their folder's completion,
+          so a journal is only resumed with the same excludes and includes.
+    """
+    DIRNAME = 'journals'
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS listings ('
+        ' parent_id TEXT NOT NULL,'
+        ' id TEXT NOT NULL,'
+        ' name TEXT NOT NULL,'
+        ' type TEXT NOT NULL,'
+        ' version_number INTEGER,'
+        ' PRIMARY KEY (parent_id, id))',
+        'CREATE TABLE IF NOT EXISTS folders ('
+        ' id TEXT PRIMARY KEY,'
+        ' listed INTEGER NOT NULL DEFAULT 0,'
+        ' completed INTEGER NOT NULL DEFAULT 0)',
+        'CREATE TABLE IF NOT EXISTS files ('
+        ' id TEXT PRIMARY KEY,'
+        ' version_number INTEGER,'
+        ' md5 TEXT,'
+        ' size INTEGER,'
+        ' local_path TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS settings ('
+        ' name TEXT PRIMARY KEY,'
+        ' value TEXT)'
+    ]
+
+    def __init__(self, starting_entity_id, download_path, db_path=None):
+        self.starting_entity_id = starting_entity_id
+        self.download_path = download_path
+        super().__init__(db_path or self.default_path(starting_entity_id, download_path))
+
+    @classmethod
+    def default_path(cls, starting_entity_id, download_path):
+        """Gets the path to the journal for a starting entity and download path."""
+        path_hash = hashlib.sha1(Utils.expand_path(download_path).encode()).hexdigest()[:12]
+        filename = '{0}_{1}.sqlite'.format(starting_entity_id.lower(), path_hash)
+        return os.path.join(Utils.app_dir(), cls.DIRNAME, filename)
+
+    def clear(self):
+        """Removes all entries from the journal."""
+        with self._lock:
+            for table in ['listings', 'folders', 'files', 'settings']:
+                self._conn.execute('DELETE FROM {0}'.format(table))
+            self.commit()
+
+    @staticmethod
+    def filters_hash(excludes=None, includes=None):
+        """Gets a hash of the excludes and includes of a run. The order of the patterns does not matter."""
+        filters = {'excludes': sorted(excludes or []), 'includes': sorted(includes or [])}
+        return hashlib.sha1(json.dumps(filters).encode()).hexdigest()
+
+    def set_filters(self, excludes=None, includes=None):
+        """Records the excludes and includes of the run."""
+        self._write('INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)',
+                    ('filters', self.filters_hash(excludes, includes)))
+
+    def matches_filters(self, excludes=None, includes=None):
+        """Gets if the journal was recorded with the same excludes and includes.
+        False if it was recorded without them.
+        """
+        row = self._fetchone('SELECT value FROM settings WHERE name = ?', ('filters',))
+        return bool(row) and row[0] == self.filters_hash(excludes, includes)
+
+    def folder_listed(self, folder_id, children):
+        """Records the children of a folder.
+
+        Args:
+            folder_id: The ID of the folder.
+            children: List of dicts in the format returned by getChildren.
+
+        Returns:
+            None
+        """
+        rows = [(folder_id, c['id'], c['name'], c['type'], c.get('versionNumber')) for c in children]
+        with self._lock:
+            self._conn.execute('DELETE FROM listings WHERE parent_id = ?', (folder_id,))
+            self._conn.executemany(
+                'INSERT INTO listings (parent_id, id, name, type, version_number) VALUES (?, ?, ?, ?, ?)', rows)
+            self._conn.execute(
+                'INSERT INTO folders (id, listed) VALUES (?, 1) ON CONFLICT(id) DO UPDATE SET listed = 1', (folder_id,))
+            self._written(len(rows) + 1)
+
+    def get_listing(self, folder_id):
+        """Gets the recorded children of a folder.
+
+        Returns:
+            List of dicts in the format returned by getChildren or None if the folder has not been listed.
+        """
+        row = self._fetchone('SELECT listed FROM folders WHERE id = ?', (folder_id,))
+        if not row or not row[0]:
+            return None
+
+        rows = self._fetchall('SELECT id, name, type, version_number FROM listings WHERE parent_id = ? ORDER BY rowid',
+                              (folder_id,))
+        return [{'id': r[0], 'name': r[1], 'type': r[2], 'versionNumber': r[3]} for r in rows]
+
+    def folder_completed(self, folder_id):
+        """Records that every item under a folder has been downloaded and verified."""
+        self._write('INSERT INTO folders (id, completed) VALUES (?, 1) ON CONFLICT(id) DO UPDATE SET completed = 1',
+                    (folder_id,))
+
+    def is_folder_completed(self, folder_id):
+        row = self._fetchone('SELECT completed FROM folders WHERE id = ?', (folder_id,))
+        return bool(row and row[0])
+
+    def file_verified(self, file_id, version_number, md5, size, local_path):
+        """Records a file that has been downloaded or verified as current."""
+        self._write('INSERT OR REPLACE INTO files (id, version_number, md5, size, local_path) VALUES (?, ?, ?, ?, ?)',
+                    (file_id, version_number, md5, size, local_path))
+
+    def get_verified_file(self, file_id):
+        """Gets the recorded file or None.
+
+        Returns:
+            Dict with the keys: id, version_number, md5, size and local_path.
+        """
+        row = self._fetchone('SELECT id, version_number, md5, size, local_path FROM files WHERE id = ?', (file_id,))
+        if row:
+            return dict(zip(['id', 'version_number', 'md5', 'size', 'local_path'], row))
+        return None
+
+    def is_file_current(self, file_id, version_number):
+        """Gets if a file was verified at a version and is still the same size on disk.
+
+        Returns:
+            The recorded local path or None.
+        """
+        entry = self.get_verified_file(file_id)
+        if entry is None or version_number is None or entry['version_number'] != version_number:
+            return None
+
+        local_path = entry['local_path']
+        if entry['size'] is None or not os.path.isfile(local_path) or os.path.getsize(local_path) != entry['size']:
+            return None
+
+        return local_path
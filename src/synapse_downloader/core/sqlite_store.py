@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import sqlite3
+import threading
+from .utils import Utils
+
+
+class SqliteStore:
+    """Base class for the SQLite databases used to persist state between runs.
+
+    Writes are committed in batches of COMMIT_EVERY, and on close. Pending writes are also committed by a timer
+    COMMIT_INTERVAL seconds after the first one so a write transaction is never left open while the store is idle,
+    which would lock the database for other processes.
+    The connection can be used from the event loop and executor threads.
+    """
+    COMMIT_EVERY = 500
+    COMMIT_INTERVAL = 1
+    SCHEMA = []
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        Utils.ensure_dirs(os.path.dirname(self.db_path))
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._commit_timer = None
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in self.SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._written(1)
+
+    def _written(self, count):
+        self._pending += count
+        if self._pending >= self.COMMIT_EVERY or time.monotonic() - self._last_commit >= self.COMMIT_INTERVAL:
+            self.commit()
+        elif self._commit_timer is None:
+            self._commit_timer = threading.Timer(self.COMMIT_INTERVAL, self._commit_pending)
+            self._commit_timer.daemon = True
+            self._commit_timer.start()
+
+    def commit(self):
+        with self._lock:
+            if self._commit_timer is not None:
+                self._commit_timer.cancel()
+                self._commit_timer = None
+            if self._conn is not None:
+                self._conn.commit()
+            self._pending = 0
+            self._last_commit = time.monotonic()
+
+    def _commit_pending(self):
+        """Commits the pending writes. Runs in the timer thread."""
+        try:
+            with self._lock:
+                if self._commit_timer is threading.current_thread():
+                    self._commit_timer = None
+                if self._pending and self._conn is not None:
+                    self.commit()
+        except sqlite3.Error as ex:
+            logging.warning('Failed to commit: {0}. {1}'.format(self.db_path, ex))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self.commit()
+                self._conn.close()
+                self._conn = None
+
+    def delete(self):
+        """Closes and deletes the database."""
+        self.close()
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
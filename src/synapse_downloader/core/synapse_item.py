@@ -1,9 +1,28 @@
 import os
+import sys
+import asyncio
+from datetime import datetime, timedelta
 from synapsis import Synapsis
 import synapseclient as syn
+from .utils import Utils
+from .hash_service import HashService
 
 
 class SynapseItem:
+    """A Synapse Project, Folder or File and where it lives locally.
+
+    Items are kept for every entity in a download or compare so they use __slots__ and share (intern) their
+    root paths. local.abs_path and local.dirname are computed once and reset when the name, filename or root paths
+    change. synapse_path is a join of the shared root path and the name so it is not cached.
+    """
+    __slots__ = ('type', 'id', 'parent_id', '_name', '_local_root_path', '_synapse_root_path', 'version_number',
+                 'file_handle_id', '_filename', 'content_size', 'content_md5', 'file_handle_type',
+                 'pre_signed_url', 'pre_signed_url_expires', '_local_abs_path', '_local_dirname')
+
+    # Max number of files to load in a single batch request.
+    LOAD_BATCH_SIZE = 50
+    # Pre-signed URLs are not used if they expire within this many seconds.
+    PRE_SIGNED_URL_EXPIRE_BUFFER = 60
 
     def __init__(self,
                  type,
@@ -11,18 +30,25 @@ class SynapseItem:
                  parent_id=None,
                  name=None,
                  local_root_path=None,
-                 synapse_root_path=None):
+                 synapse_root_path=None,
+                 version_number=None):
 
+        self._local_abs_path = None
+        self._local_dirname = None
         self.type = type if isinstance(type, Synapsis.ConcreteTypes) else None
         self.id = id
         self.parent_id = parent_id
         self.name = name
         self.local_root_path = local_root_path
         self.synapse_root_path = synapse_root_path
+        self.version_number = version_number
         self.file_handle_id = None
         self.filename = None
         self.content_size = None
         self.content_md5 = None
+        self.file_handle_type = None
+        self.pre_signed_url = None
+        self.pre_signed_url_expires = None
 
         if isinstance(type, syn.Entity):
             entity = type
@@ -33,6 +59,8 @@ class SynapseItem:
                 self.parent_id = entity.id if self.type.is_project else entity.parentId
             if self.name is None:
                 self.name = entity.name
+            if self.version_number is None:
+                self.version_number = entity.get('versionNumber')
 
             if isinstance(entity, syn.File):
                 self.set_file_handle(entity.get('_file_handle'))
@@ -46,7 +74,49 @@ class SynapseItem:
         assert self.local_root_path is not None
         assert self.synapse_root_path is not None
 
-        self.local = self.Local(self)
+    @property
+    def local(self):
+        return self.Local(self)
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+        self._reset_paths()
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        self._filename = value
+        self._reset_paths()
+
+    @property
+    def local_root_path(self):
+        return self._local_root_path
+
+    @local_root_path.setter
+    def local_root_path(self, value):
+        self._local_root_path = sys.intern(value) if isinstance(value, str) else value
+        self._reset_paths()
+
+    @property
+    def synapse_root_path(self):
+        return self._synapse_root_path
+
+    @synapse_root_path.setter
+    def synapse_root_path(self, value):
+        self._synapse_root_path = sys.intern(value) if isinstance(value, str) else value
+        self._reset_paths()
+
+    def _reset_paths(self):
+        self._local_abs_path = None
+        self._local_dirname = None
 
     @property
     def exists(self):
@@ -66,11 +136,11 @@ class SynapseItem:
 
     @property
     def synapse_path(self):
-        name = self.name
-        if self.is_file and self.filename:
-            name = self.filename
+        name = self._name
+        if self.is_file and self._filename:
+            name = self._filename
 
-        segments = [s for s in [self.synapse_root_path, name] if s]
+        segments = [s for s in [self._synapse_root_path, name] if s]
         return '/'.join(segments)
 
     @property
@@ -88,6 +158,55 @@ class SynapseItem:
 
         return self
 
+    @classmethod
+    async def load_batch(cls, synapse_items, pre_signed_urls=False):
+        """Loads the file handles for multiple SynapseItems.
+
+        The dataFileHandleId for each file comes from its entity, then the file handles for up to
+        LOAD_BATCH_SIZE files are fetched in a single request. Items that fail to load are left unloaded
+        so SynapseItem.load can retry them. Items that are already loaded only have their pre-signed URLs fetched.
+
+        Args:
+            synapse_items: The SynapseItems to load.
+            pre_signed_urls: True to also fetch the pre-signed download URLs.
+
+        Returns:
+            The SynapseItems.
+        """
+        files = [item for item in synapse_items
+                 if item.is_file and item.id is not None and
+                 (not item.is_loaded or (pre_signed_urls and not item.has_pre_signed_url))]
+        for index in range(0, len(files), cls.LOAD_BATCH_SIZE):
+            batch = files[index:index + cls.LOAD_BATCH_SIZE]
+            # Loaded items already have their file handle ID and only need the pre-signed URL.
+            requested = [(item, item.file_handle_id) for item in batch if item.is_loaded]
+            unloaded = [item for item in batch if not item.is_loaded]
+            entities = await asyncio.gather(
+                *[Synapsis.Chain.Synapse.restGET('/entity/{0}'.format(item.id)) for item in unloaded],
+                return_exceptions=True)
+
+            for item, entity in zip(unloaded, entities):
+                if isinstance(entity, dict) and entity.get('dataFileHandleId'):
+                    if item.version_number is None:
+                        item.version_number = entity.get('versionNumber')
+                    requested.append((item, entity['dataFileHandleId']))
+
+            if not requested:
+                continue
+
+            results = await Synapsis.Chain.Utils.get_filehandles(
+                [(item.id, file_handle_id) for item, file_handle_id in requested],
+                include_pre_signed_urls=pre_signed_urls)
+            results_by_id = {str(r.get('fileHandleId')): r for r in results}
+            for item, file_handle_id in requested:
+                result = results_by_id.get(str(file_handle_id))
+                if result and not result.get('failureCode') and result.get('fileHandle'):
+                    item.set_file_handle(result['fileHandle'])
+                    if result.get('preSignedURL'):
+                        item.set_pre_signed_url(result['preSignedURL'])
+
+        return synapse_items
+
     def set_file_handle(self, file_handle):
         if not self.is_file:
             raise Exception('File Handle can only be set on files.')
@@ -96,8 +215,24 @@ class SynapseItem:
         self.filename = filehandle.get('fileName')
         self.content_md5 = filehandle.get('contentMd5')
         self.content_size = filehandle.get('contentSize')
+        self.file_handle_type = filehandle.get('concreteType')
+
+    def set_pre_signed_url(self, pre_signed_url):
+        self.pre_signed_url = pre_signed_url
+        self.pre_signed_url_expires = Utils.pre_signed_url_expires(pre_signed_url)
+
+    @property
+    def has_pre_signed_url(self):
+        """Gets if the item has a pre-signed URL that will not expire soon."""
+        if self.pre_signed_url is None or self.pre_signed_url_expires is None:
+            return False
+        buffer = timedelta(seconds=self.PRE_SIGNED_URL_EXPIRE_BUFFER)
+        return datetime.utcnow() + buffer < self.pre_signed_url_expires
 
     class Local:
+        """The local side of a SynapseItem. The paths are cached on the SynapseItem."""
+        __slots__ = ('synapse_item',)
+
         def __init__(self, synapse_item):
             self.synapse_item = synapse_item
 
@@ -115,22 +250,26 @@ class SynapseItem:
 
         @property
         def abs_path(self):
-            if self.synapse_item.is_project:
-                return os.path.abspath(self.synapse_item.local_root_path)
+            item = self.synapse_item
+            if item._local_abs_path is None:
+                if item.is_project:
+                    item._local_abs_path = os.path.abspath(item.local_root_path)
+                else:
+                    name = item.name
 
-            name = self.synapse_item.name
+                    if item.is_file and item.filename is not None:
+                        name = item.filename
 
-            if self.synapse_item.is_file and self.synapse_item.filename is not None:
-                name = self.synapse_item.filename
-
-            if name is not None:
-                return os.path.abspath(os.path.join(self.synapse_item.local_root_path, name))
-
-            return None
+                    if name is not None:
+                        item._local_abs_path = os.path.abspath(os.path.join(item.local_root_path, name))
+            return item._local_abs_path
 
         @property
         def dirname(self):
-            return os.path.dirname(self.abs_path)
+            item = self.synapse_item
+            if item._local_dirname is None:
+                item._local_dirname = sys.intern(os.path.dirname(self.abs_path))
+            return item._local_dirname
 
         @property
         def name(self):
@@ -145,10 +284,10 @@ class SynapseItem:
         @property
         def content_md5(self):
             if self.is_file:
-                return Synapsis.Utils.md5sum(self.abs_path)
+                return HashService.default().md5_sync(self.abs_path)
             return None
 
         async def content_md5_async(self):
             if self.is_file:
-                return await Synapsis.Chain.Utils.md5sum(self.abs_path)
+                return await HashService.default().md5(self.abs_path)
             return None
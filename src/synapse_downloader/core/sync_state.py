@@ -0,0 +1,102 @@
+import os
+import hashlib
+from .utils import Utils
+from .sqlite_store import SqliteStore
+
+
+class SyncState(SqliteStore):
+    """State of the files synced by incremental downloads.
+
+    A state is kept for each starting entity and local download path. It records each file that has been downloaded
+    or verified as current with its version and modifiedOn in Synapse and the size and modified time of the local
+    file. A file listed again with the same version and modifiedOn whose local file has not changed is unchanged
+    and does not need to be loaded or hashed.
+    """
+    DIRNAME = 'sync_state'
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS files ('
+        ' id TEXT PRIMARY KEY,'
+        ' version_number INTEGER,'
+        ' modified_on TEXT NOT NULL,'
+        ' md5 TEXT,'
+        ' size INTEGER NOT NULL,'
+        ' mtime_ns INTEGER NOT NULL,'
+        ' local_path TEXT NOT NULL)'
+    ]
+    COLUMNS = ['id', 'version_number', 'modified_on', 'md5', 'size', 'mtime_ns', 'local_path']
+
+    def __init__(self, starting_entity_id, download_path, db_path=None):
+        self.starting_entity_id = starting_entity_id
+        self.download_path = download_path
+        super().__init__(db_path or self.default_path(starting_entity_id, download_path))
+
+    @classmethod
+    def default_path(cls, starting_entity_id, download_path):
+        """Gets the path to the state for a starting entity and download path."""
+        path_hash = hashlib.sha1(Utils.expand_path(download_path).encode()).hexdigest()[:12]
+        filename = '{0}_{1}.sqlite'.format(starting_entity_id.lower(), path_hash)
+        return os.path.join(Utils.app_dir(), cls.DIRNAME, filename)
+
+    def clear(self):
+        """Removes all entries from the state."""
+        with self._lock:
+            self._conn.execute('DELETE FROM files')
+            self.commit()
+
+    def file_synced(self, file_id, version_number, modified_on, md5, local_path):
+        """Records a file that has been downloaded or verified as current.
+
+        Args:
+            file_id: The Synapse ID of the file.
+            version_number: The version of the file.
+            modified_on: The modifiedOn of the file entity.
+            md5: The MD5 of the file.
+            local_path: Absolute path to the local file.
+
+        Returns:
+            None
+        """
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return
+        self._write('INSERT OR REPLACE INTO files ({0}) VALUES (?, ?, ?, ?, ?, ?, ?)'.format(', '.join(self.COLUMNS)),
+                    (file_id, version_number, modified_on, md5, stat.st_size, stat.st_mtime_ns, local_path))
+
+    def get_file(self, file_id):
+        """Gets the recorded file or None.
+
+        Returns:
+            Dict with the keys: id, version_number, modified_on, md5, size, mtime_ns and local_path.
+        """
+        row = self._fetchone('SELECT {0} FROM files WHERE id = ?'.format(', '.join(self.COLUMNS)), (file_id,))
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def unchanged_file(self, file_id, version_number, modified_on, local_dirname):
+        """Gets the recorded file if it has not changed in Synapse or locally since it was synced.
+
+        Args:
+            file_id: The Synapse ID of the file.
+            version_number: The version of the file in the listing.
+            modified_on: The modifiedOn of the file in the listing.
+            local_dirname: The directory the file is downloaded to. The file was moved if this changed.
+
+        Returns:
+            Dict with the keys of get_file or None.
+        """
+        if version_number is None or not modified_on:
+            return None
+        entry = self.get_file(file_id)
+        if entry is None or (entry['version_number'], entry['modified_on']) != (version_number, modified_on):
+            return None
+
+        local_path = entry['local_path']
+        if os.path.dirname(local_path) != os.path.abspath(local_dirname):
+            return None
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+            return None
+        return entry
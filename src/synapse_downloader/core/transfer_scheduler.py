@@ -0,0 +1,60 @@
+import itertools
+from .env import Env
+from .utils import Utils
+
+
+class TransferScheduler:
+    """Orders the files waiting to be transferred.
+
+    Policies:
+        fifo: The order the files are listed in.
+        largest-first: The largest files first.
+        smallest-first: The smallest files first.
+        shortest-tail: Large files first, largest to smallest, then every other file in the order it was listed.
+            Starting the long transfers early keeps them from running alone at the end of the download
+            while small files keep their folder order.
+    """
+    FIFO = 'fifo'
+    LARGEST_FIRST = 'largest-first'
+    SMALLEST_FIRST = 'smallest-first'
+    SHORTEST_TAIL = 'shortest-tail'
+    POLICIES = [FIFO, LARGEST_FIRST, SMALLEST_FIRST, SHORTEST_TAIL]
+
+    def __init__(self, policy=None, large_file_size=None):
+        """
+        Args:
+            policy: One of POLICIES. Defaults to fifo.
+            large_file_size: Files this size or larger are large files for shortest-tail.
+                Defaults to Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE.
+        """
+        self.policy = policy or self.FIFO
+        if self.policy not in self.POLICIES:
+            raise ValueError('Invalid schedule: {0}. Must be one of: {1}.'.format(policy, ', '.join(self.POLICIES)))
+        self.large_file_size = large_file_size or Env.SYNTOOLS_DOWNLOAD_CHUNK_SIZE() * Utils.MB
+        self._sequence = itertools.count()
+
+    @property
+    def is_ordered(self):
+        """Gets if the policy changes the listing order."""
+        return self.policy != self.FIFO
+
+    def priority(self, synapse_item):
+        """Gets the sort key for a file. Lower keys are transferred first.
+
+        Files with an unknown size are treated as empty.
+        """
+        return self.priority_for_size(synapse_item.content_size)
+
+    def priority_for_size(self, content_size):
+        size = content_size or 0
+        sequence = next(self._sequence)
+        if self.policy == self.LARGEST_FIRST:
+            return -size, sequence
+        elif self.policy == self.SMALLEST_FIRST:
+            return size, sequence
+        elif self.policy == self.SHORTEST_TAIL:
+            if size >= self.large_file_size:
+                return 0, -size, sequence
+            return 1, 0, sequence
+        else:
+            return 0, sequence
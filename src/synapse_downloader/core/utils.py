@@ -3,12 +3,15 @@ import re
 import math
 import pathlib
 import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
 from .env import Env
 
 
 class Utils:
     KB = 1024
     MB = KB * KB
+    GB = MB * KB
     CHUNK_SIZE = 10 * MB
 
     @staticmethod
@@ -55,6 +58,15 @@ class Utils:
         """
         return os.path.join(Utils.app_dir(), 'logs')
 
+    @staticmethod
+    def app_cache_dir():
+        """Gets the applications cache directory for the current user.
+
+        Returns:
+            Absolute path to the directory.
+        """
+        return os.path.join(Utils.app_dir(), 'cache')
+
     @staticmethod
     def expand_path(local_path):
         var_path = os.path.expandvars(local_path)
@@ -72,7 +84,45 @@ class Utils:
             None
         """
         if not os.path.isdir(local_path):
-            os.makedirs(local_path)
+            # Another thread or process may create it at the same time.
+            os.makedirs(local_path, exist_ok=True)
+
+    # How long to assume a pre-signed URL is valid when it does not include its expiration.
+    PRE_SIGNED_URL_DEFAULT_TTL = 300
+
+    @staticmethod
+    def pre_signed_url_expires(url, now=None):
+        """Gets when a pre-signed URL expires.
+
+        Args:
+            url: The pre-signed URL.
+            now: The UTC time the URL was issued. Defaults to now.
+
+        Returns:
+            datetime in UTC.
+        """
+        query = parse_qs(urlparse(url).query)
+        try:
+            issued = datetime.strptime(query['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ')
+            return issued + timedelta(seconds=int(query['X-Amz-Expires'][0]))
+        except (KeyError, IndexError, ValueError):
+            return (now or datetime.utcnow()) + timedelta(seconds=Utils.PRE_SIGNED_URL_DEFAULT_TTL)
+
+    # HTTP status codes servers use to throttle requests.
+    THROTTLE_STATUS_CODES = (429, 503)
+
+    @staticmethod
+    def is_throttled(error):
+        """Gets if an error, or an error it was raised from, is an HTTP 429 or 503 response."""
+        seen = set()
+        while error is not None and id(error) not in seen:
+            seen.add(id(error))
+            response = getattr(error, 'response', None)
+            # requests responses have a status_code and aiohttp responses a status.
+            if getattr(response, 'status_code', getattr(response, 'status', None)) in Utils.THROTTLE_STATUS_CODES:
+                return True
+            error = error.__cause__ or error.__context__
+        return False
 
     # Hold the names for pretty printing file sizes.
     PRETTY_SIZE_NAMES = ("Bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
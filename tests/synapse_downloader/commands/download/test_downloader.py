@@ -1,7 +1,7 @@
 import pytest
 import shutil
 import os
-from synapse_downloader.core import Env
+from synapse_downloader.core import Env, SynapseItem
 from synapse_downloader.commands.download.downloader import Downloader
 
 
@@ -51,6 +51,24 @@ async def test_it_downloads_and_compares_everything(syn_data, assert_local_downl
         # TODO: assert compared
 
 
+async def test_it_does_not_rehash_files_verified_while_downloading(syn_data, assert_local_download_data,
+                                                                   mocker, mock_SYNTOOLS_SYN_GET_DOWNLOAD):
+    mock_SYNTOOLS_SYN_GET_DOWNLOAD(False)
+    download_dir = syn_data['download_dir']
+    project = syn_data['project']
+
+    downloader = Downloader(project.id, download_dir)
+    await downloader.execute()
+    assert len(downloader.errors) == 0
+    assert downloader.metrics.counters['files_verified'] > 0
+
+    spy = mocker.spy(SynapseItem.Local, 'content_md5_async')
+    comparer = Downloader(project.id, download_dir, download=False, compare=True)
+    await comparer.execute()
+    assert len(comparer.errors) == 0
+    assert spy.call_count == 0
+
+
 async def test_it_downloads_and_compares_a_single_file(syn_data, assert_local_download_data, reset_download_dir):
     syn_file0 = syn_data['syn_file0']
     syn_file0_local = syn_data['syn_file0_download_path']
@@ -124,6 +142,64 @@ async def test_it_compares_a_single_file(synapse_test_helper):
     assert comparer.errors[0] == 'Local path does not exist: {0}'.format(local_file)
 
 
+async def test_it_streams_the_compare(synapse_test_helper):
+    local_dir = synapse_test_helper.create_temp_dir()
+    project = synapse_test_helper.create_project()
+    syn_folder = synapse_test_helper.create_folder(parent=project, name='folder1')
+    local_folder = os.path.join(local_dir, syn_folder.name)
+    os.makedirs(local_folder)
+    local_files = []
+    for _ in range(3):
+        local_file = synapse_test_helper.create_temp_file(dir=local_folder)
+        synapse_test_helper.create_file(parent=syn_folder, path=local_file)
+        local_files.append(local_file)
+
+    comparer = Downloader(project.id, local_dir, download=False, compare=True, stream_compare=True)
+    await comparer.execute()
+    assert len(comparer.errors) == 0
+    # Synapse items are not gathered before comparing.
+    assert len(comparer.comparables) == 1
+
+    os.remove(local_files[0])
+    synapse_test_helper.create_temp_file(dir=local_folder)
+    comparer = Downloader(project.id, local_dir, download=False, compare=True, stream_compare=True)
+    await comparer.execute()
+    assert len(comparer.errors) == 2
+    assert 'FILE NOT FOUND LOCALLY' in comparer.errors[0] or 'FILE NOT FOUND LOCALLY' in comparer.errors[1]
+
+
+async def test_it_streams_the_compare_when_a_file_fails_to_load(synapse_test_helper, mocker):
+    local_dir = synapse_test_helper.create_temp_dir()
+    project = synapse_test_helper.create_project()
+    syn_files = []
+    for _ in range(3):
+        local_file = synapse_test_helper.create_temp_file(dir=local_dir)
+        syn_files.append(synapse_test_helper.create_file(parent=project, path=local_file))
+    syn_folder = synapse_test_helper.create_folder(parent=project, name='folder1')
+    local_folder = os.path.join(local_dir, syn_folder.name)
+    os.makedirs(local_folder)
+    local_file = synapse_test_helper.create_temp_file(dir=local_folder)
+    synapse_test_helper.create_file(parent=syn_folder, path=local_file)
+    os.remove(local_file)
+
+    load = SynapseItem.load
+
+    async def failing_load(self, *args, **kwargs):
+        if self.id == syn_files[0].id:
+            raise Exception('load failed')
+        return await load(self, *args, **kwargs)
+
+    mocker.patch.object(SynapseItem, 'load', failing_load)
+    comparer = Downloader(project.id, local_dir, download=False, compare=True, stream_compare=True)
+    await comparer.execute()
+    # The other files and the subfolder are still compared.
+    assert len(comparer.errors) == 2
+    assert comparer.errors[0].startswith('Failed to load: ')
+    assert syn_files[0].id in comparer.errors[0]
+    assert 'FILE NOT FOUND LOCALLY' in comparer.errors[1]
+    assert comparer.metrics.counters['compare_failures'] == 1
+
+
 async def test_it_excludes_folders_by_id(syn_data, assert_local_download_data, reset_download_dir):
     download_dir = syn_data['download_dir']
     project = syn_data['project']
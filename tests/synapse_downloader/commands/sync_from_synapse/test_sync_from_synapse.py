@@ -1,4 +1,5 @@
 import pytest
+import os
 from synapse_downloader.commands.sync_from_synapse import SyncFromSynapse
 
 
@@ -12,3 +13,19 @@ async def test_it_downloads_everything(syn_data, assert_local_download_data, res
     await downloader.execute()
     assert len(downloader.errors) == 0
     assert_local_download_data(syn_data, expect=all_syn_entities)
+
+
+async def test_it_reports_each_file(syn_data, reset_download_dir, tmp_path):
+    reset_download_dir(syn_data)
+    download_dir = syn_data['download_dir']
+    project = syn_data['project']
+    stats_file = str(tmp_path / 'stats.json')
+    file_count = len(syn_data['all_syn_files'])
+
+    downloader = SyncFromSynapse(project.id, download_dir, stats_file=stats_file)
+    await downloader.execute()
+    assert len(downloader.errors) == 0
+    assert downloader.metrics.counters['files_completed'] == file_count
+    assert downloader.metrics.counters['files_downloaded'] == file_count
+    assert downloader.metrics.counters['files_failed'] == 0
+    assert os.path.isfile(stats_file)
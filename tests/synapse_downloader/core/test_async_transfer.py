@@ -0,0 +1,211 @@
+import pytest
+import os
+import hashlib
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synapse_downloader.core import AsyncTransfer, SynToolsError, FileSizeMismatchError, Md5MismatchError
+
+aiohttp = pytest.importorskip('aiohttp')
+
+
+class FileServer:
+    """Local HTTP server that serves files by name."""
+
+    def __init__(self):
+        self.files = {}
+        self.fail_next = 0
+        self.fail_status = 500
+        self.expired_urls = set()
+        self.requests = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, name='file'):
+        return 'http://127.0.0.1:{0}/{1}'.format(self._server.server_port, name)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.lstrip('/')
+                with server._lock:
+                    server.requests.append(name)
+                    server.connections.add(self.client_address)
+                    fail = server.fail_next > 0
+                    if fail:
+                        server.fail_next -= 1
+                if name in server.expired_urls:
+                    return self._send(403, b'expired')
+                if fail:
+                    return self._send(server.fail_status, b'error')
+                if name not in server.files:
+                    return self._send(404, b'not found')
+                self._send(200, server.files[name])
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def data():
+    return os.urandom(300 * 1024 + 123)
+
+
+def url_getter(urls):
+    urls = list(urls)
+
+    async def get_url():
+        return urls.pop(0) if len(urls) > 1 else urls[0]
+
+    return get_url
+
+
+async def test_it_downloads_a_file(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    progress = []
+    download_path = os.path.join(tmp_path, 'dir', 'file.bin')
+    async with AsyncTransfer(read_size=64 * 1024, retries=0) as transfer:
+        path, md5 = await transfer.download(url_getter([file_server.url()]),
+                                            download_path,
+                                            content_size=len(data),
+                                            expected_md5=hashlib.md5(data).hexdigest(),
+                                            progress=progress.append)
+
+    assert path == download_path
+    assert md5 == hashlib.md5(data).hexdigest()
+    with open(download_path, 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(download_path + AsyncTransfer.PARTIAL_SUFFIX)
+    assert sum(progress) == len(data)
+    assert max(progress) <= 64 * 1024
+
+
+async def test_it_downloads_many_files_at_once_on_kept_alive_connections(file_server, tmp_path):
+    for index in range(200):
+        file_server.files['file{0}'.format(index)] = 'content {0}'.format(index).encode()
+    threads = threading.active_count()
+
+    async with AsyncTransfer(connections=10, retries=0) as transfer:
+        results = await asyncio.gather(*[
+            transfer.download(url_getter([file_server.url('file{0}'.format(index))]),
+                              os.path.join(tmp_path, 'file{0}.txt'.format(index)))
+            for index in range(200)])
+        # The downloads ran on the loop, with the files written by the writer threads.
+        assert threading.active_count() - threads <= 10 + AsyncTransfer.WRITER_THREADS
+
+    for index, (path, md5) in enumerate(results):
+        with open(path, 'rb') as f:
+            assert f.read() == 'content {0}'.format(index).encode()
+        assert md5 == hashlib.md5(file_server.files['file{0}'.format(index)]).hexdigest()
+    assert len(file_server.connections) <= 10
+
+
+async def test_it_writes_files_in_the_writer_threads(file_server, tmp_path, data, mocker):
+    file_server.files['file'] = data
+    threads = []
+    write = AsyncTransfer._write
+
+    def record_write(f, md5, chunk):
+        threads.append(threading.current_thread().name)
+        write(f, md5, chunk)
+
+    mocker.patch.object(AsyncTransfer, '_write', side_effect=record_write)
+    async with AsyncTransfer(read_size=64 * 1024, retries=0) as transfer:
+        path, md5 = await transfer.download(url_getter([file_server.url()]),
+                                            os.path.join(tmp_path, 'file.bin'),
+                                            expected_md5=hashlib.md5(data).hexdigest())
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert threads
+    assert all(name.startswith('async-transfer-write') for name in threads)
+
+
+async def test_it_retries_failed_downloads(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    file_server.fail_next = 2
+    async with AsyncTransfer(retries=2) as transfer:
+        path, _ = await transfer.download(url_getter([file_server.url()]), os.path.join(tmp_path, 'file.bin'))
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert len(file_server.requests) == 3
+
+
+async def test_it_reports_throttling(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    file_server.fail_next = 1
+    file_server.fail_status = 503
+    throttled = []
+    async with AsyncTransfer(retries=2, throttled=lambda: throttled.append(True)) as transfer:
+        await transfer.download(url_getter([file_server.url()]), os.path.join(tmp_path, 'file.bin'))
+    assert throttled == [True]
+
+
+async def test_it_gets_a_new_url_when_the_url_expires(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    file_server.expired_urls.add('expired')
+    async with AsyncTransfer(retries=1) as transfer:
+        path, _ = await transfer.download(url_getter([file_server.url('expired'), file_server.url()]),
+                                          os.path.join(tmp_path, 'file.bin'))
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert file_server.requests == ['expired', 'file']
+
+
+async def test_it_fails_after_the_retries(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    file_server.fail_next = 10
+    download_path = os.path.join(tmp_path, 'file.bin')
+    async with AsyncTransfer(retries=1) as transfer:
+        with pytest.raises(SynToolsError):
+            await transfer.download(url_getter([file_server.url()]), download_path)
+    assert len(file_server.requests) == 2
+    assert not os.path.exists(download_path)
+    assert not os.path.exists(download_path + AsyncTransfer.PARTIAL_SUFFIX)
+
+
+async def test_it_does_not_retry_client_errors(file_server, tmp_path):
+    download_path = os.path.join(tmp_path, 'file.bin')
+    async with AsyncTransfer(retries=5) as transfer:
+        with pytest.raises(SynToolsError, match='404'):
+            await transfer.download(url_getter([file_server.url('missing')]), download_path)
+    assert file_server.requests == ['missing']
+    assert not os.path.exists(download_path + AsyncTransfer.PARTIAL_SUFFIX)
+
+
+async def test_it_fails_when_the_size_or_md5_does_not_match(file_server, tmp_path, data):
+    file_server.files['file'] = data
+    download_path = os.path.join(tmp_path, 'file.bin')
+    async with AsyncTransfer(retries=0) as transfer:
+        with pytest.raises(FileSizeMismatchError):
+            await transfer.download(url_getter([file_server.url()]), download_path, content_size=len(data) + 1)
+        with pytest.raises(Md5MismatchError):
+            await transfer.download(url_getter([file_server.url()]), download_path, expected_md5='abc')
+    assert not os.path.exists(download_path)
+    assert not os.path.exists(download_path + AsyncTransfer.PARTIAL_SUFFIX)
@@ -0,0 +1,71 @@
+import pytest
+import os
+from synapse_downloader.core import SynapseItem, Comparables
+from synapsis import Synapsis
+
+
+@pytest.fixture
+def items():
+    project = SynapseItem(Synapsis.ConcreteTypes.PROJECT_ENTITY,
+                          id='syn1',
+                          name='Project',
+                          synapse_root_path='',
+                          local_root_path='/tmp/project')
+    folder = SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                         id='syn2',
+                         parent_id=project.id,
+                         name='Folder1',
+                         synapse_root_path=project.synapse_path,
+                         local_root_path=project.local.abs_path)
+    file = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                       id='syn3',
+                       parent_id=folder.id,
+                       name='File1.txt',
+                       synapse_root_path=folder.synapse_path,
+                       local_root_path=folder.local.abs_path)
+    local_only = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                             parent_id=folder.id,
+                             name='File2.txt',
+                             synapse_root_path=folder.synapse_path,
+                             local_root_path=folder.local.abs_path)
+    return project, folder, file, local_only
+
+
+def test_it_adds_items_once(items):
+    comparables = Comparables()
+    for item in items:
+        assert comparables.add(item) is True
+        assert item in comparables
+
+    for item in items:
+        assert comparables.add(item) is False
+
+    assert len(comparables) == len(items)
+    assert list(comparables) == list(items)
+
+
+def test_it_finds_items(items):
+    project, folder, file, local_only = items
+    comparables = Comparables()
+    for item in items:
+        comparables.add(item)
+
+    assert comparables.get(project.id) == project
+    assert comparables.get(folder.id) == folder
+    assert comparables.get(file.id) == file
+    assert comparables.get('syn0') is None
+
+    assert comparables.find_by_local_path(os.path.join('/tmp/project', 'Folder1', 'File2.txt')) == local_only
+    assert comparables.find_by_local_path('/tmp/nope') is None
+
+    assert comparables.select_by_local_dirname(project.local.abs_path) == [folder]
+    assert comparables.select_by_local_dirname(folder.local.abs_path) == [file, local_only]
+    assert comparables.select_by_local_dirname('/tmp/nope') == []
+
+    # Returns a copy.
+    comparables.select_by_local_dirname(folder.local.abs_path).clear()
+    assert comparables.select_by_local_dirname(folder.local.abs_path) == [file, local_only]
+
+    comparables.clear()
+    assert len(comparables) == 0
+    assert comparables.get(project.id) is None
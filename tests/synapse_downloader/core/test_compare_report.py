@@ -0,0 +1,91 @@
+import pytest
+import os
+import csv
+import json
+from synapse_downloader.core import SynapseItem, CompareReport
+from synapsis import Synapsis
+
+
+@pytest.fixture
+def items(tmp_path):
+    folder = SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                         id='syn2',
+                         parent_id='syn1',
+                         name='Folder1',
+                         synapse_root_path='Project',
+                         local_root_path=str(tmp_path))
+    file = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                       id='syn3',
+                       parent_id=folder.id,
+                       name='File1.txt',
+                       synapse_root_path=folder.synapse_path,
+                       local_root_path=folder.local.abs_path)
+    file.set_file_handle({'id': '1', 'fileName': 'File1.txt', 'contentSize': 10, 'contentMd5': 'a' * 32})
+    local_only = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                             parent_id=folder.id,
+                             name='File2.txt',
+                             synapse_root_path=folder.synapse_path,
+                             local_root_path=folder.local.abs_path)
+    return folder, file, local_only
+
+
+def add_results(report, items):
+    folder, file, local_only = items
+    report.add(CompareReport.MATCH, folder)
+    report.add(CompareReport.MATCH, file)
+    report.add(CompareReport.MISSING_LOCAL, folder)
+    report.add(CompareReport.MISSING_REMOTE, local_only)
+    report.add(CompareReport.SIZE_MISMATCH, file, local_size=11)
+    report.add(CompareReport.MD5_MISMATCH, file, local_size=10, local_md5='b' * 32)
+
+
+def test_it_writes_the_differences_as_json_lines(tmp_path, items):
+    report = CompareReport(os.path.join(tmp_path, 'reports', 'report.jsonl'), entity_id='syn2')
+    add_results(report, items)
+    assert not os.path.exists(report.path)
+    summary = report.close()
+
+    with open(report.path) as f:
+        entries = [json.loads(line) for line in f]
+    assert [e['result'] for e in entries] == ['missing-local', 'missing-remote', 'size-mismatch', 'md5-mismatch']
+    assert entries[0]['type'] == 'folder'
+    assert entries[0]['synapse_path'] == 'Project/Folder1'
+    assert entries[1]['id'] is None
+    assert entries[1]['synapse_size'] is None
+    assert entries[2]['synapse_size'] == 10
+    assert entries[2]['local_size'] == 11
+    assert entries[3]['synapse_md5'] == 'a' * 32
+    assert entries[3]['local_md5'] == 'b' * 32
+    assert entries[3]['local_path'] == items[1].local.abs_path
+
+    assert summary['compared'] == 6
+    assert summary['differences'] == 4
+    assert summary['complete'] is True
+    assert summary['counts'] == {'match': 2, 'unknown': 0, 'missing-local': 1, 'missing-remote': 1,
+                                 'size-mismatch': 1, 'md5-mismatch': 1}
+    with open(os.path.join(tmp_path, 'reports', 'report.summary.json')) as f:
+        assert json.load(f) == summary
+
+
+def test_it_writes_the_differences_as_csv(tmp_path, items):
+    report = CompareReport(os.path.join(tmp_path, 'report.CSV'))
+    assert report.format == CompareReport.CSV
+    add_results(report, items)
+    report.close(complete=False)
+
+    with open(report.path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['result'] for r in rows] == ['missing-local', 'missing-remote', 'size-mismatch', 'md5-mismatch']
+    assert list(rows[0].keys()) == CompareReport.FIELDS
+    assert rows[2]['local_size'] == '11'
+    with open(report.summary_path) as f:
+        assert json.load(f)['complete'] is False
+
+
+def test_it_validates_the_result(tmp_path, items):
+    report = CompareReport(os.path.join(tmp_path, 'report.jsonl'))
+    with pytest.raises(ValueError):
+        report.add('different', items[0])
+    report.close()
+    assert report.closed
+    assert report.close()['compared'] == 0
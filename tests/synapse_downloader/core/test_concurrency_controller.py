@@ -0,0 +1,220 @@
+import pytest
+import time
+import asyncio
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synapse_downloader.core import ConcurrencyController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_controller(min_workers=2, max_workers=20, initial_workers=10):
+    clock = Clock()
+    return ConcurrencyController(min_workers, max_workers, initial_workers=initial_workers, clock=clock), clock
+
+
+def fill(controller):
+    # Mark the limit as reached in the current interval.
+    controller._peak_active = controller.limit
+
+
+def test_the_limit_is_fixed_when_min_and_max_match():
+    controller = ConcurrencyController(5, 5, initial_workers=10)
+    assert controller.limit == 5
+    assert controller.is_adaptive is False
+    controller.record(throttled=True)
+    assert controller.limit == 5
+
+
+def test_it_increases_while_the_throughput_improves():
+    controller, clock = new_controller()
+    for throughput in [100, 200, 300]:
+        fill(controller)
+        clock.now += ConcurrencyController.ADJUST_INTERVAL
+        controller.record(size=throughput * ConcurrencyController.ADJUST_INTERVAL)
+    assert controller.limit == 10 + 3 * ConcurrencyController.INCREASE_STEP
+
+
+def test_it_reverts_an_increase_that_does_not_help():
+    controller, clock = new_controller()
+    for throughput in [100, 100]:
+        fill(controller)
+        clock.now += ConcurrencyController.ADJUST_INTERVAL
+        controller.record(size=throughput * ConcurrencyController.ADJUST_INTERVAL)
+    assert controller.limit == 10
+
+
+def test_it_does_not_increase_when_the_limit_is_not_reached():
+    controller, clock = new_controller()
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.record(size=1000)
+    assert controller.limit == 10
+
+
+def test_it_halves_when_throttled():
+    controller, clock = new_controller()
+    controller.record(throttled=True)
+    assert controller.limit == 5
+    # Only one decrease for each interval.
+    controller.throttled()
+    assert controller.limit == 5
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.throttled()
+    assert controller.limit == 2
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.throttled()
+    assert controller.limit == 2
+
+
+def test_it_decreases_on_errors_and_latency():
+    controller, clock = new_controller()
+    for _ in range(5):
+        controller.record(size=10, error=True)
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.record(size=10)
+    assert controller.limit == 5
+
+    controller, clock = new_controller()
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.record(size=10, latency=0.1)
+    assert controller.limit == 10
+    clock.now += ConcurrencyController.ADJUST_INTERVAL
+    controller.record(size=10, latency=0.1 * ConcurrencyController.LATENCY_FACTOR + 0.1)
+    assert controller.limit == 5
+
+
+async def test_slots_wait_for_the_limit():
+    controller = ConcurrencyController(2, 2)
+    running = []
+    max_running = 0
+
+    async def transfer():
+        nonlocal max_running
+        async with controller.slot():
+            running.append(1)
+            max_running = max(max_running, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    await asyncio.gather(*[transfer() for _ in range(10)])
+    assert max_running == 2
+    assert controller.active == 0
+
+
+class ThrottlingServer:
+    """Local HTTP server that returns 429 when more than capacity requests are in progress."""
+
+    def __init__(self, capacity, delay):
+        self.capacity = capacity
+        self.delay = delay
+        self.active = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/file'.format(self._server.server_port)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.active += 1
+                    throttle = server.active > server.capacity
+                    if throttle:
+                        server.throttled += 1
+                try:
+                    if throttle:
+                        body = b'slow down'
+                        self.send_response(429)
+                    else:
+                        time.sleep(server.delay)
+                        body = b'x' * 1024
+                        self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+        return Handler
+
+
+async def run_downloads(controller, url, duration):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=controller.max_workers))
+    executor = ThreadPoolExecutor(max_workers=controller.max_workers)
+    loop = asyncio.get_running_loop()
+    stop_at = time.monotonic() + duration
+    samples = []
+
+    async def worker():
+        while time.monotonic() < stop_at:
+            async with controller.slot():
+                start = time.perf_counter()
+                response = await loop.run_in_executor(executor, session.get, url)
+                if response.status_code == 429:
+                    controller.record(error=True, throttled=True)
+                else:
+                    controller.record(size=len(response.content), latency=time.perf_counter() - start)
+                samples.append(controller.limit)
+
+    await asyncio.gather(*[worker() for _ in range(controller.max_workers)])
+    executor.shutdown()
+    session.close()
+    return samples
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThrottlingServer(capacity=8, delay=0.02)
+    yield server
+    server.close()
+
+
+async def test_it_backs_off_when_the_server_throttles(throttling_server, monkeypatch):
+    monkeypatch.setattr(ConcurrencyController, 'ADJUST_INTERVAL', 0.1)
+    controller = ConcurrencyController(1, 32, initial_workers=24)
+    samples = await run_downloads(controller, throttling_server.url, duration=2)
+
+    assert throttling_server.throttled > 0
+    assert any(reason == 'throttled' for _, _, reason in controller.changes)
+    # The limit is cut below the starting point and settles around the capacity of the server.
+    assert min(samples) < 24
+    late = samples[len(samples) // 2:]
+    assert sum(late) / len(late) <= throttling_server.capacity * 2
+
+
+async def test_it_grows_when_the_server_keeps_up(monkeypatch):
+    server = ThrottlingServer(capacity=1000, delay=0.02)
+    try:
+        monkeypatch.setattr(ConcurrencyController, 'ADJUST_INTERVAL', 0.1)
+        controller = ConcurrencyController(1, 32, initial_workers=2)
+        await run_downloads(controller, server.url, duration=1.5)
+        assert server.throttled == 0
+        assert controller.limit > 2
+    finally:
+        server.close()
@@ -0,0 +1,139 @@
+import pytest
+import time
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synapse_downloader.core import ConnectionPool, Metrics
+
+
+class KeepAliveServer:
+    """Local HTTP/1.1 server that keeps connections open and records the connections requests arrive on."""
+
+    def __init__(self):
+        self.delay = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, name='file'):
+        return 'http://127.0.0.1:{0}/{1}'.format(self._server.server_port, name)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.connections.add(self.client_address)
+                time.sleep(server.delay)
+                body = b'x' * 1024
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def server():
+    server = KeepAliveServer()
+    yield server
+    server.close()
+
+
+def get_all(session, url, threads, requests_per_thread):
+    def _get(_):
+        for _ in range(requests_per_thread):
+            response = session.get(url)
+            assert response.status_code == 200
+            assert len(response.content) == 1024
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(_get, range(threads)))
+
+
+def test_it_reuses_connections(server):
+    pool = ConnectionPool(4)
+    session = pool.session()
+    get_all(session, server.url(), 1, 20)
+
+    stats = pool.stats()
+    assert stats['pool_size'] == 4
+    assert stats['http_requests'] == 20
+    assert stats['http_connections_opened'] == 1
+    assert stats['http_connections_reused'] == 19
+    assert stats['http_connections_discarded'] == 0
+    assert stats['tls_handshakes'] == 0
+    assert len(server.connections) == 1
+    pool.close()
+
+
+def test_it_keeps_a_connection_for_each_worker(server):
+    server.delay = 0.01
+    pool = ConnectionPool(16)
+    session = pool.session()
+    get_all(session, server.url(), 16, 10)
+
+    stats = pool.stats()
+    assert stats['http_requests'] == 160
+    assert stats['http_connections_opened'] <= 16
+    assert stats['http_connections_reused'] == 160 - stats['http_connections_opened']
+    assert stats['http_connections_discarded'] == 0
+    assert len(server.connections) == stats['http_connections_opened']
+    pool.close()
+
+
+def test_it_closes_connections_past_the_pool_size_without_warning(server, caplog):
+    server.delay = 0.02
+    pool = ConnectionPool(2)
+    session = pool.session()
+    with caplog.at_level(logging.WARNING):
+        get_all(session, server.url(), 8, 5)
+
+    stats = pool.stats()
+    assert stats['http_requests'] == 40
+    assert stats['http_connections_discarded'] > 0
+    assert 'Connection pool is full' not in caplog.text
+    pool.close()
+
+
+def test_it_adds_the_counters_to_the_metrics(server):
+    metrics = Metrics()
+    pool = ConnectionPool(2, metrics=metrics)
+    get_all(pool.session(), server.url(), 1, 3)
+
+    assert metrics.counters['http_requests'] == 3
+    assert metrics.counters['http_connections_opened'] == 1
+    assert metrics.counters['http_connections_reused'] == 2
+    pool.close()
+
+
+def test_it_mounts_and_restores_a_session(server):
+    session = requests.Session()
+    adapter = session.get_adapter('https://')
+    pool = ConnectionPool(2)
+
+    assert pool.mount(session) is session
+    assert session.get_adapter('https://') is pool.adapter
+    assert session.get_adapter('http://') is pool.adapter
+    get_all(session, server.url(), 1, 2)
+    assert pool.stats()['http_requests'] == 2
+
+    pool.close()
+    assert session.get_adapter('https://') is adapter
+    assert session.get(server.url()).status_code == 200
+    assert pool.stats()['http_requests'] == 2
@@ -0,0 +1,124 @@
+import pytest
+import os
+import asyncio
+import threading
+import hashlib
+from synapse_downloader.core import Deduplicator, Md5Cache
+
+CONTENT = b'abc' * 1000
+MD5 = hashlib.md5(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def md5_cache(tmp_path):
+    cache = Md5Cache(db_path=os.path.join(tmp_path, 'cache', 'md5_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def source_path(tmp_path, md5_cache):
+    path = os.path.join(tmp_path, 'source.bin')
+    with open(path, 'wb') as f:
+        f.write(CONTENT)
+    md5_cache.set(path, MD5)
+    return path
+
+
+def test_it_validates_the_policy(md5_cache):
+    with pytest.raises(ValueError):
+        Deduplicator(md5_cache, 'symlink')
+
+
+async def test_it_finds_identical_files(md5_cache, source_path, tmp_path):
+    deduplicator = Deduplicator(md5_cache, Deduplicator.COPY)
+    target_path = os.path.join(tmp_path, 'target.bin')
+    assert await deduplicator.find(MD5, len(CONTENT), target_path) == source_path
+    assert await deduplicator.find(MD5, len(CONTENT) + 1, target_path) is None
+    assert await deduplicator.find(MD5, len(CONTENT), source_path) is None
+    assert await deduplicator.find(None, None, target_path) is None
+
+
+@pytest.mark.parametrize('policy', Deduplicator.POLICIES)
+async def test_it_creates_files(md5_cache, source_path, tmp_path, policy):
+    deduplicator = Deduplicator(md5_cache, policy)
+    target_path = os.path.join(tmp_path, 'target.bin')
+    with open(target_path, 'wb') as f:
+        f.write(b'old')
+
+    used = await deduplicator.create(source_path, target_path)
+    with open(target_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(target_path + Deduplicator.PARTIAL_SUFFIX)
+    if policy == Deduplicator.HARDLINK:
+        assert used == Deduplicator.HARDLINK
+        assert os.stat(target_path).st_ino == os.stat(source_path).st_ino
+    else:
+        # Reflinks fall back to a copy on file systems that cannot clone.
+        assert used in [policy, Deduplicator.COPY]
+        assert os.stat(target_path).st_ino != os.stat(source_path).st_ino
+
+
+async def test_it_falls_back_to_a_copy(md5_cache, source_path, tmp_path, mocker):
+    mocker.patch('os.link', side_effect=OSError('Invalid cross-device link'))
+    deduplicator = Deduplicator(md5_cache, Deduplicator.HARDLINK)
+    target_path = os.path.join(tmp_path, 'target.bin')
+    assert await deduplicator.create(source_path, target_path) == Deduplicator.COPY
+    with open(target_path, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+async def test_it_waits_for_files_that_are_downloading(md5_cache, tmp_path):
+    deduplicator = Deduplicator(md5_cache, Deduplicator.COPY)
+    downloaded_path = os.path.join(tmp_path, 'downloaded.bin')
+    target_path = os.path.join(tmp_path, 'target.bin')
+
+    async def download():
+        with deduplicator.downloading(MD5):
+            await asyncio.sleep(0.01)
+            with open(downloaded_path, 'wb') as f:
+                f.write(CONTENT)
+            md5_cache.set(downloaded_path, MD5)
+
+    download_task = asyncio.create_task(download())
+    await asyncio.sleep(0)
+    assert await deduplicator.find(MD5, len(CONTENT), target_path) == downloaded_path
+    await download_task
+
+
+async def test_it_waits_for_files_that_start_downloading_while_it_searches(md5_cache, tmp_path, mocker):
+    deduplicator = Deduplicator(md5_cache, Deduplicator.COPY)
+    downloaded_path = os.path.join(tmp_path, 'downloaded.bin')
+    target_path = os.path.join(tmp_path, 'target.bin')
+    loop = asyncio.get_running_loop()
+    registered = threading.Event()
+    tasks = []
+
+    async def download():
+        with deduplicator.downloading(MD5):
+            registered.set()
+            await asyncio.sleep(0.01)
+            with open(downloaded_path, 'wb') as f:
+                f.write(CONTENT)
+            md5_cache.set(downloaded_path, MD5)
+
+    find = md5_cache.find
+
+    def find_while_downloading(md5, size, exclude=None):
+        if not tasks:
+            # The other file starts downloading while the cache is searched.
+            loop.call_soon_threadsafe(lambda: tasks.append(loop.create_task(download())))
+            registered.wait(5)
+            return None
+        return find(md5, size, exclude=exclude)
+
+    mocker.patch.object(md5_cache, 'find', side_effect=find_while_downloading)
+    assert await deduplicator.find(MD5, len(CONTENT), target_path) == downloaded_path
+    assert md5_cache.find.call_count == 2
+    await asyncio.gather(*tasks)
+
+
+async def test_it_does_not_find_files_when_the_cache_fails(md5_cache, source_path, tmp_path, mocker):
+    deduplicator = Deduplicator(md5_cache, Deduplicator.COPY)
+    mocker.patch.object(md5_cache, 'find', side_effect=Exception('database is locked'))
+    assert await deduplicator.find(MD5, len(CONTENT), os.path.join(tmp_path, 'target.bin')) is None
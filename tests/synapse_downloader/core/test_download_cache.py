@@ -0,0 +1,139 @@
+import pytest
+import os
+import hashlib
+import multiprocessing
+from synapse_downloader.core import DownloadCache, Deduplicator, Env, Utils
+
+
+def write_file(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def md5_of(content):
+    return hashlib.md5(content).hexdigest()
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return os.path.join(tmp_path, 'cache')
+
+
+@pytest.fixture
+def download_cache(cache_dir):
+    cache = DownloadCache(cache_dir, 1000)
+    yield cache
+    cache.close()
+
+
+def test_it_is_created_from_the_env(monkeypatch, cache_dir):
+    monkeypatch.setattr(Env, '_SYNTOOLS_DOWNLOAD_CACHE_DIR', '')
+    assert DownloadCache.from_env() is None
+
+    monkeypatch.setattr(Env, '_SYNTOOLS_DOWNLOAD_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(Env, '_SYNTOOLS_DOWNLOAD_CACHE_SIZE', 0.5)
+    monkeypatch.setattr(Env, '_SYNTOOLS_DOWNLOAD_CACHE_LINK', 'copy')
+    cache = DownloadCache.from_env()
+    try:
+        assert cache.cache_dir == cache_dir
+        assert cache.max_size == Utils.GB // 2
+        assert cache.policy == Deduplicator.COPY
+    finally:
+        cache.close()
+
+    with pytest.raises(ValueError):
+        DownloadCache(cache_dir, 1000, policy='reflink')
+
+
+@pytest.mark.parametrize('policy', DownloadCache.POLICIES)
+def test_it_adds_and_fills_files(cache_dir, tmp_path, policy):
+    content = b'a' * 100
+    source = write_file(os.path.join(tmp_path, 'source.bin'), content)
+    target = os.path.join(tmp_path, 'target.bin')
+    cache = DownloadCache(cache_dir, 1000, policy=policy)
+    try:
+        assert cache.fill('1', md5_of(content), 100, target) is None
+        assert cache.add('1', md5_of(content), source) is True
+        assert cache.add('1', md5_of(content), source) is False
+        assert cache.size == 100
+
+        assert cache.fill('1', md5_of(content), 100, target) == policy
+        with open(target, 'rb') as f:
+            assert f.read() == content
+        # Keyed by file handle ID and MD5.
+        assert cache.fill('2', md5_of(content), 100, target) is None
+        assert cache.fill('1', md5_of(b'other'), 100, target) is None
+        assert cache.fill('1', md5_of(content), 101, target) is None
+    finally:
+        cache.close()
+
+
+def test_it_removes_changed_files(download_cache, tmp_path):
+    content = b'a' * 100
+    source = write_file(os.path.join(tmp_path, 'source.bin'), content)
+    download_cache.add('1', md5_of(content), source)
+
+    # The cached file is a hard link to the source.
+    write_file(source, b'b' * 100)
+    assert download_cache.get('1', md5_of(content), 100) is None
+    assert not os.path.exists(download_cache.object_path('1', md5_of(content)))
+    assert download_cache.size == 0
+
+
+def test_it_evicts_the_least_recently_used_files(download_cache, tmp_path):
+    contents = [bytes([i]) * 400 for i in range(3)]
+    for index, content in enumerate(contents):
+        source = write_file(os.path.join(tmp_path, 'source{0}.bin'.format(index)), content)
+        download_cache.add(str(index), md5_of(content), source)
+        if index == 1:
+            # Use the first file so the second is the least recently used.
+            assert download_cache.get('0', md5_of(contents[0]), 400)
+
+    assert download_cache.size == 800
+    assert download_cache.get('0', md5_of(contents[0]), 400)
+    assert download_cache.get('1', md5_of(contents[1]), 400) is None
+    assert download_cache.get('2', md5_of(contents[2]), 400)
+    assert not os.path.exists(download_cache.object_path('1', md5_of(contents[1])))
+
+    # Larger than the cache.
+    source = write_file(os.path.join(tmp_path, 'large.bin'), b'x' * 1001)
+    assert download_cache.add('3', md5_of(b'x' * 1001), source) is False
+
+
+def add_files(cache_dir, source_dir, worker):
+    cache = DownloadCache(cache_dir, 1000, policy=Deduplicator.COPY)
+    try:
+        for index in range(50):
+            content = str(index % 20).encode() * 100
+            source = write_file(os.path.join(source_dir, '{0}_{1}.bin'.format(worker, index)), content)
+            cache.add(str(index % 20), md5_of(content), source)
+            target = os.path.join(source_dir, '{0}_{1}.target'.format(worker, index))
+            if cache.fill(str(index % 20), md5_of(content), len(content), target):
+                with open(target, 'rb') as f:
+                    assert f.read() == content
+    finally:
+        cache.close()
+
+
+def test_it_can_be_used_by_several_processes(cache_dir, tmp_path):
+    processes = [multiprocessing.Process(target=add_files, args=(cache_dir, str(tmp_path), worker))
+                 for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+
+    cache = DownloadCache(cache_dir, 1000)
+    try:
+        assert cache.size <= 1000
+        # Every cached file is complete. A file removed by one process while another re-added it is not returned.
+        for file_handle_id, md5, size in cache._fetchall('SELECT file_handle_id, md5, size FROM files'):
+            path = cache.get(file_handle_id, md5, size)
+            if path:
+                with open(path, 'rb') as f:
+                    assert md5_of(f.read()) == md5
+        assert not [name for _, _, names in os.walk(cache_dir) for name in names if name.endswith('.part')]
+    finally:
+        cache.close()
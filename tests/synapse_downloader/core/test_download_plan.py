@@ -0,0 +1,92 @@
+import pytest
+import os
+from synapsis import Synapsis
+from synapse_downloader.core import DownloadPlan, SynapseItem, Utils, SynToolsError
+
+
+def new_folder(tmp_path, name='folder'):
+    return SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                       id='syn2',
+                       parent_id='syn1',
+                       name=name,
+                       synapse_root_path='Project',
+                       local_root_path=str(tmp_path))
+
+
+def new_file(tmp_path, id, size, file_handle_type=None):
+    synapse_file = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                               id=id,
+                               parent_id='syn2',
+                               name='{0}.txt'.format(id),
+                               synapse_root_path='Project/folder',
+                               local_root_path=os.path.join(str(tmp_path), 'folder'),
+                               version_number=2)
+    synapse_file.set_file_handle({
+        'id': '1{0}'.format(id[3:]),
+        'fileName': '{0}.txt'.format(id),
+        'contentSize': size,
+        'contentMd5': 'md5-{0}'.format(id) if size is not None else None,
+        'concreteType': file_handle_type or Synapsis.ConcreteTypes.S3_FILE_HANDLE.code
+    })
+    return synapse_file
+
+
+@pytest.fixture
+def plan(tmp_path):
+    plan = DownloadPlan('syn1', str(tmp_path), excludes=['syn9'], includes=['*.csv'])
+    plan.add(new_folder(tmp_path), DownloadPlan.DOWNLOAD)
+    plan.add(new_folder(tmp_path, name='excluded'), DownloadPlan.SKIP_EXCLUDED)
+    plan.add(new_file(tmp_path, 'syn10', 100 * Utils.MB), DownloadPlan.DOWNLOAD)
+    plan.add(new_file(tmp_path, 'syn11', None, file_handle_type=Synapsis.ConcreteTypes.EXTERNAL_FILE_HANDLE.code),
+             DownloadPlan.DOWNLOAD)
+    plan.add(new_file(tmp_path, 'syn12', 5), DownloadPlan.SKIP_CURRENT)
+    plan.add(new_file(tmp_path, 'syn13', 7), DownloadPlan.SKIP_EXCLUDED)
+    return plan
+
+
+def test_it_totals_the_actions(plan):
+    assert plan.totals == {
+        DownloadPlan.DOWNLOAD: {'files': 2, 'bytes': 100 * Utils.MB, 'unknown_size': 1},
+        DownloadPlan.SKIP_CURRENT: {'files': 1, 'bytes': 5, 'unknown_size': 0},
+        DownloadPlan.SKIP_EXCLUDED: {'files': 1, 'bytes': 7, 'unknown_size': 0}
+    }
+    assert [f['id'] for f in plan.files(DownloadPlan.DOWNLOAD)] == ['syn10', 'syn11']
+    assert [f['name'] for f in plan.folders(DownloadPlan.DOWNLOAD)] == ['folder']
+
+
+def test_it_estimates_the_duration(plan):
+    assert plan.estimated_seconds(mbps=10, workers=2) == pytest.approx(10 + 2 * DownloadPlan.FILE_OVERHEAD / 2)
+
+
+def test_it_rejects_invalid_actions(plan, tmp_path):
+    with pytest.raises(ValueError):
+        plan.add(new_folder(tmp_path), 'upload')
+
+
+def test_it_saves_and_loads(plan, tmp_path):
+    path = plan.save(os.path.join(str(tmp_path), 'plans', 'plan.json'))
+    loaded = DownloadPlan.load(path)
+    assert loaded.entity_id == 'syn1'
+    assert loaded.download_path == str(tmp_path)
+    assert loaded.excludes == ['syn9']
+    assert loaded.includes == ['*.csv']
+    assert loaded.totals == plan.totals
+
+    entry = loaded.files(DownloadPlan.DOWNLOAD)[0]
+    synapse_file = DownloadPlan.to_synapse_item(entry)
+    assert synapse_file.is_file
+    assert synapse_file.is_loaded
+    assert synapse_file.id == 'syn10'
+    assert synapse_file.version_number == 2
+    assert synapse_file.content_size == 100 * Utils.MB
+    assert synapse_file.content_md5 == 'md5-syn10'
+    assert synapse_file.synapse_path == 'Project/folder/syn10.txt'
+    assert synapse_file.local.abs_path == os.path.join(str(tmp_path), 'folder', 'syn10.txt')
+
+
+def test_it_rejects_unknown_plan_versions(tmp_path):
+    path = os.path.join(str(tmp_path), 'plan.json')
+    with open(path, 'w') as f:
+        f.write('{"version": 99}')
+    with pytest.raises(SynToolsError):
+        DownloadPlan.load(path)
@@ -7,7 +7,25 @@ def test_it_returns_the_values(monkeypatch):
         ['SYNTOOLS_PATCH', False],
         ['SYNTOOLS_SYN_GET_DOWNLOAD', False],
         ['SYNTOOLS_DOWNLOAD_WORKERS', 20],
-        ['SYNTOOLS_DOWNLOAD_RETRIES', 10]
+        ['SYNTOOLS_DOWNLOAD_RETRIES', 10],
+        ['SYNTOOLS_DOWNLOAD_CHUNK_SIZE', 64],
+        ['SYNTOOLS_DOWNLOAD_CHUNK_WORKERS', 8],
+        ['SYNTOOLS_LISTING_WORKERS', 4],
+        ['SYNTOOLS_METADATA_WORKERS', 4],
+        ['SYNTOOLS_QUEUE_SIZE', 1000],
+        ['SYNTOOLS_PLAN_MBPS', 50],
+        ['SYNTOOLS_ADAPTIVE_WORKERS', False],
+        ['SYNTOOLS_MIN_DOWNLOAD_WORKERS', 4],
+        ['SYNTOOLS_MAX_DOWNLOAD_WORKERS', 64],
+        ['SYNTOOLS_HASH_WORKERS', 8],
+        ['SYNTOOLS_HASH_BUFFER_SIZE', 4],
+        ['SYNTOOLS_HASH_PROCESSES', False],
+        ['SYNTOOLS_HTTP_POOL_SIZE', 0],
+        ['SYNTOOLS_ASYNC_DOWNLOAD', False],
+        ['SYNTOOLS_DOWNLOAD_CACHE_DIR', ''],
+        ['SYNTOOLS_DOWNLOAD_CACHE_SIZE', 100],
+        ['SYNTOOLS_DOWNLOAD_CACHE_LINK', 'hardlink'],
+        ['SYNTOOLS_SCAN_WORKERS', 8]
     ]
 
     def reset():
@@ -24,8 +42,10 @@ def test_it_returns_the_values(monkeypatch):
         assert getattr(Env, var)() == value
 
         reset()
-        if value in [True, False]:
+        if isinstance(value, bool):
             new_value = not value
+        elif isinstance(value, str):
+            new_value = value + 'x'
         else:
             new_value = value + 5
         monkeypatch.setenv(var, str(new_value))
@@ -0,0 +1,98 @@
+import re
+import pytest
+from synapsis import Synapsis
+from synapse_downloader.core import ExcludeMatcher, SynapseItem, SynToolsError
+
+
+def new_item(tmp_path, name, type=Synapsis.ConcreteTypes.FILE_ENTITY, id='syn10', filename=None):
+    item = SynapseItem(type,
+                       id=id,
+                       parent_id='syn2',
+                       name=name,
+                       synapse_root_path='Project/Folder1',
+                       local_root_path=str(tmp_path))
+    if filename:
+        item.set_file_handle({'id': '1', 'fileName': filename})
+    return item
+
+
+def test_it_matches_ids(tmp_path):
+    matcher = ExcludeMatcher(['SYN10'])
+    assert matcher.is_excluded(new_item(tmp_path, 'file.txt'))
+    assert not matcher.is_excluded(new_item(tmp_path, 'file.txt', id='syn100'))
+
+
+def test_it_matches_exact_names_and_paths(tmp_path):
+    item = new_item(tmp_path, 'entity name', filename='file.txt')
+    for pattern in ['entity name', 'file.txt', 'Project/Folder1/file.txt', item.local.abs_path]:
+        assert ExcludeMatcher([pattern]).is_excluded(item)
+    # Names are case-sensitive and names that start with syn are not IDs.
+    assert not ExcludeMatcher(['FILE.TXT']).is_excluded(item)
+    assert ExcludeMatcher(['synthetic']).is_excluded(new_item(tmp_path, 'synthetic'))
+
+
+@pytest.mark.parametrize('pattern,name,expected', [
+    ('*.tmp', 'file.tmp', True),
+    ('*.tmp', 'file.tmp.txt', False),
+    ('glob:*.tar.gz', 'data.tar.gz', True),
+    ('data_??.csv', 'data_01.csv', True),
+    ('data_??.csv', 'data_001.csv', False),
+    ('[ab]*', 'beta', True),
+    ('re:^raw_\\d+$', 'raw_123', True),
+    ('re:^raw_\\d+$', 'raw_abc', False),
+    ('Project/Folder1/*', 'anything', True),
+    ('Project/Folder2/*', 'anything', False),
+])
+def test_it_matches_globs_and_regexes(tmp_path, pattern, name, expected):
+    assert ExcludeMatcher([pattern]).is_excluded(new_item(tmp_path, name)) is expected
+
+
+def test_it_matches_exact_names_with_glob_characters(tmp_path):
+    item = new_item(tmp_path, 'data[1].csv')
+    assert ExcludeMatcher(['data[1].csv']).is_excluded(item)
+    assert ExcludeMatcher(['Project/Folder1/data[1].csv']).is_excluded(item)
+    assert ExcludeMatcher(['file?.txt']).is_excluded(new_item(tmp_path, 'file?.txt'))
+    # Only globs with the glob: prefix are never matched exactly.
+    assert not ExcludeMatcher(['glob:data[1].csv']).is_excluded(item)
+
+
+def test_it_compiles_each_regex_on_its_own(tmp_path):
+    # Inline flags only apply to their own pattern.
+    matcher = ExcludeMatcher(['re:foo', 're:(?i)bar'])
+    assert matcher.is_excluded(new_item(tmp_path, 'BAR'))
+    assert not matcher.is_excluded(new_item(tmp_path, 'FOO'))
+    # Group names can be reused.
+    matcher = ExcludeMatcher(['re:(?P<x>a)', 're:(?P<x>b)'])
+    assert matcher.is_excluded(new_item(tmp_path, 'b'))
+    # Backreferences refer to their own pattern's groups.
+    matcher = ExcludeMatcher(['re:(a)\\1', 're:(b)\\1'])
+    assert matcher.is_excluded(new_item(tmp_path, 'aa'))
+    assert matcher.is_excluded(new_item(tmp_path, 'bb'))
+
+
+def test_it_raises_on_invalid_regexes():
+    pattern = 're:raw_\\d+('
+    with pytest.raises(SynToolsError, match=re.escape(pattern)):
+        ExcludeMatcher(['*.tmp'], [pattern])
+
+
+def test_it_only_checks_ids_and_names_before_loading(tmp_path):
+    item = new_item(tmp_path, 'entity name')
+    assert ExcludeMatcher(['entity name']).is_excluded(item, loaded=False)
+    assert not ExcludeMatcher(['Project/Folder1/entity name']).is_excluded(item, loaded=False)
+    assert not ExcludeMatcher(excludes=None, includes=['*.csv']).is_excluded(item, loaded=False)
+
+
+def test_it_includes_files(tmp_path):
+    matcher = ExcludeMatcher(excludes=['skip.csv'], includes=['*.csv'])
+    assert not matcher.is_excluded(new_item(tmp_path, 'data.csv'))
+    assert matcher.is_excluded(new_item(tmp_path, 'data.txt'))
+    assert matcher.is_excluded(new_item(tmp_path, 'skip.csv'))
+    # Folders are not filtered by includes.
+    assert not matcher.is_excluded(new_item(tmp_path, 'Folder', type=Synapsis.ConcreteTypes.FOLDER_ENTITY))
+
+
+def test_it_is_false_without_patterns(tmp_path):
+    assert not ExcludeMatcher()
+    assert not ExcludeMatcher([None, '']).is_excluded(new_item(tmp_path, 'file.txt'))
+    assert ExcludeMatcher(includes=['*.csv'])
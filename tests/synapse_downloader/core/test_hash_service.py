@@ -0,0 +1,66 @@
+import pytest
+import os
+import hashlib
+from synapse_downloader.core import HashService, Env
+
+
+@pytest.fixture
+def local_files(tmp_path):
+    files = {}
+    for name, size in [('empty.txt', 0), ('small.txt', 100), ('page.bin', 4096), ('large.bin', 3 * 1024 * 1024 + 7)]:
+        path = os.path.join(str(tmp_path), name)
+        data = os.urandom(size)
+        with open(path, 'wb') as f:
+            f.write(data)
+        files[path] = hashlib.md5(data).hexdigest()
+    return files
+
+
+@pytest.mark.parametrize('use_processes', [False, True])
+async def test_it_hashes_files(local_files, use_processes):
+    service = HashService(workers=2, buffer_size=1024 * 1024, use_processes=use_processes)
+    try:
+        for path, md5 in local_files.items():
+            assert await service.md5(path) == md5
+            assert service.md5_sync(path) == md5
+    finally:
+        service.shutdown()
+
+
+async def test_it_records_stats(local_files):
+    service = HashService(workers=2, buffer_size=1024 * 1024)
+    try:
+        for path in local_files:
+            await service.md5(path)
+        stats = service.stats()
+        assert stats['files'] == len(local_files)
+        assert stats['bytes'] == sum(os.path.getsize(path) for path in local_files)
+        assert stats['busy_seconds'] > 0
+        assert stats['bytes_per_second'] > 0
+    finally:
+        service.shutdown()
+
+
+async def test_it_raises_for_missing_files(tmp_path):
+    service = HashService(workers=1)
+    try:
+        with pytest.raises(FileNotFoundError):
+            await service.md5(os.path.join(str(tmp_path), 'missing.txt'))
+        assert service.stats()['files'] == 0
+    finally:
+        service.shutdown()
+
+
+def test_the_default_uses_the_env(monkeypatch):
+    monkeypatch.setenv('SYNTOOLS_HASH_WORKERS', '3')
+    monkeypatch.setenv('SYNTOOLS_HASH_BUFFER_SIZE', '2')
+    monkeypatch.setattr(Env, '_SYNTOOLS_HASH_WORKERS', None)
+    monkeypatch.setattr(Env, '_SYNTOOLS_HASH_BUFFER_SIZE', None)
+    HashService.reset_default()
+    try:
+        service = HashService.default()
+        assert service is HashService.default()
+        assert service.workers == 3
+        assert service.buffer_size == 2 * 1024 * 1024
+    finally:
+        HashService.reset_default()
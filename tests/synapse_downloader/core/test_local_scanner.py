@@ -0,0 +1,58 @@
+import pytest
+import os
+from synapse_downloader.core import LocalScanner
+
+
+@pytest.fixture
+def scanner():
+    scanner = LocalScanner(workers=2)
+    yield scanner
+    scanner.close()
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    for name in ['b.txt', 'a.txt', 'c.txt']:
+        with open(os.path.join(tmp_path, name), 'w') as f:
+            f.write(name)
+    os.mkdir(os.path.join(tmp_path, 'folder'))
+    return str(tmp_path)
+
+
+async def test_it_lists_directories_sorted_by_name(scanner, local_dir):
+    entries = await scanner.scandir(local_dir)
+    assert [e.name for e in entries] == ['a.txt', 'b.txt', 'c.txt', 'folder']
+    assert [e.is_dir() for e in entries] == [False, False, False, True]
+    assert scanner.dirs_scanned == 1
+
+
+async def test_it_returns_nothing_for_missing_directories(scanner, local_dir):
+    assert await scanner.scandir(os.path.join(local_dir, 'missing')) == []
+    assert await scanner.scandir(os.path.join(local_dir, 'a.txt')) == []
+
+
+async def test_it_uses_prefetched_listings(scanner, local_dir):
+    scanner.prefetch(local_dir)
+    scanner.prefetch(local_dir)
+    entries = await scanner.scandir(local_dir)
+    assert len(entries) == 4
+    assert scanner.dirs_scanned == 1
+
+
+async def test_it_limits_the_prefetched_listings(local_dir):
+    scanner = LocalScanner(workers=1, max_prefetch=1)
+    try:
+        scanner.prefetch(local_dir)
+        scanner.prefetch(os.path.join(local_dir, 'folder'))
+        assert scanner.dirs_scanned == 1
+        assert await scanner.scandir(os.path.join(local_dir, 'folder')) == []
+        assert scanner.dirs_scanned == 2
+    finally:
+        scanner.close()
+
+
+async def test_it_stats_paths(scanner, local_dir):
+    stat = await scanner.stat(os.path.join(local_dir, 'a.txt'))
+    assert stat.st_size == len('a.txt')
+    assert await scanner.stat(os.path.join(local_dir, 'missing')) is None
+    assert await scanner.stat(os.path.join(local_dir, 'a.txt', 'missing')) is None
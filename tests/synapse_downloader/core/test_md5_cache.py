@@ -0,0 +1,121 @@
+import pytest
+import os
+import time
+from types import SimpleNamespace
+from synapse_downloader.core import Md5Cache, Utils
+
+
+@pytest.fixture
+def md5_cache(tmp_path):
+    cache = Md5Cache(db_path=os.path.join(tmp_path, 'cache', 'md5_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_it_defaults_to_the_app_cache_dir(mocker, tmp_path):
+    mocker.patch.object(Utils, 'app_dir', return_value=str(tmp_path))
+    cache = Md5Cache()
+    try:
+        assert cache.db_path == os.path.join(str(tmp_path), 'cache', Md5Cache.FILENAME)
+        assert os.path.isfile(cache.db_path)
+    finally:
+        cache.close()
+
+
+def test_it_gets_and_sets(md5_cache, tmp_path):
+    local_path = os.path.join(tmp_path, 'file.txt')
+    assert md5_cache.get(local_path) is None
+
+    with open(local_path, 'w') as f:
+        f.write('abc')
+    assert md5_cache.get(local_path) is None
+
+    md5_cache.set(local_path, 'md5-1')
+    assert md5_cache.get(local_path) == 'md5-1'
+
+    # Persists.
+    md5_cache.close()
+    md5_cache = Md5Cache(db_path=md5_cache.db_path)
+    assert md5_cache.get(local_path) == 'md5-1'
+
+    md5_cache.remove(local_path)
+    assert md5_cache.get(local_path) is None
+    md5_cache.close()
+
+
+def test_it_does_not_return_changed_files(md5_cache, tmp_path):
+    local_path = os.path.join(tmp_path, 'file.txt')
+    with open(local_path, 'w') as f:
+        f.write('abc')
+    md5_cache.set(local_path, 'md5-1')
+
+    # Size changed
+    with open(local_path, 'w') as f:
+        f.write('abcd')
+    assert md5_cache.get(local_path) is None
+    md5_cache.set(local_path, 'md5-2')
+    assert md5_cache.get(local_path) == 'md5-2'
+
+    # Modified time changed
+    stat = os.stat(local_path)
+    os.utime(local_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert md5_cache.get(local_path) is None
+    md5_cache.set(local_path, 'md5-3')
+
+    # Inode changed
+    stat = os.stat(local_path)
+    assert md5_cache.get(local_path, stat=stat) == 'md5-3'
+    replaced_stat = SimpleNamespace(st_size=stat.st_size, st_mtime_ns=stat.st_mtime_ns, st_ino=stat.st_ino + 1)
+    assert md5_cache.get(local_path, stat=replaced_stat) is None
+
+
+def test_it_ignores_directories_and_missing_files(md5_cache, tmp_path):
+    md5_cache.set(str(tmp_path), 'md5-1')
+    assert md5_cache.get(str(tmp_path)) is None
+
+    missing = os.path.join(tmp_path, 'missing.txt')
+    md5_cache.set(missing, 'md5-1')
+    assert md5_cache.get(missing) is None
+
+
+def test_it_finds_unchanged_files_by_md5(md5_cache, tmp_path):
+    path1 = os.path.join(tmp_path, 'file1.txt')
+    path2 = os.path.join(tmp_path, 'file2.txt')
+    for path in [path1, path2]:
+        with open(path, 'w') as f:
+            f.write('abc')
+    assert md5_cache.find('md5', 3) is None
+
+    md5_cache.set(path1, 'md5')
+    assert md5_cache.find('md5', 3) == path1
+    assert md5_cache.find('md5', 4) is None
+    assert md5_cache.find('other', 3) is None
+    assert md5_cache.find('md5', 3, exclude=path1) is None
+
+    md5_cache.set(path2, 'md5')
+    with open(path1, 'w') as f:
+        f.write('xyz')
+    assert md5_cache.find('md5', 3) == path2
+    os.remove(path2)
+    assert md5_cache.find('md5', 3) is None
+
+
+def test_it_commits_pending_writes_when_idle(mocker, tmp_path):
+    mocker.patch.object(Md5Cache, 'COMMIT_INTERVAL', 0.2)
+    db_path = os.path.join(tmp_path, 'cache', 'md5_cache.sqlite')
+    local_path = os.path.join(tmp_path, 'file.txt')
+    with open(local_path, 'w') as f:
+        f.write('abc')
+    cache = Md5Cache(db_path=db_path)
+    other = Md5Cache(db_path=db_path)
+    try:
+        cache.set(local_path, 'abc')
+        time.sleep(0.5)
+        # Another process can write without waiting for the first to write again.
+        other._conn.execute('PRAGMA busy_timeout = 100')
+        other.set(local_path, 'def')
+        other.commit()
+        assert cache.get(local_path) == 'def'
+    finally:
+        cache.close()
+        other.close()
@@ -0,0 +1,117 @@
+import pytest
+import os
+import json
+import urllib.request
+from synapse_downloader.core import Metrics, MetricsServer, PipelineStage
+
+
+def test_it_counts_and_calculates_the_eta(mocker):
+    metrics = Metrics()
+    now = [1000.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    metrics._start_time = now[0]
+
+    metrics.increment('files_queued', 4)
+    metrics.increment('bytes_queued', 4000)
+    assert metrics.snapshot()['eta_seconds'] is None
+
+    now[0] += 10
+    metrics.increment('files_completed')
+    metrics.increment('bytes_completed', 1000)
+    metrics.increment('bytes_transferred', 1000)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['files_queued'] == 4
+    assert snapshot['bytes_per_second'] == 100
+    assert snapshot['files_per_second'] == 0.1
+    assert snapshot['remaining_files'] == 3
+    assert snapshot['remaining_bytes'] == 3000
+    assert snapshot['eta_seconds'] == 30
+
+
+def test_the_rates_use_the_recent_window(mocker):
+    metrics = Metrics()
+    now = [1000.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    metrics.snapshot()
+    metrics.increment('bytes_transferred', 10000)
+    now[0] += Metrics.RATE_WINDOW
+    metrics.snapshot()
+    now[0] += Metrics.RATE_WINDOW
+    metrics.increment('bytes_transferred', 600)
+    assert metrics.snapshot()['bytes_per_second'] == 600 / Metrics.RATE_WINDOW
+
+
+def test_it_measures_listing_separately(mocker):
+    metrics = Metrics()
+    now = [1000.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    metrics._start_time = now[0]
+    metrics.snapshot()
+
+    now[0] += 10
+    metrics.increment('entities_listed', 500)
+    metrics.increment('bytes_transferred', 1000)
+    snapshot = metrics.snapshot()
+    assert snapshot['listed_per_second'] == 50
+    assert snapshot['bytes_per_second'] == 100
+    assert 'Listed: 500 (50.0/s)' in metrics.summary()
+
+    now[0] += 2.5
+    metrics.stage_finished(PipelineStage('listing', None, 1))
+    assert metrics.snapshot()['gauges']['listing_seconds'] == 12.5
+    assert 'Listed' not in metrics.summary()
+
+
+def test_it_records_latencies():
+    metrics = Metrics()
+    metrics.observe('list_children', 0.07)
+    metrics.observe('list_children', 3)
+    with metrics.timer('hash_file'):
+        pass
+
+    latencies = metrics.snapshot()['latencies']
+    assert latencies['list_children']['count'] == 2
+    assert latencies['list_children']['max'] == 3
+    assert latencies['list_children']['avg'] == pytest.approx(1.535)
+    assert latencies['list_children']['buckets'][Metrics.LATENCY_BUCKETS.index(0.1)] == 1
+    assert latencies['list_children']['buckets'][Metrics.LATENCY_BUCKETS.index(5)] == 1
+    assert latencies['hash_file']['count'] == 1
+
+
+async def test_it_reports_the_stages():
+    metrics = Metrics()
+
+    async def handler(item):
+        pass
+
+    stage = PipelineStage('transfer', handler, 2)
+    metrics.track_stages([stage])
+    assert metrics.snapshot()['stages'][0]['name'] == 'transfer'
+    assert 'transfer: 0' in metrics.summary()
+
+
+def test_it_saves_the_stats(tmp_path):
+    metrics = Metrics()
+    metrics.increment('files_downloaded', 2)
+    path = metrics.save(os.path.join(str(tmp_path), 'stats', 'stats.json'))
+    with open(path) as f:
+        assert json.load(f)['counters'] == {'files_downloaded': 2}
+
+
+def test_it_serves_prometheus_metrics():
+    metrics = Metrics()
+    metrics.increment('files_downloaded', 2)
+    metrics.observe('load_batch', 0.2)
+    server = MetricsServer(metrics, 0).start()
+    try:
+        with urllib.request.urlopen('http://127.0.0.1:{0}/metrics'.format(server.port)) as response:
+            body = response.read().decode()
+        assert 'syntools_files_downloaded_total 2' in body
+        assert 'syntools_latency_seconds_bucket{operation="load_batch",le="0.25"} 1' in body
+        assert 'syntools_latency_seconds_bucket{operation="load_batch",le="+Inf"} 1' in body
+        assert 'syntools_latency_seconds_count{operation="load_batch"} 1' in body
+
+        with urllib.request.urlopen('http://127.0.0.1:{0}/stats'.format(server.port)) as response:
+            assert json.loads(response.read())['counters']['files_downloaded'] == 2
+    finally:
+        server.stop()
@@ -0,0 +1,104 @@
+import asyncio
+from synapse_downloader.core import PipelineStage
+
+
+async def test_it_processes_items_with_multiple_workers():
+    processed = []
+    running = []
+    max_running = 0
+
+    async def handler(item):
+        nonlocal max_running
+        running.append(item)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item)
+        processed.append(item)
+
+    stage = PipelineStage('test', handler, 3).start()
+    try:
+        for i in range(10):
+            await stage.put(i)
+        assert stage.depth > 0
+        await stage.join()
+    finally:
+        stage.stop()
+
+    assert sorted(processed) == list(range(10))
+    assert max_running == 3
+    stats = stage.stats()
+    assert stats['name'] == 'test'
+    assert stats['workers'] == 3
+    assert stats['depth'] == 0
+    assert stats['active'] == 0
+    assert stats['processed'] == 10
+    assert stats['max_depth'] >= 7
+
+
+async def test_it_blocks_when_full():
+    release = asyncio.Event()
+
+    async def handler(item):
+        await release.wait()
+
+    stage = PipelineStage('test', handler, 1, maxsize=2).start()
+    try:
+        await stage.put(1)
+        await asyncio.sleep(0)
+        await stage.put(2)
+        await stage.put(3)
+        put = asyncio.create_task(stage.put(4))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        assert stage.depth == 2
+
+        release.set()
+        await put
+        await stage.join()
+    finally:
+        stage.stop()
+    assert stage.processed == 4
+    assert stage.max_depth == 2
+
+
+async def test_it_puts_batches():
+    processed = []
+    release = asyncio.Event()
+
+    async def handler(item):
+        await release.wait()
+        processed.append(item)
+
+    stage = PipelineStage('test', handler, 1, maxsize=3).start()
+    try:
+        put = asyncio.create_task(stage.put_many(range(6)))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        assert stage.depth == 3
+
+        release.set()
+        await put
+        await stage.join()
+    finally:
+        stage.stop()
+    assert processed == list(range(6))
+    assert stage.max_depth == 3
+
+
+async def test_it_continues_after_handler_errors():
+    processed = []
+
+    async def handler(item):
+        if item == 1:
+            raise Exception('error')
+        processed.append(item)
+
+    stage = PipelineStage('test', handler, 1).start()
+    try:
+        for i in range(3):
+            await stage.put(i)
+        await stage.join()
+    finally:
+        stage.stop()
+    assert processed == [0, 2]
+    assert stage.processed == 3
@@ -0,0 +1,211 @@
+import pytest
+import os
+import hashlib
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from synapse_downloader.core import RangeDownloader, ConnectionPool, SynToolsError, Md5MismatchError
+
+
+class RangeServer:
+    """Local HTTP server that serves a file and supports Range requests."""
+
+    def __init__(self, data):
+        self.data = data
+        self.supports_range = True
+        self.fail_next = 0
+        self.fail_status = 500
+        self.delay = 0
+        self.expired_urls = set()
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, name='file'):
+        return 'http://127.0.0.1:{0}/{1}'.format(self._server.server_port, name)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((self.path, self.headers.get('Range')))
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    fail = server.fail_next > 0
+                    if fail:
+                        server.fail_next -= 1
+                try:
+                    time.sleep(server.delay)
+                    if self.path.lstrip('/') in server.expired_urls:
+                        return self._send(403, b'expired')
+                    if fail:
+                        return self._send(server.fail_status, b'error')
+
+                    range_header = self.headers.get('Range')
+                    if server.supports_range and range_header:
+                        start, end = range_header.split('=')[1].split('-')
+                        start, end = int(start), int(end)
+                        return self._send(206, server.data[start:end + 1],
+                                          {'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end,
+                                                                                       len(server.data))})
+                    return self._send(200, server.data)
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def data():
+    return os.urandom(1000 * 1024 + 123)
+
+
+@pytest.fixture
+def range_server(data):
+    server = RangeServer(data)
+    yield server
+    server.close()
+
+
+def new_downloader(range_server, tmp_path, data, urls=None, **kwargs):
+    urls = list(urls or [range_server.url()])
+
+    async def get_url():
+        return urls.pop(0) if len(urls) > 1 else urls[0]
+
+    kwargs.setdefault('expected_md5', hashlib.md5(data).hexdigest())
+    kwargs.setdefault('chunk_size', 100 * 1024)
+    kwargs.setdefault('max_parallel', 4)
+    kwargs.setdefault('retries', 2)
+    return RangeDownloader(get_url, os.path.join(tmp_path, 'dir', 'file.bin'), len(data), **kwargs)
+
+
+def test_should_use():
+    assert RangeDownloader.should_use(None, chunk_size=10) is False
+    assert RangeDownloader.should_use(10, chunk_size=10) is False
+    assert RangeDownloader.should_use(11, chunk_size=10) is True
+
+
+async def test_it_downloads_in_parallel_ranges(range_server, tmp_path, data):
+    range_server.delay = 0.1
+    downloader = new_downloader(range_server, tmp_path, data)
+    download_path = await downloader.download()
+
+    assert download_path == downloader.download_path
+    with open(download_path, 'rb') as f:
+        assert f.read() == data
+    assert downloader.md5 == hashlib.md5(data).hexdigest()
+    assert not os.path.exists(downloader.partial_path)
+
+    expected_ranges = ['bytes={0}-{1}'.format(start, min(start + 102400, len(data)) - 1)
+                       for start in range(0, len(data), 102400)]
+    assert len(expected_ranges) == 11
+    assert expected_ranges[-1] == 'bytes=1024000-1024122'
+    assert sorted(r[1] for r in range_server.requests) == sorted(expected_ranges)
+    assert 1 < range_server.max_active <= 4
+
+
+async def test_it_retries_failed_ranges(range_server, tmp_path, data):
+    range_server.fail_next = 2
+    downloader = new_downloader(range_server, tmp_path, data)
+    await downloader.download()
+    with open(downloader.download_path, 'rb') as f:
+        assert f.read() == data
+    assert len(range_server.requests) == 13
+
+
+async def test_it_reports_throttling(range_server, tmp_path, data):
+    range_server.fail_next = 2
+    range_server.fail_status = 429
+    throttled = []
+    downloader = new_downloader(range_server, tmp_path, data, throttled=lambda: throttled.append(1))
+    await downloader.download()
+    with open(downloader.download_path, 'rb') as f:
+        assert f.read() == data
+    assert len(throttled) == 2
+
+
+async def test_it_gets_a_new_url_when_the_url_expires(range_server, tmp_path, data):
+    range_server.expired_urls.add('expired')
+    downloader = new_downloader(range_server, tmp_path, data, urls=[range_server.url('expired'),
+                                                                     range_server.url('file')])
+    await downloader.download()
+    with open(downloader.download_path, 'rb') as f:
+        assert f.read() == data
+
+
+async def test_it_fails_after_the_retries(range_server, tmp_path, data):
+    range_server.fail_next = 100
+    downloader = new_downloader(range_server, tmp_path, data, retries=1)
+    with pytest.raises(SynToolsError):
+        await downloader.download()
+    assert not os.path.exists(downloader.download_path)
+    assert not os.path.exists(downloader.partial_path)
+
+
+async def test_it_does_not_retry_client_errors(range_server, tmp_path, data):
+    range_server.fail_next = 100
+    range_server.fail_status = 404
+    downloader = new_downloader(range_server, tmp_path, data, retries=5)
+    with pytest.raises(SynToolsError, match='404'):
+        await downloader.download()
+    # Only the first request of each worker.
+    assert len(range_server.requests) <= 4
+    assert not os.path.exists(downloader.partial_path)
+
+
+async def test_it_fails_when_the_server_does_not_support_ranges(range_server, tmp_path, data):
+    range_server.supports_range = False
+    downloader = new_downloader(range_server, tmp_path, data)
+    with pytest.raises(SynToolsError, match='range requests'):
+        await downloader.download()
+    assert not os.path.exists(downloader.partial_path)
+
+
+async def test_it_fails_when_the_md5_does_not_match(range_server, tmp_path, data):
+    downloader = new_downloader(range_server, tmp_path, data, expected_md5='abc')
+    with pytest.raises(Md5MismatchError):
+        await downloader.download()
+    assert not os.path.exists(downloader.download_path)
+    assert not os.path.exists(downloader.partial_path)
+
+
+async def test_it_uses_the_given_session(range_server, tmp_path, data):
+    pool = ConnectionPool(4)
+    session = pool.session()
+    for _ in range(2):
+        downloader = new_downloader(range_server, tmp_path, data, session=session)
+        await downloader.download()
+        with open(downloader.download_path, 'rb') as f:
+            assert f.read() == data
+
+    stats = pool.stats()
+    assert stats['http_requests'] == 22
+    # The connections from the first file are reused by the second.
+    assert stats['http_connections_opened'] <= 4
+    assert stats['http_connections_reused'] == 22 - stats['http_connections_opened']
+    pool.close()
@@ -0,0 +1,72 @@
+import pytest
+import asyncio
+from synapse_downloader.core import RemotePathCache
+
+
+def loader(paths, calls, delay=0):
+    async def load(entity_id):
+        calls.append(entity_id)
+        await asyncio.sleep(delay)
+        return paths[entity_id]
+
+    return load
+
+
+async def test_it_uses_the_paths_that_were_set():
+    calls = []
+    cache = RemotePathCache()
+    cache.set('syn1', 'Project/folder')
+    assert await cache.get('syn1', loader({}, calls)) == 'Project/folder'
+    assert calls == []
+    assert cache.hits == 1
+
+
+async def test_it_loads_and_caches_missing_paths():
+    calls = []
+    cache = RemotePathCache()
+    load = loader({'syn1': 'Project'}, calls)
+    assert await cache.get('syn1', load) == 'Project'
+    assert await cache.get('syn1', load) == 'Project'
+    assert calls == ['syn1']
+    assert cache.loads == 1
+
+
+async def test_it_coalesces_concurrent_lookups():
+    calls = []
+    cache = RemotePathCache()
+    load = loader({'syn1': 'Project', 'syn2': 'Project/folder'}, calls, delay=0.01)
+    results = await asyncio.gather(*[cache.get(entity_id, load) for entity_id in ['syn1', 'syn2'] * 10])
+    assert results == ['Project', 'Project/folder'] * 10
+    assert sorted(calls) == ['syn1', 'syn2']
+
+
+async def test_it_evicts_the_least_recently_used_paths():
+    calls = []
+    cache = RemotePathCache(max_size=2)
+    cache.set('syn1', 'a')
+    cache.set('syn2', 'b')
+    await cache.get('syn1', loader({}, calls))
+    cache.set('syn3', 'c')
+    assert len(cache) == 2
+    assert 'syn1' in cache
+    assert 'syn2' not in cache
+    assert 'syn3' in cache
+
+
+async def test_it_does_not_cache_failures():
+    calls = []
+    cache = RemotePathCache()
+
+    async def fail(entity_id):
+        calls.append(entity_id)
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(cache.get('syn1', fail), cache.get('syn1', fail), return_exceptions=True)
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert calls == ['syn1']
+    assert 'syn1' not in cache
+
+    assert await cache.get('syn1', loader({'syn1': 'Project'}, calls)) == 'Project'
+    with pytest.raises(ValueError):
+        await cache.get('syn2', fail)
@@ -0,0 +1,95 @@
+import pytest
+import os
+from synapse_downloader.core import RunJournal, Utils
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = RunJournal('syn123', str(tmp_path), db_path=os.path.join(tmp_path, 'journals', 'journal.sqlite'))
+    yield journal
+    journal.close()
+
+
+def test_it_defaults_to_a_journal_per_entity_and_path(mocker, tmp_path):
+    mocker.patch.object(Utils, 'app_dir', return_value=str(tmp_path))
+    path1 = RunJournal.default_path('syn123', '/tmp/a')
+    path2 = RunJournal.default_path('SYN123', '/tmp/a')
+    path3 = RunJournal.default_path('syn123', '/tmp/b')
+    assert os.path.dirname(path1) == os.path.join(str(tmp_path), RunJournal.DIRNAME)
+    assert path1 == path2
+    assert path1 != path3
+
+
+def test_it_records_listings(journal):
+    assert journal.get_listing('syn1') is None
+
+    children = [
+        {'id': 'syn2', 'name': 'file1', 'type': 'org.sagebionetworks.repo.model.FileEntity', 'versionNumber': 2},
+        {'id': 'syn3', 'name': 'folder1', 'type': 'org.sagebionetworks.repo.model.Folder', 'versionNumber': 1}
+    ]
+    journal.folder_listed('syn1', children)
+    assert journal.get_listing('syn1') == children
+
+    journal.folder_listed('syn4', [])
+    assert journal.get_listing('syn4') == []
+
+
+def test_it_records_completed_folders(journal):
+    assert journal.is_folder_completed('syn1') is False
+    journal.folder_listed('syn1', [])
+    assert journal.is_folder_completed('syn1') is False
+    journal.folder_completed('syn1')
+    assert journal.is_folder_completed('syn1') is True
+    assert journal.get_listing('syn1') == []
+
+
+def test_it_records_verified_files(journal, tmp_path):
+    local_path = os.path.join(tmp_path, 'file1.txt')
+    with open(local_path, 'w') as f:
+        f.write('abc')
+
+    assert journal.is_file_current('syn2', 1) is None
+    journal.file_verified('syn2', 1, 'md5', 3, local_path)
+    assert journal.get_verified_file('syn2') == {
+        'id': 'syn2', 'version_number': 1, 'md5': 'md5', 'size': 3, 'local_path': local_path
+    }
+    assert journal.is_file_current('syn2', 1) == local_path
+
+    # New version
+    assert journal.is_file_current('syn2', 2) is None
+    assert journal.is_file_current('syn2', None) is None
+
+    # Changed locally
+    with open(local_path, 'w') as f:
+        f.write('abcd')
+    assert journal.is_file_current('syn2', 1) is None
+    os.remove(local_path)
+    assert journal.is_file_current('syn2', 1) is None
+
+
+def test_it_records_the_filters(journal):
+    # Journals without filters do not match.
+    assert journal.matches_filters() is False
+    journal.set_filters(['*.tmp', 'syn1'], ['*.csv'])
+    assert journal.matches_filters(['syn1', '*.tmp'], ['*.csv']) is True
+    assert journal.matches_filters(['*.tmp'], ['*.csv']) is False
+    assert journal.matches_filters(['*.tmp', 'syn1']) is False
+    journal.set_filters()
+    assert journal.matches_filters() is True
+    assert journal.matches_filters([], []) is True
+    journal.clear()
+    assert journal.matches_filters() is False
+
+
+def test_it_persists_clears_and_deletes(journal):
+    journal.folder_completed('syn1')
+    journal.close()
+
+    journal = RunJournal('syn123', journal.download_path, db_path=journal.db_path)
+    assert journal.is_folder_completed('syn1') is True
+    journal.clear()
+    assert journal.is_folder_completed('syn1') is False
+
+    journal.delete()
+    assert journal.closed
+    assert not os.path.exists(journal.db_path)
@@ -108,3 +108,84 @@ async def test_it_loads(synapse_test_helper):
         assert file_item.local.exists
         assert file_item.local.is_file
         assert file_item.local.is_dir is False
+
+
+async def test_it_loads_a_batch(synapse_test_helper):
+    local_root_path = synapse_test_helper.create_temp_dir()
+    syn_project = synapse_test_helper.create_project()
+    syn_folder = synapse_test_helper.create_folder(parent=syn_project)
+    syn_files = [synapse_test_helper.create_file(parent=syn_project) for _ in range(3)]
+
+    folder_item = SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                              id=syn_folder.id,
+                              parent_id=syn_project.id,
+                              name=syn_folder.name,
+                              synapse_root_path=syn_project.name,
+                              local_root_path=local_root_path)
+    file_items = [SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                              id=syn_file.id,
+                              parent_id=syn_project.id,
+                              name=syn_file.name,
+                              synapse_root_path=syn_project.name,
+                              local_root_path=local_root_path) for syn_file in syn_files]
+    missing_item = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                               id='syn0',
+                               parent_id=syn_project.id,
+                               name='missing',
+                               synapse_root_path=syn_project.name,
+                               local_root_path=local_root_path)
+
+    items = [folder_item] + file_items + [missing_item]
+    assert await SynapseItem.load_batch(items) == items
+    assert missing_item.is_loaded is False
+    for file_item, syn_file in zip(file_items, syn_files):
+        assert file_item.is_loaded is True
+        assert file_item.file_handle_id == syn_file.dataFileHandleId
+        assert file_item.filename == syn_file['_file_handle']['fileName']
+        assert file_item.content_md5 == syn_file['_file_handle']['contentMd5']
+        assert file_item.content_size == syn_file['_file_handle']['contentSize']
+        assert file_item.pre_signed_url is None
+        assert file_item.has_pre_signed_url is False
+
+    for file_item in file_items:
+        file_item.file_handle_id = None
+    await SynapseItem.load_batch(file_items, pre_signed_urls=True)
+    for file_item in file_items:
+        assert file_item.is_loaded is True
+        assert file_item.pre_signed_url is not None
+        assert file_item.has_pre_signed_url is True
+
+
+def test_it_caches_the_local_paths(tmp_path):
+    local_root_path = str(tmp_path)
+    folder = SynapseItem(Synapsis.ConcreteTypes.FOLDER_ENTITY,
+                         id='syn2',
+                         parent_id='syn1',
+                         name='Folder1',
+                         synapse_root_path='Project',
+                         local_root_path=local_root_path)
+    file_item = SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                            id='syn3',
+                            parent_id=folder.id,
+                            name='File1',
+                            synapse_root_path=''.join(folder.synapse_path),
+                            local_root_path=''.join(folder.local.abs_path))
+
+    assert not hasattr(file_item, '__dict__')
+    assert file_item.synapse_path == 'Project/Folder1/File1'
+    assert file_item.local.abs_path == os.path.join(local_root_path, 'Folder1', 'File1')
+    assert file_item.local.abs_path is file_item.local.abs_path
+    assert file_item.local.dirname == folder.local.abs_path
+    # Root paths are shared between items.
+    assert file_item.local_root_path is SynapseItem(Synapsis.ConcreteTypes.FILE_ENTITY,
+                                                    id='syn4',
+                                                    parent_id=folder.id,
+                                                    name='File2',
+                                                    synapse_root_path=folder.synapse_path,
+                                                    local_root_path=''.join(folder.local.abs_path)).local_root_path
+
+    # The paths change with the filename.
+    file_item.set_file_handle({'id': '1', 'fileName': 'file1.txt', 'contentMd5': 'abc', 'contentSize': 1})
+    assert file_item.synapse_path == 'Project/Folder1/file1.txt'
+    assert file_item.local.abs_path == os.path.join(local_root_path, 'Folder1', 'file1.txt')
+    assert file_item.local.name == 'file1.txt'
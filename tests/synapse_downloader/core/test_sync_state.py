@@ -0,0 +1,72 @@
+import pytest
+import os
+from synapse_downloader.core import SyncState, Utils
+
+MODIFIED_ON = '2024-01-02T03:04:05.000Z'
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = SyncState('syn123', str(tmp_path), db_path=os.path.join(tmp_path, 'sync_state', 'state.sqlite'))
+    yield state
+    state.close()
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    local_path = os.path.join(tmp_path, 'file1.txt')
+    with open(local_path, 'w') as f:
+        f.write('abc')
+    return local_path
+
+
+def test_it_defaults_to_a_state_per_entity_and_path(mocker, tmp_path):
+    mocker.patch.object(Utils, 'app_dir', return_value=str(tmp_path))
+    path1 = SyncState.default_path('syn123', '/tmp/a')
+    path2 = SyncState.default_path('SYN123', '/tmp/a')
+    path3 = SyncState.default_path('syn123', '/tmp/b')
+    assert os.path.dirname(path1) == os.path.join(str(tmp_path), SyncState.DIRNAME)
+    assert path1 == path2
+    assert path1 != path3
+
+
+def test_it_records_synced_files(state, local_file, tmp_path):
+    assert state.get_file('syn2') is None
+    state.file_synced('syn2', 1, MODIFIED_ON, 'md5', local_file)
+    stat = os.stat(local_file)
+    assert state.get_file('syn2') == {
+        'id': 'syn2', 'version_number': 1, 'modified_on': MODIFIED_ON, 'md5': 'md5', 'size': 3,
+        'mtime_ns': stat.st_mtime_ns, 'local_path': local_file
+    }
+
+    # Missing local files are not recorded.
+    state.file_synced('syn3', 1, MODIFIED_ON, 'md5', os.path.join(tmp_path, 'missing.txt'))
+    assert state.get_file('syn3') is None
+
+
+def test_it_gets_unchanged_files(state, local_file, tmp_path):
+    assert state.unchanged_file('syn2', 1, MODIFIED_ON, str(tmp_path)) is None
+    state.file_synced('syn2', 1, MODIFIED_ON, 'md5', local_file)
+    assert state.unchanged_file('syn2', 1, MODIFIED_ON, str(tmp_path))['local_path'] == local_file
+
+    # Changed in Synapse
+    assert state.unchanged_file('syn2', 2, MODIFIED_ON, str(tmp_path)) is None
+    assert state.unchanged_file('syn2', 1, '2024-02-02T03:04:05.000Z', str(tmp_path)) is None
+    assert state.unchanged_file('syn2', None, MODIFIED_ON, str(tmp_path)) is None
+    assert state.unchanged_file('syn2', 1, None, str(tmp_path)) is None
+
+    # Moved
+    assert state.unchanged_file('syn2', 1, MODIFIED_ON, os.path.join(tmp_path, 'other')) is None
+
+    # Changed locally
+    stat = os.stat(local_file)
+    os.utime(local_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert state.unchanged_file('syn2', 1, MODIFIED_ON, str(tmp_path)) is None
+    os.remove(local_file)
+    assert state.unchanged_file('syn2', 1, MODIFIED_ON, str(tmp_path)) is None
+
+
+def test_it_clears(state, local_file):
+    state.file_synced('syn2', 1, MODIFIED_ON, 'md5', local_file)
+    state.clear()
+    assert state.get_file('syn2') is None
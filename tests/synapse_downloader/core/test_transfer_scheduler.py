@@ -0,0 +1,36 @@
+import pytest
+from synapse_downloader.core import TransferScheduler
+
+
+def order(policy, sizes, large_file_size=100):
+    scheduler = TransferScheduler(policy, large_file_size=large_file_size)
+    keyed = [(scheduler.priority_for_size(size), index) for index, size in enumerate(sizes)]
+    return [sizes[index] for _, index in sorted(keyed)]
+
+
+SIZES = [5, 200, None, 1, 500, 5, 100]
+
+
+def test_it_defaults_to_fifo():
+    scheduler = TransferScheduler()
+    assert scheduler.policy == TransferScheduler.FIFO
+    assert scheduler.is_ordered is False
+    assert order(None, SIZES) == SIZES
+
+
+def test_largest_first():
+    assert TransferScheduler(TransferScheduler.LARGEST_FIRST).is_ordered is True
+    assert order(TransferScheduler.LARGEST_FIRST, SIZES) == [500, 200, 100, 5, 5, 1, None]
+
+
+def test_smallest_first():
+    assert order(TransferScheduler.SMALLEST_FIRST, SIZES) == [None, 1, 5, 5, 100, 200, 500]
+
+
+def test_shortest_tail():
+    assert order(TransferScheduler.SHORTEST_TAIL, SIZES) == [500, 200, 100, 5, None, 1, 5]
+
+
+def test_it_validates_the_policy():
+    with pytest.raises(ValueError):
+        TransferScheduler('biggest')
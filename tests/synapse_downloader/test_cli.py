@@ -24,7 +24,19 @@ def test_download_command_as_default(mocker):
                                                '/tmp',
                                                download=True,
                                                compare=False,
-                                               excludes=['syn1234']
+                                               excludes=['syn1234'],
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
                                                )
 
 
@@ -49,7 +61,19 @@ def test_download_command(mocker):
                                                '/tmp',
                                                download=True,
                                                compare=False,
-                                               excludes=['syn1234']
+                                               excludes=['syn1234'],
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
                                                )
 
 
@@ -75,7 +99,19 @@ def test_download_command_with_compare(mocker):
                                                '/tmp',
                                                download=True,
                                                compare=True,
-                                               excludes=['syn1234']
+                                               excludes=['syn1234'],
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
                                                )
 
 
@@ -100,7 +136,19 @@ def test_download_command_with_compare(mocker):
                                                '/tmp',
                                                download=False,
                                                compare=True,
-                                               excludes=['syn1234']
+                                               excludes=['syn1234'],
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
                                                )
 
 
@@ -119,4 +167,431 @@ def test_sync_from_synapse_command(mocker):
     with pytest.raises(SystemExit):
         cli.main()
 
-    mock_init_download.assert_called_once_with(mocker.ANY, 'syn123', '/tmp')
+    mock_init_download.assert_called_once_with(mocker.ANY, 'syn123', '/tmp', stats_file=None, metrics_port=None)
+
+
+def test_sync_from_synapse_command_with_metrics(mocker):
+    args = ['<prog>',
+            'sync-from-synapse',
+            'syn123',
+            '/tmp',
+            '--stats-file', '/tmp/stats.json',
+            '--metrics-port', '9100',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.sync_from_synapse.SyncFromSynapse.execute')
+    mock_init_download = mocker.spy(SyncFromSynapse, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY, 'syn123', '/tmp', stats_file='/tmp/stats.json',
+                                               metrics_port=9100)
+
+
+def test_download_command_with_rehash(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--rehash',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=True,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_resume(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--resume',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=True,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_incremental(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--incremental',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=True,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_dedup(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--dedup', 'hardlink',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup='hardlink',
+                                               report=None
+                                               )
+
+
+def test_download_command_with_schedule(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--schedule', 'largest-first',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule='largest-first',
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_dry_run(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--dry-run', '/tmp/plan.json',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run='/tmp/plan.json',
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_plan(mocker):
+    args = ['<prog>',
+            '--plan', '/tmp/plan.json',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               None,
+                                               None,
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan='/tmp/plan.json',
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_download_command_with_metrics(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--stats-file', '/tmp/stats.json',
+            '--metrics-port', '9100',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file='/tmp/stats.json',
+                                               metrics_port=9100,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_compare_command_with_stream(mocker):
+    args = ['<prog>',
+            'compare',
+            'syn123',
+            '/tmp',
+            '--stream',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=False,
+                                               compare=True,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=True,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )
+
+
+def test_compare_command_with_report(mocker):
+    args = ['<prog>',
+            'compare',
+            'syn123',
+            '/tmp',
+            '--report', '/tmp/report.csv',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=False,
+                                               compare=True,
+                                               excludes=None,
+                                               includes=None,
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report='/tmp/report.csv'
+                                               )
+
+
+def test_download_command_with_include(mocker):
+    args = ['<prog>',
+            'download',
+            'syn123',
+            '/tmp',
+            '--include', '*.csv',
+            '--exclude', 're:^tmp_.*',
+            '--log-dir', '/tmp',
+            '--log-level', 'DEBUG'
+            ]
+    mocker.patch('sys.argv', args)
+    mocker.patch('src.synapse_downloader.commands.download.Downloader.execute')
+    mock_init_download = mocker.spy(Downloader, '__init__')
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    mock_init_download.assert_called_once_with(mocker.ANY,
+                                               'syn123',
+                                               '/tmp',
+                                               download=True,
+                                               compare=False,
+                                               excludes=['re:^tmp_.*'],
+                                               includes=['*.csv'],
+                                               rehash=False,
+                                               resume=False,
+                                               schedule=None,
+                                               dry_run=None,
+                                               plan=None,
+                                               stats_file=None,
+                                               metrics_port=None,
+                                               stream_compare=False,
+                                               incremental=False,
+                                               dedup=None,
+                                               report=None
+                                               )